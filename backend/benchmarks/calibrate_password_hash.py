@@ -0,0 +1,125 @@
+"""
+Picks password hash parameters that take a target time per hash on this machine.
+
+Run from the backend folder:
+    python -m benchmarks.calibrate_password_hash [--target-ms 250] [--algorithm bcrypt] [--samples 3]
+    python -m benchmarks.calibrate_password_hash --algorithm argon2id [--memory-cost 65536] [--parallelism 1]
+
+For bcrypt the work factor is raised one step at a time, doubling the time a hash
+takes, until a hash is slower than the target. For argon2id the memory and lanes are
+kept and the iterations are raised instead - if a single iteration is already too
+slow the memory is halved until one fits. Each setting is timed by the median of
+--samples hashes, run one at a time on one core the way a hashing thread runs
+them, and the slowest setting within the target is printed as config.yml entries.
+
+Run it on the hardware the server runs on, while it is otherwise idle.
+"""
+import argparse
+import statistics
+import sys
+
+# pylint: disable=import-error
+from core.encoder import HashPolicy, _hash
+
+PASSWORD = b"correct horse battery staple"
+
+
+def time_policy(policy: HashPolicy, samples: int) -> float:
+    """
+    Times hashing a password under a policy.
+
+    Args:
+        policy (HashPolicy): The policy.
+        samples (int): The number of hashes to time.
+
+    Returns:
+        float: The median milliseconds per hash.
+    """
+    return statistics.median(_hash(PASSWORD, policy)[1] for _ in range(samples)) * 1000
+
+
+def calibrate_bcrypt(target_ms: float, samples: int) -> HashPolicy:
+    """
+    Finds the highest bcrypt work factor within the target.
+
+    Args:
+        target_ms (float): The target milliseconds per hash.
+        samples (int): The number of hashes to time per setting.
+
+    Returns:
+        HashPolicy: The policy, with the lowest work factor if even that is too slow.
+    """
+    best = HashPolicy("bcrypt", rounds=4)
+    for rounds in range(4, 32):
+        policy = HashPolicy("bcrypt", rounds=rounds)
+        milliseconds = time_policy(policy, samples)
+        print(f"bcrypt rounds={rounds}: {milliseconds:.1f}ms")
+        if milliseconds > target_ms:
+            break
+        best = policy
+    return best
+
+
+def calibrate_argon2id(target_ms: float, samples: int, memory_cost: int, parallelism: int) -> HashPolicy:
+    """
+    Finds the most argon2id iterations within the target, lowering the memory if one iteration is too slow.
+
+    Args:
+        target_ms (float): The target milliseconds per hash.
+        samples (int): The number of hashes to time per setting.
+        memory_cost (int): The memory per hash to start from, in KiB.
+        parallelism (int): The number of lanes.
+
+    Returns:
+        HashPolicy: The policy.
+    """
+    while True:
+        policy = HashPolicy("argon2id", time_cost=1, memory_cost=memory_cost, parallelism=parallelism)
+        milliseconds = time_policy(policy, samples)
+        print(f"argon2id t=1 m={memory_cost} p={parallelism}: {milliseconds:.1f}ms")
+        if milliseconds <= target_ms or memory_cost // 2 < 8 * parallelism:
+            break
+        memory_cost //= 2
+
+    best = policy
+    for time_cost in range(2, 100):
+        policy = HashPolicy("argon2id", time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        milliseconds = time_policy(policy, samples)
+        print(f"argon2id t={time_cost} m={memory_cost} p={parallelism}: {milliseconds:.1f}ms")
+        if milliseconds > target_ms:
+            break
+        best = policy
+    return best
+
+
+def main(arguments) -> None:
+    """
+    Calibrates the chosen algorithm and prints the config.yml entries.
+    """
+    if arguments.algorithm == "argon2id":
+        try:
+            policy = calibrate_argon2id(arguments.target_ms, arguments.samples, arguments.memory_cost, arguments.parallelism)
+        except RuntimeError as error:
+            sys.exit(str(error))
+    else:
+        policy = calibrate_bcrypt(arguments.target_ms, arguments.samples)
+
+    print()
+    print(f"Within {arguments.target_ms:g}ms per hash, under core in config.yml:")
+    print(f"  password_hash_algorithm: '{policy.algorithm}'")
+    if policy.algorithm == "argon2id":
+        print(f"  password_hash_time_cost: {policy.time_cost}")
+        print(f"  password_hash_memory_cost: {policy.memory_cost}")
+        print(f"  password_hash_parallelism: {policy.parallelism}")
+    else:
+        print(f"  password_hash_rounds: {policy.rounds}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--algorithm", choices=["bcrypt", "argon2id"], default="bcrypt")
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--memory-cost", type=int, default=65536)
+    parser.add_argument("--parallelism", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Benchmarks the latency the `protected` decorator adds to a request.
+
+Run from the backend folder:
+    python -m benchmarks.protected_latency [--sessions 10000] [--requests 5000] [--backend sqlite] [--stateless] [--cookie-cache-size 10000]
+
+A throwaway session store is filled with sessions, then a protected handler is
+called repeatedly with a valid session cookie. Only the session store and cookie
+checks are measured - no HTTP server is started. Requests cycle through the
+sessions, so with a cookie cache smaller than --sessions every cookie is verified. The sqlite backend uses a temporary
+file, the redis backend uses the server from config.yml and clears its sessions.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+import jwt
+# pylint: disable=import-error
+from core.authentication import protected
+from core.cookies import CookieVerifier, session_cookie_data
+from core.general import load_config
+from core.session import SessionManager
+from core.storage import create_session_backend
+
+
+@protected
+async def handler(request):
+    """A protected handler that does no work of its own."""
+    return None
+
+
+async def run(session_count: int, request_count: int, backend: str, stateless: bool, cookie_cache_size: int|None):
+    """
+    Fills a session store and times protected requests against it.
+
+    Args:
+        session_count (int): The number of sessions to create.
+        request_count (int): The number of protected requests to time.
+        backend (str): The storage backend to benchmark.
+        stateless (bool): Benchmark stateless session cookies.
+        cookie_cache_size (int|None): The number of verified cookies remembered, None for the configured size.
+    """
+    config = load_config("config.yml")
+    config["storage"]["backend"] = backend
+    config["storage"]["sqlite"]["session_path"] = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    session = SessionManager(create_session_backend(config), config["session"]["record_cache_size"], stateless)
+    await session.async__init__()
+    await session.clear()
+
+    tokens = []
+    expiry = time.time() + config["session"]["session_max_age"]
+    for index in range(session_count):
+        token = f"benchmark-{index}"
+        await session.add(token, uuid.uuid4(), "127.0.0.1", expiry)
+        tokens.append(token)
+
+    if cookie_cache_size is None:
+        cookie_cache_size = config["session"]["verified_cookie_cache_size"]
+    cookie_verifier = CookieVerifier(
+        config["core"]["cookie_secret"],
+        config["core"]["cookie_algorithm"],
+        maxsize=cookie_cache_size,
+        max_age=config["session"]["session_max_age"]
+    )
+    app = SimpleNamespace(ctx=SimpleNamespace(config=config, session=session, cookie_verifier=cookie_verifier))
+    cookies = []
+    for token in tokens:
+        data = await session_cookie_data(SimpleNamespace(app=app), token)
+        cookies.append({
+            config["session"]["cookie_identifier"]: jwt.encode(
+                data,
+                config["core"]["cookie_secret"],
+                algorithm=config["core"]["cookie_algorithm"]
+            )
+        })
+
+    timings = []
+    for index in range(request_count):
+        request = SimpleNamespace(
+            app=app, ctx=SimpleNamespace(), cookies=cookies[index % len(cookies)], remote_addr="127.0.0.1"
+        )
+        started = time.perf_counter()
+        await handler(request)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    await session.close()
+
+    timings.sort()
+    print(
+        f"backend: {backend} stateless: {stateless} cookie cache: {cookie_cache_size} "
+        f"sessions: {session_count} requests: {request_count}"
+    )
+    print(f"mean: {statistics.mean(timings):.3f}ms")
+    print(f"p50: {timings[len(timings) // 2]:.3f}ms")
+    print(f"p99: {timings[int(len(timings) * 0.99)]:.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--backend", choices=["memory", "sqlite", "redis"], default="sqlite")
+    parser.add_argument("--stateless", action="store_true")
+    parser.add_argument("--cookie-cache-size", type=int, default=None)
+    arguments = parser.parse_args()
+    asyncio.run(run(
+        arguments.sessions, arguments.requests, arguments.backend, arguments.stateless, arguments.cookie_cache_size
+    ))
@@ -0,0 +1,86 @@
+"""
+Benchmarks session writes during a burst of concurrent logins.
+
+Run from the backend folder:
+    python -m benchmarks.session_writes [--logins 2000] [--backend sqlite] [--write-delay 0.005]
+
+Every login adds a session and sets its two-factor state, as the login views do. The
+burst is run once with every write committed on its own and once with the given
+write-behind delay, so the effect of group commit can be compared. The sqlite backend
+uses a temporary file, the redis backend uses the server from config.yml and clears
+its sessions.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+# pylint: disable=import-error
+from core.general import load_config
+from core.session import SessionManager
+from core.storage import create_session_backend
+
+
+async def login(session: SessionManager, index: int, expiry: float):
+    """
+    Creates a session the way a login with two-factor authentication does.
+
+    Args:
+        session (SessionManager): The session manager.
+        index (int): The number of the login.
+        expiry (float): The session expiry.
+    """
+    token = f"benchmark-{index}"
+    await session.add(token, uuid.uuid4(), "127.0.0.1", expiry)
+    await session.change_twofactor_auth_state(token, True)
+
+
+async def run(login_count: int, backend: str, write_delay: float):
+    """
+    Times a burst of concurrent logins, written through and written behind.
+
+    Args:
+        login_count (int): The number of concurrent logins.
+        backend (str): The storage backend to benchmark.
+        write_delay (float): The write-behind delay to compare against writing through.
+    """
+    config = load_config("config.yml")
+    config["storage"]["backend"] = backend
+    config["storage"]["sqlite"]["session_path"] = os.path.join(tempfile.mkdtemp(), "sessions.db")
+
+    for delay in (0, write_delay):
+        session = SessionManager(
+            create_session_backend(config),
+            record_cache_size=config["session"]["record_cache_size"],
+            write_delay=delay,
+            write_batch_size=config["session"]["write_behind_batch_size"]
+        )
+        await session.async__init__()
+        await session.clear()
+
+        expiry = time.time() + config["session"]["session_max_age"]
+        started = time.perf_counter()
+        await asyncio.gather(*(login(session, index, expiry) for index in range(login_count)))
+        accepted = time.perf_counter() - started
+        await session.flush()
+        committed = time.perf_counter() - started
+        stats = session.write_queue_stats()
+        await session.close()
+
+        print(f"backend: {backend} write delay: {delay}s logins: {login_count}")
+        print(f"  all logins answered: {accepted * 1000:.1f}ms")
+        print(f"  all writes committed: {committed * 1000:.1f}ms ({login_count / committed:.0f} logins/s)")
+        if delay:
+            sizes = {bucket: count for bucket, count in stats["batch_sizes"].items() if count}
+            print(f"  batches: {stats['batches_committed']} batch sizes (upper bound: count): {sizes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--backend", choices=["memory", "sqlite", "redis"], default="sqlite")
+    parser.add_argument("--write-delay", type=float, default=0.005)
+    arguments = parser.parse_args()
+    asyncio.run(run(arguments.logins, arguments.backend, arguments.write_delay))
@@ -0,0 +1,80 @@
+"""
+Benchmarks loading users through each `UsersDAL` projection against loading every column.
+
+Run from the backend folder:
+    python -m benchmarks.user_projections [--users 20000] [--lookups 2000] [--chunk-size 500]
+
+A temporary sqlite database is filled with users. For each projection every user is
+loaded in chunks by UUID, the way the cache is warmed up, and single users are looked
+up by UUID, the way the views load them, and the time per user is compared. Loading a
+user decrypts each encrypted column the projection includes, which is most of the cost.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+# pylint: disable=import-error
+from benchmarks.user_snapshot import fake_user
+from database.dals.user_dal import PROJECTIONS, UsersDAL
+from database.models.user import User
+
+
+async def run(user_count: int, lookup_count: int, chunk_size: int):
+    """
+    Fills a temporary user table and times loading it through each projection.
+
+    Args:
+        user_count (int): The number of users.
+        lookup_count (int): The number of single user lookups per projection.
+        chunk_size (int): The number of users loaded per query in bulk loads.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'users.db')}")
+    async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as connection:
+        await connection.run_sync(lambda sync: User.metadata.create_all(sync, tables=[User.__table__]))
+
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(fake_user(index) for index in range(user_count))
+    async with async_session() as session:
+        uuids = (await session.execute(select(User.uuid))).scalars().all()
+    lookups = random.Random(0).choices(uuids, k=lookup_count)
+
+    print(f"users: {len(uuids)} lookups: {lookup_count} chunk size: {chunk_size}")
+    for projection in (None, *PROJECTIONS):
+        started = time.perf_counter()
+        for index in range(0, len(uuids), chunk_size):
+            async with async_session() as session:
+                await UsersDAL(session).get_users_by_uuids(uuids[index:index + chunk_size], projection=projection)
+        bulk = time.perf_counter() - started
+
+        timings = []
+        for user_uuid in lookups:
+            started = time.perf_counter()
+            async with async_session() as session:
+                await UsersDAL(session).get_user_by_uuid(user_uuid, projection=projection)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        columns = len(User.__table__.columns) if projection is None else len(PROJECTIONS[projection])
+        print(f"{projection or 'all columns'} ({columns} columns):")
+        print(f"  bulk load: {bulk / len(uuids) * 1e6:.1f}us per user")
+        print(f"  lookup: mean {statistics.mean(timings):.3f}ms p50 {timings[len(timings) // 2]:.3f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    arguments = parser.parse_args()
+    asyncio.run(run(arguments.users, arguments.lookups, arguments.chunk_size))
@@ -0,0 +1,128 @@
+"""
+Benchmarks the user snapshot format of the user cache against pickling the `User` model.
+
+Run from the backend folder:
+    python -m benchmarks.user_snapshot [--users 20000]
+
+A temporary sqlite database is filled with users, which are loaded back through
+SQLAlchemy the way the views load them. Every user is then serialized and
+deserialized with pickle, as the cache used to store them, and as a `CachedUser`
+snapshot, and the time per user and the blob sizes are compared.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import pickle
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+# pylint: disable=import-error
+from core.snapshot import CachedUser
+from database.models.user import User
+
+
+def fake_user(index: int) -> User:
+    """
+    Creates a user with every field the views read filled in.
+
+    Args:
+        index (int): The number of the user.
+
+    Returns:
+        User: The user.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return User(
+        uuid=uuid.uuid4(),
+        username=f"benchmark-user-{index}",
+        email=f"benchmark-user-{index}@example.com",
+        email_verified=True,
+        password="$2b$12$" + "x" * 53,
+        avatar=f"https://example.com/avatars/{index}.png",
+        last_login=now,
+        latest_ip="203.0.113.7",
+        signup_ip="198.51.100.23",
+        max_sessions=5,
+        created_at=now - datetime.timedelta(days=index % 365),
+        google_account_identifier=str(100000000000000000000 + index) if index % 2 else None,
+        discord_account_identifier=None,
+        github_account_identifier=None,
+        two_factor_authentication_enabled=bool(index % 3),
+        two_factor_authentication_secret="JBSWY3DPEHPK3PXP" * 2,
+        setting_up_two_factor_authentication=False,
+        is_root_admin=False,
+        staff_level=0,
+    )
+
+
+def measure(name: str, users: list, dumps, loads):
+    """
+    Times serializing and deserializing every user and prints the results.
+
+    Args:
+        name (str): The name of the format.
+        users (list): The users to serialize.
+        dumps: Serializes a user to bytes.
+        loads: Deserializes bytes to a user.
+    """
+    started = time.perf_counter()
+    blobs = [dumps(user) for user in users]
+    dumped = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for blob in blobs:
+        loads(blob)
+    loaded = time.perf_counter() - started
+
+    sizes = [len(blob) for blob in blobs]
+    print(f"{name}:")
+    print(f"  serialize: {dumped / len(users) * 1e6:.2f}us per user")
+    print(f"  deserialize: {loaded / len(users) * 1e6:.2f}us per user")
+    print(f"  size: mean {statistics.mean(sizes):.0f} bytes, total {sum(sizes) / 1024:.0f} KiB")
+
+
+async def run(user_count: int):
+    """
+    Fills a temporary user table and compares the cache formats on it.
+
+    Args:
+        user_count (int): The number of users.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'users.db')}")
+    async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as connection:
+        await connection.run_sync(lambda sync: User.metadata.create_all(sync, tables=[User.__table__]))
+
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(fake_user(index) for index in range(user_count))
+    async with async_session() as session:
+        users = (await session.execute(select(User))).scalars().all()
+    await engine.dispose()
+
+    print(f"users: {len(users)}")
+    measure(
+        "pickle (User model)",
+        users,
+        lambda user: pickle.dumps(user, pickle.HIGHEST_PROTOCOL),
+        pickle.loads
+    )
+    measure(
+        "snapshot (CachedUser)",
+        users,
+        lambda user: CachedUser.from_user(user).dumps(),
+        CachedUser.loads
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    arguments = parser.parse_args()
+    asyncio.run(run(arguments.users))
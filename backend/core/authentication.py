@@ -3,13 +3,14 @@
 This module provides functions for authentication and authorization in the application.
 """
 
-import re
-from sanic import BadRequest, Unauthorized, Request
+import uuid
 import jwt
+from sanic import BadRequest, Unauthorized, Request
 import sanic
 import sanic.request
 
-from core.cookies import get_session_id
+from core.cookies import get_session_claims
+from core.session import SessionRecord
 
 def check_for_cookie(request):
     """
@@ -27,6 +28,43 @@ def check_for_cookie(request):
         return False
     return True
 
+async def resolve_session(request: Request) -> SessionRecord|None:
+    """
+    Resolves the session of the request, at most once per request.
+
+    The result is kept on `request.ctx` so every decorator in the stack shares
+    the same cookie decode and session lookup. In stateless mode a cookie carrying
+    the session record is trusted as long as its signature and expiry are valid and
+    the session has not been revoked - the session store is not touched.
+
+    Resolved sessions have their activity recorded in memory, see `SessionManager.record_activity`.
+
+    Args:
+        request: The request object.
+
+    Returns:
+        SessionRecord|None: The session record, or None if the session is invalid.
+    """
+    if not hasattr(request.ctx, "session_record"):
+        session = request.app.ctx.session
+        try:
+            claims = get_session_claims(request)
+        except jwt.ExpiredSignatureError:
+            claims = {}
+        session_id = claims.get("session_id")
+        if session_id is None:
+            request.ctx.session_record = None
+        elif session.stateless and "uuid" in claims:
+            if session.is_revoked(session_id):
+                request.ctx.session_record = None
+            else:
+                request.ctx.session_record = SessionRecord(uuid.UUID(claims["uuid"]), claims["exp"], claims["tfa"])
+        else:
+            request.ctx.session_record = await session.resolve(session_id)
+        if request.ctx.session_record is not None:
+            session.record_activity(session_id, request.remote_addr or request.ip)
+    return request.ctx.session_record
+
 async def check_authorization(request: Request):
     """ 
     Checks if the cookie is present and session is valid. 
@@ -42,14 +80,7 @@ async def check_authorization(request: Request):
     """
     if not check_for_cookie(request):
         raise Unauthorized("Authentication required.")
-    cookie = jwt.decode(
-        request.cookies.get(request.app.ctx.config['session']['cookie_identifier']),
-        request.app.ctx.config["core"]["cookie_secret"],
-        algorithms=[request.app.ctx.config["core"]["cookie_algorithm"]]
-    )
-    if cookie["session_id"] is None:
-        raise Unauthorized("Authentication required.")
-    if not await request.app.ctx.session.check_session_token(cookie["session_id"]):
+    if await resolve_session(request) is None:
         raise Unauthorized("Authentication required.")
     return True
 
@@ -73,8 +104,7 @@ def protected(myfunc):
             raise Unauthorized("Authentication required.")
 
         if request.app.ctx.config["2fa"]["enabled"] is True:
-            session_id = get_session_id(request)
-            if await request.app.ctx.session.get_twofactor_auth_state(session_id) is True:
+            if (await resolve_session(request)).two_factor_pending is True:
                 raise Unauthorized("Two-factor authentication verification required prior to accessing any protected routes.")
 
         response = await myfunc(request, *args, **kwargs)
@@ -130,55 +160,33 @@ def root_admin_only(myfunc):
         return response
     return wrapper_func
 
-## restrict to staff level
-## this will be configurable 
-
 def staff_only(myfunc):
+    """
+    Decorator function to protect routes by checking if the user's staff level was granted the route.
+
+    Root admins may access every route. The permissions are looked up by the (version, route)
+    key every route is registered with, see `StaffPermissions`.
+
+    Args:
+        myfunc: The function to be wrapped.
+
+    Returns:
+        The wrapped function.
+
+    Raises:
+        Unauthorized: If authentication is required or the staff level was not granted the route.
+    """
     async def wrapper_func(request: sanic.Request, *args, **kwargs):
         is_authenticated = await check_authorization(request)
         if not is_authenticated:
             raise Unauthorized("Authentication required.")
         user = await request.app.ctx.cache.get(request)
-        if not user.staff_level:
-            raise Unauthorized("Staff only.")
-        
-        ## fetch the route endpoint and remove /api/{version}/ using regex from path
-        context_path = request.app.ctx.config['routing']['context_path']
-        enabled_versions = request.app.ctx.config['routing']['enabled_versions']
-
-        request_info = None
-
-        for version in enabled_versions:
-            if version in request.path:
-                request_version = version
-                pattern = re.escape(f"{context_path}/{version}")
-                request_path = re.sub(f"^{pattern}", "", request.path)
-                request_path = f"/{request_path.lstrip('/')}"
-
-                request_info = (request_version, request_path)
-                break
-        
-        staff_level = user.staff_level
-
-        #has_access = await staff_can_access(staff_level, request_version, request_path)
-        
-        #if not has_access:
-        #    raise Unauthorized("Access denied.")
-
-        # req_version, req_path = request_info
-
-
-        # check if the user has access to the route
-        ## database with staff level permissions creatable by a user. incremental numbers.
-        ### these staff levels can have routes asigned to them i.e. with a version and path
-        #### check the user's staff level in the user table
-        ##### check if the users staff level has access to the spesified route by checking stafflevels table
-        ###### if the user has access to the route, continue, else raise Unauthorized
-
-
-
-
-
+        if not user.is_root_admin:
+            if not user.staff_level:
+                raise Unauthorized("Staff only.")
+            route = getattr(request.route.ctx, "staff_route", None)
+            if route is None or not request.app.ctx.staff_permissions.allows(user.staff_level, route):
+                raise Unauthorized("Access denied.")
         response = await myfunc(request, *args, **kwargs)
         return response
-    return wrapper_func
\ No newline at end of file
+    return wrapper_func
@@ -2,38 +2,134 @@
 """
 This module provides functions for caching user information in the application.
 """
-
-import pickle
+import asyncio
+import math
+import time
+import uuid
 from sanic import Sanic
 from sanic import Unauthorized
+from sanic.log import logger
 import sanic
 # pylint: disable=import-error
 # - to fix
 from database.models.user import User
+from database.dals.user_dal import UsersDAL
+from database import db
 from core.cookies import get_session_id
-
-import aiosqlite
+from core.authentication import resolve_session
+from core.storage.base import CacheBackend
+from core.snapshot import CachedUser
+from core.lru import TTLCache
+from core.metrics import Registry
 
 class Cache:
     """
-    A caching manager that stores cache in a SQLite database.
+    A caching manager that stores users in a `CacheBackend` (see `core.storage`).
+
+    Users are stored as `CachedUser` snapshots, see `core.snapshot`. A user missing from the
+    cache is read through from the database, with concurrent misses for the same user sharing
+    a single query. Every worker also keeps the users it read most recently in memory, in
+    front of the backend. Those local copies are kept consistent through the backend's change
+    log: at most every `sync_interval` seconds a read pulls the users other workers changed
+    since the last pull and drops them, so they are read again from the backend.
+
+    The backend is bounded by `prune`, which drops users stored more than `ttl` seconds ago
+    and then the least recently read users beyond `max_entries` or `max_bytes`. Reads are
+    collected in memory and recorded in the backend by `prune`, not on every request.
+
+    Hits, misses, latencies and evictions are recorded in a metrics `Registry`.
 
     Attributes:
-        db_path (str): The path to the SQLite database file.
+        backend (CacheBackend): The storage the cached users are kept in.
+        local (TTLCache): The users kept in memory, by hex UUID.
+        sync_interval (float): The longest a local copy can lag behind a change made by another worker.
+        ttl (float): Seconds a user is kept after being stored - 0 keeps them until evicted.
+        max_entries (int): The most users kept in the backend - 0 for no limit.
+        max_bytes (int): The most bytes of user data kept in the backend - 0 for no limit.
     """
 
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        backend: CacheBackend,
+        local_size: int = 10000,
+        sync_interval: float = 1.0,
+        ttl: float = 0,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        metrics: Registry|None = None
+    ):
         """
-        Initializes the session manager.
+        Initializes the cache.
 
         Args:
-            db_path (str): The path to the SQLite database file.
+            backend (CacheBackend): The storage the cached users are kept in.
+            local_size (int): The number of users kept in memory.
+            sync_interval (float): Seconds between pulls of the change log - 0 pulls it on every read.
+            ttl (float): Seconds a user is kept after being stored - 0 keeps them until evicted.
+            max_entries (int): The most users kept in the backend - 0 for no limit.
+            max_bytes (int): The most bytes of user data kept in the backend - 0 for no limit.
+            metrics (Registry|None): The registry to record metrics in - a private one if None.
         """
-        self.db_path = db_path
+        self.backend = backend
+        self.local = TTLCache(local_size)
+        self.sync_interval = sync_interval
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._accessed = set()
+        self.version = None
+        self._next_sync = 0.0
+        # Bumped whenever local copies are replaced or dropped, so a read that raced
+        # with it does not keep what it read.
+        self._invalidations = 0
+        self._loading = {}
+        self._sync_lock = asyncio.Lock()
+        self.metrics = metrics if metrics is not None else Registry()
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        """
+        Registers the user cache metrics, keeping the children used on hot paths.
+        """
+        metrics = self.metrics
+        lookups = metrics.counter(
+            "user_cache_lookups_total", "User lookups by where the user was found.", ("source",)
+        )
+        self._lookups_memory = lookups.labels("memory")
+        self._lookups_backend = lookups.labels("backend")
+        self._lookups_database = lookups.labels("database")
+        self._lookups_missing = lookups.labels("missing")
+        self._lookups_coalesced = metrics.counter(
+            "user_cache_coalesced_loads_total", "Lookups that waited on a load already in flight for the same user."
+        )
+        self._lookup_seconds = metrics.histogram("user_cache_lookup_seconds", "Time taken to look up a user.")
+        self._load_seconds = metrics.histogram(
+            "user_cache_load_seconds", "Time taken to load a user missing from memory, by where they were found.", ("source",)
+        )
+        self._write_seconds = metrics.histogram("user_cache_write_seconds", "Time taken to store or remove a user in the backend.")
+        self._invalidated = metrics.counter(
+            "user_cache_invalidations_total", "Users dropped from memory after another worker changed them."
+        )
+        self._pruned = metrics.counter(
+            "user_cache_evictions_total", "Users removed from the backend for their age or the size limits."
+        )
+        metrics.counter(
+            "user_cache_local_evictions_total", "Users dropped from memory as least recently used or expired.",
+            function=lambda: self.local.evictions
+        )
+        metrics.gauge("user_cache_local_entries", "Users kept in memory.", lambda: len(self.local))
+        metrics.gauge("user_cache_entries", "Users in the backend.", self._backend_entries)
+        metrics.gauge("user_cache_bytes", "Bytes of user data in the backend.", self._backend_bytes)
+
+    async def _backend_entries(self) -> int:
+        return (await self.backend.stats())[0]
+
+    async def _backend_bytes(self) -> int:
+        return (await self.backend.stats())[1]
 
     async def async__init__(self):
         """
-        Initializes the caching object and creates the Sessions table if it doesn't exist.
+        Initializes the caching object by opening its backend.
 
         Args:
             self (Caching): The Caching object.
@@ -41,15 +137,116 @@ class Cache:
         Returns:
             None
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS Sessions (
-                    user_identifier TEXT PRIMARY KEY,
-                    data BLOB,
-                    cached_at INTEGER DEFAULT (strftime('%s', 'now'))
-                )
-            ''')
-            await db.commit()
+        await self.backend.open()
+        self.version = await self.backend.version()
+
+    async def sync(self) -> None:
+        """
+        Drops the local copies of users changed by other workers, unless the change log was
+        pulled less than `sync_interval` seconds ago.
+
+        Concurrent reads wait for a single pull.
+
+        Returns:
+            None
+        """
+        if time.monotonic() < self._next_sync:
+            return
+        async with self._sync_lock:
+            if time.monotonic() < self._next_sync:
+                return
+            version, changed = await self.backend.changes_since(self.version)
+            if changed:
+                self._invalidations += 1
+            if self.backend.EVERYTHING in changed:
+                self._invalidated.inc(len(self.local))
+                self.local.clear()
+            else:
+                for user_identifier in changed:
+                    if self.local.pop(user_identifier) is not None:
+                        self._invalidated.inc()
+            self.version = version
+            self._next_sync = time.monotonic() + self.sync_interval
+
+    async def close(self) -> None:
+        """
+        Closes the backend.
+
+        Returns:
+            None
+        """
+        await self.backend.close()
+
+    async def clear(self) -> None:
+        """
+        Removes every user from the cache.
+
+        Returns:
+            None
+        """
+        await self.backend.clear()
+        self._invalidations += 1
+        self.local.clear()
+
+    def _local_expiry(self) -> float:
+        """
+        Returns when a user kept in memory now expires, so local copies honour the TTL too.
+
+        Returns:
+            float: The Unix timestamp.
+        """
+        return time.time() + self.ttl if self.ttl else math.inf
+
+    async def prune(self) -> int:
+        """
+        Records the reads since the last prune, then removes users stored more than `ttl`
+        seconds ago and the least recently read users beyond the size limits.
+
+        Returns:
+            int: The number of users removed.
+        """
+        accessed, self._accessed = self._accessed, set()
+        now = time.time()
+        await self.backend.touch(list(accessed), now)
+        removed = await self.backend.prune(
+            now - self.ttl if self.ttl else None,
+            self.max_entries or None,
+            self.max_bytes or None
+        )
+        self._pruned.inc(removed)
+        if removed:
+            entries, size = await self.backend.stats()
+            logger.info(f"User cache pruned: {removed} users removed, {entries} users ({size} bytes) left.")
+        return removed
+
+    async def stats(self) -> dict:
+        """
+        Returns the size of the cache.
+
+        Returns:
+            dict: The number of users and bytes in the backend, and the number of users kept in memory.
+        """
+        entries, size = await self.backend.stats()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "local_entries": len(self.local),
+        }
+
+    async def _store(self, user: CachedUser) -> None:
+        """
+        Writes a user to the backend and keeps it in memory.
+
+        Args:
+            user (CachedUser): The user to store.
+
+        Returns:
+            None
+        """
+        with self._write_seconds.time():
+            await self.backend.set(user.uuid.hex, user.dumps())
+        self._invalidations += 1
+        self.local.set(user.uuid.hex, user, self._local_expiry())
 
     async def add(self, user_info) -> None:
         """
@@ -61,14 +258,25 @@ class Cache:
         Returns:
             None
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'INSERT OR REPLACE INTO Sessions (user_identifier, data) VALUES (?, ?)',
-                (user_info.uuid.hex, pickle.dumps(user_info, pickle.HIGHEST_PROTOCOL,))
-            )
-            await db.commit()
+        await self._store(CachedUser.from_user(user_info))
 
-    async def get(self, request: sanic.Request) -> User:
+    async def add_many(self, user_infos: list) -> int:
+        """
+        Add several users to the cache at once, skipping users already cached.
+
+        Used to warm up the cache, so it never overwrites what a concurrent update stored.
+        The users are only kept in memory once they are read.
+
+        Args:
+            user_infos (list): The users to be added.
+
+        Returns:
+            int: The number of users added.
+        """
+        users = [CachedUser.from_user(user_info) for user_info in user_infos]
+        return await self.backend.add_many([(user.uuid.hex, user.dumps()) for user in users])
+
+    async def get(self, request: sanic.Request) -> CachedUser:
         """
         Retrieve a user object from the cache based on the session ID.
 
@@ -76,24 +284,91 @@ class Cache:
             request (sanic.Request): The request object containing the session ID.
 
         Returns:
-            User: The user object retrieved from the cache.
+            CachedUser: The snapshot of the user retrieved from the cache.
 
         Raises:
             Unauthorized: If authentication is required or the session ID is invalid.
         """
-        app = Sanic.get_app()
-        uuid = await app.ctx.session.get(get_session_id(request))
+        record = await resolve_session(request)
 
-        if uuid is None:
+        if record is None:
             return Unauthorized("Authentication required.")
 
-        async with aiosqlite.connect(self.db_path) as db:
-            query = 'SELECT data FROM Sessions WHERE user_identifier = ?'
-            params = (uuid.hex,)
-            async with db.execute(query, params) as cursor:
-                row = await cursor.fetchone()
-                if row is not None:
-                    return pickle.loads(row[0])
+        with self._lookup_seconds.time():
+            await self.sync()
+            self._accessed.add(record.uuid.hex)
+            user = self.local.get(record.uuid.hex)
+            if user is not None:
+                self._lookups_memory.inc()
+                return user
+            return await self.load(record.uuid)
+
+    async def load(self, user_uuid: uuid.UUID) -> CachedUser|None:
+        """
+        Reads a user from the backend, or from the database if the backend does not hold them.
+
+        Concurrent calls for the same user share one read, so a cold cache under load does not
+        send a query per request to the database.
+
+        Args:
+            user_uuid (uuid.UUID): The UUID of the user.
+
+        Returns:
+            CachedUser|None: The user, or None if they do not exist.
+        """
+        user_identifier = user_uuid.hex
+        loading = self._loading.get(user_identifier)
+        if loading is None:
+            loading = self._loading[user_identifier] = asyncio.ensure_future(self._fetch(user_uuid))
+            loading.add_done_callback(lambda _: self._loading.pop(user_identifier, None))
+        else:
+            self._lookups_coalesced.inc()
+        # Shielded, so a cancelled request does not cancel the read other requests wait for.
+        return await asyncio.shield(loading)
+
+    async def _fetch(self, user_uuid: uuid.UUID) -> CachedUser|None:
+        """
+        Reads a user for `load`, filling the backend from the database on a miss.
+
+        Args:
+            user_uuid (uuid.UUID): The UUID of the user.
+
+        Returns:
+            CachedUser|None: The user, or None if they do not exist.
+        """
+        started = time.perf_counter()
+        user_identifier = user_uuid.hex
+        invalidations = self._invalidations
+        data = await self.backend.get(user_identifier)
+        user = None
+        try:
+            if data is not None:
+                user = CachedUser.loads(data)
+        except ValueError:
+            # Stored in an older format - replaced below, as `add` would keep it.
+            await self.backend.delete(user_identifier)
+        if user is None:
+            async with db.async_session() as session:
+                async with session.begin():
+                    db_user = await UsersDAL(session).get_user_by_uuid(user_uuid, projection="profile")
+            if db_user is None:
+                self._lookups_missing.inc()
+                self._load_seconds.labels("missing").observe(time.perf_counter() - started)
+                return None
+            user = CachedUser.from_user(db_user)
+            # Only stored if still missing - an update made meanwhile holds newer data.
+            await self.backend.add(user_identifier, user.dumps())
+            self._lookups_database.inc()
+            self._load_seconds.labels("database").observe(time.perf_counter() - started)
+        else:
+            self._lookups_backend.inc()
+            self._load_seconds.labels("backend").observe(time.perf_counter() - started)
+
+        # Not kept if local copies were replaced or dropped during the read, as what was
+        # read may be older than them.
+        if self._invalidations == invalidations:
+            self.local.set(user_identifier, user, self._local_expiry())
+        return user
 
     async def update(self, user_info: User) -> None:
         """
@@ -105,13 +380,7 @@ class Cache:
         Returns:
             None
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'INSERT OR REPLACE INTO Sessions (user_identifier, data) '
-                'VALUES (?, ?)',
-                (user_info.uuid.hex, pickle.dumps(user_info, pickle.HIGHEST_PROTOCOL,))
-            )
-            await db.commit()
+        await self._store(CachedUser.from_user(user_info))
 
     async def remove(self, uuid: str) -> None:
         """
@@ -123,9 +392,10 @@ class Cache:
         Returns:
             None
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM Sessions WHERE user_identifier = ?', (uuid.hex,))
-            await db.commit()
+        with self._write_seconds.time():
+            await self.backend.delete(uuid.hex)
+        self._invalidations += 1
+        self.local.pop(uuid.hex)
 
     async def get_user(self, request: sanic.Request) -> dict:
         """
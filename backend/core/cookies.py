@@ -2,9 +2,64 @@
 This module provides functions for handling cookies.
 """
 
+import time
+import types
 import jwt
 from sanic import json, Sanic
 from sanic.request import Request
+# pylint: disable=import-error
+from core.lru import TTLCache
+
+
+class CookieVerifier:
+    """
+    Verifies signed session cookies, remembering the ones it already verified.
+
+    Verifying a cookie means checking its HMAC signature, which is the bulk of the cost
+    of an authenticated request that is otherwise answered from memory. The claims of
+    recently verified cookies are kept in a bounded LRU until the cookie's expiry, so a
+    client repeating requests with the same cookie is only verified once. A cookie string
+    can only be in the cache if its signature was valid, so a hit needs no further checks.
+    """
+
+    def __init__(self, secret: str, algorithm: str, maxsize: int = 10000, max_age: float = 604800):
+        """
+        Initializes the verifier.
+
+        Args:
+            secret (str): The secret the cookies are signed with.
+            algorithm (str): The signing algorithm.
+            maxsize (int): The number of verified cookies remembered - 0 verifies every cookie.
+            max_age (float): Seconds a cookie without an expiry of its own is remembered for.
+        """
+        self.secret = secret
+        self.algorithms = [algorithm]
+        self.max_age = max_age
+        self._verified = TTLCache(maxsize) if maxsize > 0 else None
+
+    def verify(self, cookie: str|None) -> types.MappingProxyType:
+        """
+        Verifies a cookie and decodes its claims.
+
+        Args:
+            cookie (str|None): The cookie value.
+
+        Returns:
+            types.MappingProxyType: The read-only claims, shared between every request carrying the cookie.
+
+        Raises:
+            jwt.exceptions.DecodeError: If the cookie cannot be decoded.
+            jwt.exceptions.ExpiredSignatureError: If the cookie carries an expiry that has passed.
+        """
+        if self._verified is not None and cookie is not None:
+            claims = self._verified.get(cookie)
+            if claims is not None:
+                return claims
+        claims = types.MappingProxyType(jwt.decode(cookie, self.secret, algorithms=self.algorithms))
+        if self._verified is not None:
+            self._verified.set(cookie, claims, claims.get("exp", time.time() + self.max_age))
+        return claims
+
 
 def send_oauth_cookie(request: Request, response, identifier: str, data: dict):
     """
@@ -96,6 +151,20 @@ def send_cookie(request: Request, message:str, data: dict):
         "code": 200,
         "request_id": str(request.id)
     }, status=200)
+    return add_session_cookie(request, response, data)
+
+def add_session_cookie(request: Request, response, data: dict):
+    """
+    Sets the session cookie on a response.
+
+    Args:
+        request (Request): The request object.
+        response: The response object.
+        data (dict): The data to encode in the cookie.
+
+    Returns:
+        response: The response object with the cookie set.
+    """
     response.add_cookie(
         request.app.ctx.config['session']['cookie_identifier'],
         jwt.encode(data, 
@@ -110,6 +179,95 @@ def send_cookie(request: Request, message:str, data: dict):
     )
     return response
 
+async def session_cookie_data(request: Request, session_id: str) -> dict:
+    """
+    Builds the data encoded in a session cookie.
+
+    The time the cookie was issued is always included, so it can be renewed under sliding
+    expiry. In stateless mode the cookie also carries the user, expiry and two-factor state
+    of the session, so requests can be authorized from the cookie alone.
+
+    Args:
+        request (Request): The request object.
+        session_id (str): The session ID.
+
+    Returns:
+        dict: The data to encode in the cookie.
+    """
+    data = {"session_id": session_id, "iat": int(time.time())}
+    if request.app.ctx.session.stateless:
+        record = await request.app.ctx.session.resolve(session_id)
+        if record is not None:
+            data["uuid"] = record.uuid.hex
+            data["exp"] = int(record.expiry)
+            data["tfa"] = record.two_factor_pending
+    return data
+
+async def refresh_session_cookie(request: Request, response):
+    """
+    Reissues the session cookie of a request after its session changed.
+
+    Only needed in stateless mode, where the cookie carries the session state.
+
+    Args:
+        request (Request): The request object.
+        response: The response object.
+
+    Returns:
+        response: The response object, with the new cookie set in stateless mode.
+    """
+    if not request.app.ctx.session.stateless:
+        return response
+    return add_session_cookie(request, response, await session_cookie_data(request, get_session_id(request)))
+
+async def renew_session_cookie(request: Request, response):
+    """
+    Reissues the session cookie under sliding expiry once half of its lifetime has passed.
+
+    Without this the browser would drop the cookie at its original max age, however far
+    the session's expiry was pushed forward.
+
+    Args:
+        request (Request): The request object.
+        response: The response object.
+
+    Returns:
+        response: The response object, with the new cookie set if it was due for renewal.
+    """
+    session = request.app.ctx.session
+    if not session.sliding_expiry or getattr(request.ctx, "session_record", None) is None:
+        return response
+    if time.time() - request.ctx.session_claims.get("iat", 0) < session.sliding_expiry / 2:
+        return response
+    session_id = get_session_id(request)
+    # The session may have been deleted while handling the request, e.g. on logout.
+    if await session.resolve(session_id) is None:
+        return response
+    return add_session_cookie(request, response, await session_cookie_data(request, session_id))
+
+def get_session_claims(request) -> types.MappingProxyType:
+    """
+    Decode the session cookie of the request.
+
+    The cookie is only decoded once per request, the result is kept on `request.ctx`.
+    Cookies seen recently skip the signature check, see `CookieVerifier`.
+
+    Args:
+        request (Request): The request object.
+
+    Returns:
+        types.MappingProxyType: The read-only data encoded in the cookie.
+
+    Raises:
+        jwt.exceptions.DecodeError: If the cookie cannot be decoded.
+        jwt.exceptions.ExpiredSignatureError: If the cookie carries an expiry that has passed.
+    """
+    if not hasattr(request.ctx, "session_claims"):
+        request.ctx.session_claims = request.app.ctx.cookie_verifier.verify(
+            request.cookies.get(request.app.ctx.config['session']['cookie_identifier'])
+        )
+    return request.ctx.session_claims
+
 def get_session_id(request):
     """
     Retrieve the session ID from the request cookies.
@@ -123,12 +281,7 @@ def get_session_id(request):
     Raises:
         jwt.exceptions.DecodeError: If the session ID cannot be decoded from the cookie.
     """
-    decoded = jwt.decode(
-        request.cookies.get(request.app.ctx.config['session']['cookie_identifier']),
-        request.app.ctx.config["core"]["cookie_secret"],
-        algorithms=[request.app.ctx.config["core"]["cookie_algorithm"]]
-    )
-    return decoded["session_id"]
+    return get_session_claims(request).get("session_id")
 
 async def get_cookie(request):
     """
@@ -141,13 +294,7 @@ async def get_cookie(request):
         The decoded cookie value.
 
     """
-    app = Sanic.get_app()
-    return jwt.decode(
-        request.cookies.get(
-            app.ctx.config['session']['cookie_identifier']),
-            request.app.ctx.config["core"]["cookie_secret"],
-            algorithms=[request.app.ctx.config["core"]["cookie_algorithm"]]
-    )
+    return get_session_claims(request)
 
 
 async def remove_cookie(response):
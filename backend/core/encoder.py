@@ -1,27 +1,350 @@
 """
-This module provides functions for hashing and checking passwords using bcrypt.
+This module provides functions for hashing and checking passwords using bcrypt or argon2id.
 """
 
-import aiobcrypt
+import asyncio
+import concurrent.futures
+import os
+import time
+from typing import NamedTuple
+import bcrypt
+try:
+    import argon2
+except ImportError: # argon2-cffi is only needed for argon2id hashes
+    argon2 = None
+from sanic import Sanic
+from sanic.exceptions import ServiceUnavailable
+from sanic.log import logger
+# pylint: disable=import-error
+from core.metrics import Registry
+from database import db
+from database.dals.user_dal import UsersDAL
 
-async def hash_password(password: bytes) -> str:
+ALGORITHMS = ("bcrypt", "argon2id")
+BCRYPT_PREFIXES = ("2a", "2b", "2y")
+
+
+class HashPolicy(NamedTuple):
     """
-    Hashes the given password using bcrypt.
+    The algorithm and cost of a password hash.
+
+    Only the fields of the algorithm are used - `rounds` for bcrypt, and `time_cost`,
+    `memory_cost` (in KiB) and `parallelism` for argon2id.
+    """
+    algorithm: str = "bcrypt"
+    rounds: int = 12
+    time_cost: int = 3
+    memory_cost: int = 65536
+    parallelism: int = 1
+
+    def normalized(self) -> "HashPolicy":
+        """
+        Returns the policy with the fields its algorithm does not use reset, so policies compare by what matters.
+        """
+        if self.algorithm == "bcrypt":
+            return HashPolicy(self.algorithm, rounds=self.rounds)
+        return HashPolicy(
+            self.algorithm, time_cost=self.time_cost, memory_cost=self.memory_cost, parallelism=self.parallelism
+        )
+
+
+def identify(hashed_password: bytes|str) -> HashPolicy|None:
+    """
+    Reads the algorithm and cost a password hash was made with.
+
+    Hashes are stored in the modular crypt format, whose leading `$<identifier>$` field
+    versions them - `$2b$<rounds>$...` for bcrypt and `$argon2id$v=19$m=<memory>,t=<time>,p=<parallelism>$...`
+    for argon2id - so hashes made under any policy can be checked side by side.
 
     Args:
-        password (bytes): The password to be hashed.
+        hashed_password (bytes|str): The password hash.
 
     Returns:
-        str: The hashed password.
+        HashPolicy|None: The normalized policy of the hash, or None if the format is not recognized.
+    """
+    if isinstance(hashed_password, bytes):
+        hashed_password = hashed_password.decode("ascii", "replace")
+    fields = hashed_password.split("$")
+    try:
+        if len(fields) == 4 and fields[1] in BCRYPT_PREFIXES:
+            return HashPolicy("bcrypt", rounds=int(fields[2]))
+        if len(fields) == 6 and fields[1] == "argon2id":
+            parameters = dict(parameter.split("=", 1) for parameter in fields[3].split(","))
+            return HashPolicy(
+                "argon2id",
+                time_cost=int(parameters["t"]),
+                memory_cost=int(parameters["m"]),
+                parallelism=int(parameters["p"])
+            )
+    except (ValueError, KeyError):
+        pass
+    return None
+
+
+def _argon2(policy: HashPolicy|None = None):
+    """
+    Returns an argon2id hasher for a policy, or for checking hashes if None.
+
+    Raises:
+        RuntimeError: If argon2-cffi is not installed.
+    """
+    if argon2 is None:
+        raise RuntimeError("argon2id password hashes need the argon2-cffi package to be installed.")
+    if policy is None:
+        return argon2.PasswordHasher()
+    return argon2.PasswordHasher(
+        time_cost=policy.time_cost,
+        memory_cost=policy.memory_cost,
+        parallelism=policy.parallelism,
+        type=argon2.Type.ID
+    )
+
+
+def _hash(password: bytes, policy: HashPolicy) -> tuple[bytes, float]:
+    """
+    Hashes a password in a hashing thread.
+
+    Returns:
+        tuple[bytes, float]: The hashed password and the seconds hashing took.
+    """
+    started = time.perf_counter()
+    if policy.algorithm == "argon2id":
+        hashed_password = _argon2(policy).hash(password).encode()
+    else:
+        hashed_password = bcrypt.hashpw(password, bcrypt.gensalt(policy.rounds))
+    return hashed_password, time.perf_counter() - started
+
+
+def _check(password: bytes, hashed_password: bytes) -> tuple[bool, float]:
+    """
+    Checks a password in a hashing thread, with the algorithm the hash was made with.
+
+    Returns:
+        tuple[bool, float]: Whether the password matches and the seconds checking took.
+    """
+    started = time.perf_counter()
+    if hashed_password.startswith(b"$argon2"):
+        if argon2 is None:
+            logger.error("An argon2id password hash cannot be checked without the argon2-cffi package.")
+            return False, time.perf_counter() - started
+        try:
+            matches = _argon2().verify(hashed_password, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+            matches = False
+    else:
+        matches = bcrypt.checkpw(password, hashed_password)
+    return matches, time.perf_counter() - started
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords in a dedicated, bounded pool of threads.
+
+    bcrypt and argon2id release the GIL while they hash, so the threads hash in parallel
+    without blocking the event loop. Sanic workers are daemon processes, which cannot start
+    processes of their own, and each worker has its own pool - size it so the threads of every
+    worker together do not exceed the CPU cores. At most `queue_size` requests wait for a free
+    thread - beyond that new ones are refused straight away with 503 Service Unavailable, so a
+    login storm cannot build a backlog that every other request then waits behind.
+
+    New hashes are made under the configured `HashPolicy`, while hashes made under any other
+    are still checked. After a successful login `upgrade` rehashes a password whose hash does
+    not match the policy, so the cost can be raised, or the algorithm changed, without resets.
+
+    The time spent waiting for a thread and the time spent hashing are recorded separately.
+    """
+
+    def __init__(self, threads: int = 0, queue_size: int = 64, policy: HashPolicy = HashPolicy(), metrics: Registry|None = None):
+        """
+        Initializes the hasher.
+
+        Args:
+            threads (int): The number of hashing threads - 0 for one per core.
+            queue_size (int): The number of requests allowed to wait for a free thread.
+            policy (HashPolicy): The algorithm and cost of new hashes.
+            metrics (Registry|None): The registry to record metrics in - a private one if None.
+
+        Raises:
+            ValueError: If the algorithm of the policy is not supported.
+            RuntimeError: If the policy is argon2id and argon2-cffi is not installed.
+        """
+        if policy.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported password hash algorithm {policy.algorithm!r}, expected one of {ALGORITHMS}.")
+        if policy.algorithm == "argon2id":
+            _argon2(policy)
+        self.threads = threads or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.policy = policy.normalized()
+        self.metrics = metrics if metrics is not None else Registry()
+        self._pool = None
+        self._pending = 0
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        """
+        Registers the password hashing metrics, keeping the children used on hot paths.
+        """
+        metrics = self.metrics
+        queue_seconds = metrics.histogram(
+            "password_hash_queue_seconds", "Time requests waited for a free hashing thread, by operation.", ("operation",)
+        )
+        hash_seconds = metrics.histogram(
+            "password_hash_seconds", "Time taken to hash or check a password in a hashing thread, by operation.", ("operation",)
+        )
+        self._queue_seconds = {operation: queue_seconds.labels(operation) for operation in ("hash", "check")}
+        self._hash_seconds = {operation: hash_seconds.labels(operation) for operation in ("hash", "check")}
+        self._rejected = metrics.counter(
+            "password_hash_rejected_total", "Requests refused because too many were already waiting to be hashed."
+        )
+        self._upgraded = metrics.counter(
+            "password_hash_upgrades_total", "Password hashes replaced after a login because they did not match the policy."
+        )
+        metrics.gauge("password_hash_pending", "Requests being hashed or waiting for a hashing thread.", lambda: self._pending)
+
+    async def start(self) -> None:
+        """
+        Starts the hashing threads.
+
+        Returns:
+            None
+        """
+        if self._pool is not None:
+            return
+        self._pool = concurrent.futures.ThreadPoolExecutor(self.threads, thread_name_prefix="password-hash")
+
+    async def close(self) -> None:
+        """
+        Stops the hashing threads, dropping queued requests.
+
+        Returns:
+            None
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _run(self, operation: str, function, *args):
+        """
+        Runs a hashing function in the pool, refusing it if the queue is full.
+
+        Args:
+            operation (str): The name of the operation, "hash" or "check".
+            function: The function to run, returning its result and the seconds it took.
+            *args: The arguments of the function.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            ServiceUnavailable: If `queue_size` requests are already waiting for a thread.
+        """
+        if self._pending >= self.threads + self.queue_size:
+            self._rejected.inc()
+            raise ServiceUnavailable("The server is busy, please try again shortly.", headers={"Retry-After": "1"})
+        if self._pool is None:
+            await self.start()
+
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            result, seconds = await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+        finally:
+            self._pending -= 1
+        self._hash_seconds[operation].observe(seconds)
+        self._queue_seconds[operation].observe(max(0.0, time.perf_counter() - started - seconds))
+        return result
+
+    async def hash(self, password: bytes) -> bytes:
+        """
+        Hashes a password with a new salt under the configured policy.
+
+        Args:
+            password (bytes): The password to be hashed.
+
+        Returns:
+            bytes: The hashed password.
+        """
+        return await self._run("hash", _hash, password, self.policy)
+
+    async def check(self, password: bytes, hashed_password: bytes|str) -> bool:
+        """
+        Checks a password against a hash, with the algorithm and cost stored in the hash.
+
+        Args:
+            password (bytes): The password to check.
+            hashed_password (bytes|str): The hashed password to compare against.
+
+        Returns:
+            bool: True if the password matches the hashed password, False otherwise.
+        """
+        if isinstance(hashed_password, str):
+            hashed_password = hashed_password.encode()
+        return await self._run("check", _check, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes|str) -> bool:
+        """
+        Checks whether a hash was made under a different algorithm or cost than the policy.
+
+        Args:
+            hashed_password (bytes|str): The hashed password.
+
+        Returns:
+            bool: True if the password should be hashed again.
+        """
+        return identify(hashed_password) != self.policy
+
+    async def upgrade(self, uuid, password: bytes, hashed_password: bytes|str) -> bool:
+        """
+        Rehashes a user's password under the policy if its hash does not match it.
+
+        Meant to run in the background once the password has been checked, e.g. with
+        `app.add_task`. The new hash only replaces the old one if the password has not been
+        changed in between, and while every thread is busy the upgrade is left for a later
+        login rather than delaying requests waiting to be hashed.
+
+        Args:
+            uuid: The UUID of the user.
+            password (bytes): The password, already checked against the hash.
+            hashed_password (bytes|str): The hash the password was checked against.
+
+        Returns:
+            bool: True if the hash was replaced.
+        """
+        if not self.needs_rehash(hashed_password) or self._pending >= self.threads:
+            return False
+        try:
+            new_hashed_password = await self.hash(password)
+            async with db.async_session() as session:
+                async with session.begin():
+                    upgraded = await UsersDAL(session).replace_password_hash(uuid, hashed_password, new_hashed_password)
+        except ServiceUnavailable:
+            return False
+        except Exception: # pylint: disable=broad-except
+            logger.exception("Failed to upgrade a password hash.")
+            return False
+        if upgraded:
+            self._upgraded.inc()
+        return upgraded
+
+
+async def hash_password(password: bytes) -> bytes:
     """
-    salt = await aiobcrypt.gensalt()
+    Hashes the given password under the configured policy, in the application's `PasswordHasher`.
+
+    Args:
+        password (bytes): The password to be hashed.
 
-    hashed_password = await aiobcrypt.hashpw(password, salt)
-    return hashed_password
+    Returns:
+        bytes: The hashed password.
+
+    Raises:
+        ServiceUnavailable: If too many passwords are already waiting to be hashed.
+    """
+    return await Sanic.get_app().ctx.password_hasher.hash(password)
 
 async def check_password(password: bytes, hashed_password: bytes) -> bool:
     """
-    Check if the provided password matches the hashed password.
+    Check if the provided password matches the hashed password, in the application's `PasswordHasher`.
 
     Args:
         password (bytes): The password to check.
@@ -29,7 +352,8 @@ async def check_password(password: bytes, hashed_password: bytes) -> bool:
 
     Returns:
         bool: True if the password matches the hashed password, False otherwise.
+
+    Raises:
+        ServiceUnavailable: If too many passwords are already waiting to be checked.
     """
-    if await aiobcrypt.checkpw(password, hashed_password):
-        return True
-    return False
+    return await Sanic.get_app().ctx.password_hasher.check(password, hashed_password)
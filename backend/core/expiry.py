@@ -0,0 +1,188 @@
+"""
+This module provides the scheduler that expires sessions at their actual expiry.
+"""
+import asyncio
+import heapq
+import math
+import time
+from sanic.log import logger
+# pylint: disable=import-error
+from core.storage.base import SessionBackend
+
+
+class ExpiryScheduler:
+    """
+    Expires sessions close to their actual expiry instead of sweeping the store on an interval.
+
+    Sessions expiring within the next `horizon` seconds are loaded from the backend into a
+    min-heap, and the window is reloaded as it runs out. The scheduler sleeps until the
+    earliest expiry, then removes every session that is due - through the backend's expiry
+    index, so the cost follows the number of expiring sessions, not the size of the store -
+    and hands them to the registered listeners so in-memory caches can drop them too.
+    """
+
+    def __init__(self, backend: SessionBackend, horizon: float = 3600, resolution: float = 1.0):
+        """
+        Initializes the scheduler.
+
+        Args:
+            backend (SessionBackend): The storage the sessions are kept in.
+            horizon (float): Seconds ahead upcoming expiries are loaded for.
+            resolution (float): Sessions expiring within this many seconds of each other are removed together.
+        """
+        self.backend = backend
+        self.horizon = horizon
+        self.resolution = resolution
+        self.loaded_until = 0.0
+        self._heap = []
+        self._scheduled = {}
+        self._listeners = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions scheduled within the loaded window.
+        """
+        return len(self._scheduled)
+
+    def add_listener(self, listener) -> None:
+        """
+        Registers a coroutine function called with the sessions removed on every expiry.
+
+        Args:
+            listener: Called with a list of (session token, hex user UUID) tuples.
+        """
+        self._listeners.append(listener)
+
+    def track(self, session_token: str, user_uuid: str, expiry: float) -> None:
+        """
+        Schedules a session that expires within the loaded window, or reschedules it after
+        its expiry changed.
+
+        Sessions expiring later are picked up when the window is reloaded.
+
+        Args:
+            session_token (str): The session token.
+            user_uuid (str): The hex UUID of the user.
+            expiry (float): The Unix timestamp indicating the session expiry.
+        """
+        if expiry > self.loaded_until:
+            self._scheduled.pop(session_token, None)
+            return
+        if self._scheduled.get(session_token) == expiry:
+            return
+        self._scheduled[session_token] = expiry
+        heapq.heappush(self._heap, (expiry, session_token, user_uuid))
+        if self._heap[0][1] == session_token:
+            self._wakeup.set()
+
+    def untrack(self, session_token: str) -> None:
+        """
+        Forgets a session, e.g. because it was deleted before its expiry.
+
+        Its heap entry is left in place and skipped when it comes up.
+
+        Args:
+            session_token (str): The session token.
+        """
+        self._scheduled.pop(session_token, None)
+
+    async def load(self) -> int:
+        """
+        Loads every session expiring within the horizon from the backend.
+
+        Returns:
+            int: The number of sessions loaded.
+        """
+        until = time.time() + self.horizon
+        sessions = await self.backend.expiring_before(until)
+        self.loaded_until = until
+        for session_token, user_uuid, expiry in sessions:
+            self.track(session_token, user_uuid, expiry)
+        return len(sessions)
+
+    async def expire(self, now: float) -> int:
+        """
+        Removes every session that expired at or before the given time and notifies the listeners.
+
+        Args:
+            now (float): The Unix timestamp to compare expiries against.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expiry, session_token, user_uuid = heapq.heappop(self._heap)
+            if self._scheduled.get(session_token) == expiry:
+                del self._scheduled[session_token]
+                expired.append((session_token, user_uuid))
+        if not expired:
+            return 0
+
+        await self.backend.cleanup(now)
+        for listener in self._listeners:
+            await listener(expired)
+        return len(expired)
+
+    def next_wakeup(self) -> float:
+        """
+        Returns when the scheduler next has work to do.
+
+        Returns:
+            float: The Unix timestamp of the earliest scheduled expiry, or of the window reload.
+        """
+        next_expiry = self._heap[0][0] if self._heap else math.inf
+        return min(next_expiry, self.loaded_until)
+
+    async def run(self) -> None:
+        """
+        Expires sessions as they come due, until cancelled.
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                now = time.time()
+                if now >= self.loaded_until:
+                    await self.load()
+                await self.expire(now)
+            except Exception: # pylint: disable=broad-except
+                logger.exception("Failed to expire sessions.")
+
+            # Sleep until the next expiry, but never for less than the resolution, so sessions
+            # expiring close together are removed in one batch. `track` wakes the loop early
+            # when a session is scheduled before everything else.
+            self._wakeup.clear()
+            delay = max(self.resolution, self.next_wakeup() - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """
+        Starts expiring sessions in the background.
+
+        Returns:
+            None
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stops the background task.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -2,12 +2,16 @@
 This module provides general utility functions.
 """
 from functools import wraps
+import hashlib
+import hmac
 import json
 from uuid import UUID
 from datetime import date, datetime
+import time
 import uuid
 
 from sanic import BadRequest, Unauthorized
+from sanic.log import logger
 import yaml
 # pylint: disable=import-error
 from database.dals.user_dal import UsersDAL
@@ -25,6 +29,23 @@ def generate_backup_code(length):
 
     return secrets.token_hex(int(length / 2)) # prevent odd numbers
 
+def backup_code_digest(code: str, pepper: str) -> str:
+    """
+    Computes the digest a backup code is stored and looked up under.
+
+    Backup codes are random, so a keyed HMAC-SHA256 is enough to keep them from being
+    read back out of the database - unlike passwords they need no slow hash - and it lets
+    a code be found with one indexed lookup instead of checking it against every stored code.
+
+    Args:
+        code (str): The backup code.
+        pepper (str): The server-side secret key, `2fa.backup_code_pepper` in config.yml.
+
+    Returns:
+        str: The hex digest.
+    """
+    return hmac.new(pepper.encode(), code.encode(), hashlib.sha256).hexdigest()
+
 def inject_cached_user():
     """
     Decorator function that injects the cached user into the decorated function.
@@ -103,24 +124,56 @@ def fix_dict(dictionary):
     first = json.dumps(dictionary, cls=UUIDEncoder)
     return json.loads(first)
 
-async def populate_cache(app):
+async def populate_cache(app, chunk_size: int = 500):
     """
     Populates the cache with every individual user with a session.
 
+    Users are loaded with one query and added with one bulk insert per chunk. Runs in the
+    background once the server is up - until it finishes, users are read through from the
+    database as they make requests.
+
+    Args:
+        app: The application object.
+        chunk_size (int): The number of users loaded per query.
+
+    Returns:
+        None
+    """
+    started = time.perf_counter()
+    user_uuids = [uuid.UUID(user_uuid[0]) for user_uuid in await app.ctx.session.get_all_users()]
+    added = 0
+    for index in range(0, len(user_uuids), chunk_size):
+        try:
+            async with db.async_session() as session:
+                async with session.begin():
+                    users_dal = UsersDAL(session)
+                    db_users = await users_dal.get_users_by_uuids(user_uuids[index:index + chunk_size], projection="profile")
+            added += await app.ctx.cache.add_many(db_users)
+        except Exception: # pylint: disable=broad-except
+            ## the users in this chunk are read through once they make a request
+            logger.exception("Cache warm-up failed for a chunk of users.")
+        logger.info(f"Cache warm-up: {min(index + chunk_size, len(user_uuids))}/{len(user_uuids)} users loaded.")
+    logger.info(
+        f"Cache warm-up finished in {time.perf_counter() - started:.2f}s: "
+        f"{added} of {len(user_uuids)} users with a session added."
+    )
+
+async def evict_expired_users(app, expired: list[tuple[str, str]]):
+    """
+    Removes users from the cache once their last session has expired.
+
+    Registered as a listener of the session expiry scheduler.
+
     Args:
         app: The application object.
+        expired (list[tuple[str, str]]): Tuples of expired session token and hex user UUID.
 
     Returns:
         None
     """
-    ## make a list of every individual user with a session and add them to the cache
-    for user_uuid in await app.ctx.session.get_all_users():
-        user_uuid = uuid.UUID(user_uuid[0])
-        async with db.async_session() as session:
-            async with session.begin():
-                users_dal = UsersDAL(session)
-                db_user = await users_dal.get_user_by_uuid(user_uuid)
-                await app.ctx.cache.add(db_user)
+    for user_uuid in {user_uuid for _, user_uuid in expired}:
+        if not await app.ctx.session.session_count(user_uuid):
+            await app.ctx.cache.remove(uuid.UUID(user_uuid))
 
 def load_config(file_path: str = "config.yml"):
     """
@@ -0,0 +1,187 @@
+"""
+This module provides the in-memory matcher for banned IP addresses and ranges.
+"""
+import ipaddress
+import time
+from sanic.log import logger
+# pylint: disable=import-error
+from database import db
+from database.dals.banned_ips_dal import BannedIpsDal
+
+# Indexes into a trie node: the children for a 0 and a 1 bit, and the banned network ending at the node.
+_ZERO, _ONE, _NETWORK = range(3)
+
+
+def parse_network(value: str) -> ipaddress.IPv4Network|ipaddress.IPv6Network:
+    """
+    Parses a banned IP address or CIDR range.
+
+    Host bits set in a range are ignored, e.g. `10.0.0.1/8` bans `10.0.0.0/8`.
+    IPv4-mapped IPv6 addresses and ranges are treated as their IPv4 equivalent.
+
+    Args:
+        value (str): The IP address or CIDR range.
+
+    Returns:
+        ipaddress.IPv4Network|ipaddress.IPv6Network: The network, a single address has the full prefix length.
+
+    Raises:
+        ValueError: If the value is not an IP address or CIDR range.
+    """
+    network = ipaddress.ip_network(value.strip(), strict=False)
+    if network.version == 6 and network.network_address.ipv4_mapped is not None and network.prefixlen >= 96:
+        network = ipaddress.ip_network(f"{network.network_address.ipv4_mapped}/{network.prefixlen - 96}")
+    return network
+
+
+class BanList:
+    """
+    The banned IP addresses and CIDR ranges, kept in a binary prefix tree per address family.
+
+    Each bit of a banned network's prefix selects a child, and the node reached after the
+    last bit holds the network. Checking an address walks its bits from the most significant
+    one and stops at the first node holding a network - the address is inside it - or at the
+    first missing child, so a check never walks further than the longest banned prefix the
+    address shares, and never touches the database.
+
+    The tree is built whole by `load` and updated in place by `add` and `remove`, which
+    `BannedIpsDal` calls when it bans or unbans an address.
+    """
+
+    def __init__(self):
+        self._roots = {4: [None, None, None], 6: [None, None, None]}
+        self._count = 0
+
+    def __len__(self) -> int:
+        """
+        Returns the number of banned addresses and ranges.
+        """
+        return self._count
+
+    def add(self, value: str) -> None:
+        """
+        Bans an IP address or CIDR range.
+
+        Args:
+            value (str): The IP address or CIDR range.
+
+        Raises:
+            ValueError: If the value is not an IP address or CIDR range.
+        """
+        network = parse_network(value)
+        node = self._roots[network.version]
+        address = int(network.network_address)
+        for shift in range(network.max_prefixlen - 1, network.max_prefixlen - network.prefixlen - 1, -1):
+            bit = address >> shift & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, None]
+            node = child
+        if node[_NETWORK] is None:
+            self._count += 1
+        node[_NETWORK] = network
+
+    def remove(self, value: str) -> bool:
+        """
+        Lifts the ban on an IP address or CIDR range, pruning the branches left empty.
+
+        Ranges inside or around it stay banned.
+
+        Args:
+            value (str): The IP address or CIDR range.
+
+        Returns:
+            bool: True if it was banned.
+
+        Raises:
+            ValueError: If the value is not an IP address or CIDR range.
+        """
+        network = parse_network(value)
+        node = self._roots[network.version]
+        address = int(network.network_address)
+        path = []
+        for shift in range(network.max_prefixlen - 1, network.max_prefixlen - network.prefixlen - 1, -1):
+            bit = address >> shift & 1
+            child = node[bit]
+            if child is None:
+                return False
+            path.append((node, bit))
+            node = child
+        if node[_NETWORK] is None:
+            return False
+        node[_NETWORK] = None
+        self._count -= 1
+        while path and node == [None, None, None]:
+            parent, bit = path.pop()
+            parent[bit] = None
+            node = parent
+        return True
+
+    def match(self, ip: str) -> ipaddress.IPv4Network|ipaddress.IPv6Network|None:
+        """
+        Finds the banned network an IP address is in.
+
+        Args:
+            ip (str): The IP address.
+
+        Returns:
+            ipaddress.IPv4Network|ipaddress.IPv6Network|None: The shortest banned prefix containing
+            the address, or None if it is not banned or not a valid address.
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        node = self._roots[address.version]
+        if node[_NETWORK] is not None:
+            return node[_NETWORK]
+        bits = int(address)
+        for shift in range(address.max_prefixlen - 1, -1, -1):
+            node = node[bits >> shift & 1]
+            if node is None:
+                return None
+            if node[_NETWORK] is not None:
+                return node[_NETWORK]
+        return None
+
+    def is_banned(self, ip: str) -> bool:
+        """
+        Checks whether an IP address is banned, on its own or by a range containing it.
+
+        Args:
+            ip (str): The IP address.
+
+        Returns:
+            bool: True if the address is banned.
+        """
+        return self.match(ip) is not None
+
+    async def load(self) -> int:
+        """
+        Reads every ban from the database and replaces the tree.
+
+        Entries that are not a valid address or range are skipped. If the bans cannot be
+        read the previous tree is kept.
+
+        Returns:
+            int: The number of addresses and ranges banned.
+        """
+        started = time.perf_counter()
+        try:
+            async with db.async_session() as session:
+                bans = await BannedIpsDal(session).get_banned_ips()
+        except Exception: # pylint: disable=broad-except
+            logger.exception("Failed to load the banned IPs.")
+            return len(self)
+
+        ban_list = BanList()
+        for ban in bans:
+            try:
+                ban_list.add(ban.ip)
+            except ValueError:
+                logger.warning(f"Skipping invalid banned IP {ban.ip!r}.")
+        self._roots, self._count = ban_list._roots, ban_list._count # pylint: disable=protected-access
+        logger.debug(f"Loaded {len(self)} banned IPs in {(time.perf_counter() - started) * 1000:.1f}ms.")
+        return len(self)
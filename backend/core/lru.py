@@ -0,0 +1,97 @@
+"""
+This module provides a small in-process LRU cache with per-entry expiry.
+"""
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A least-recently-used cache where every entry carries its own expiry.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept before the least recently used is evicted.
+        evictions (int): The number of entries dropped for being least recently used or expired.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initializes the cache.
+
+        Args:
+            maxsize (int): The maximum number of entries.
+        """
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored under a key if it has not expired.
+
+        Args:
+            key: The key to look up.
+            default: The value returned when the key is missing or expired.
+
+        Returns:
+            The cached value, or the default.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.evictions += 1
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires_at: float) -> None:
+        """
+        Stores a value until the given Unix timestamp.
+
+        Args:
+            key: The key to store the value under.
+            value: The value to store.
+            expires_at (float): The Unix timestamp the entry expires at.
+
+        Returns:
+            None
+        """
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """
+        Removes a key from the cache.
+
+        Args:
+            key: The key to remove.
+            default: The value returned when the key is missing.
+
+        Returns:
+            The removed value, or the default.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        return entry[0]
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache.
+
+        Returns:
+            None
+        """
+        self._entries.clear()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,316 @@
+"""
+This module provides counters, gauges and histograms, rendered in the Prometheus text format.
+"""
+import bisect
+import contextlib
+import inspect
+import math
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value) -> str:
+    """
+    Formats a sample value.
+
+    Args:
+        value: The value.
+
+    Returns:
+        str: The value as Prometheus expects it.
+    """
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _format_labels(labels: dict) -> str:
+    """
+    Formats a label set, escaping the values.
+
+    Args:
+        labels (dict): The label names and values.
+
+    Returns:
+        str: The label set in braces, or an empty string without labels.
+    """
+    if not labels:
+        return ""
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    A named metric, optionally split by labels into one child per label value set.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (tuple): The names of the labels, empty for an unlabelled metric.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        """
+        Initializes the metric.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple): The names of the labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def _child(self):
+        """
+        Returns a new unlabelled metric of the same type, to hold one label value set.
+        """
+        return type(self)(self.name, self.documentation)
+
+    def labels(self, *values):
+        """
+        Returns the child holding the samples for a label value set, creating it if needed.
+
+        Hot paths should look their children up once and keep them.
+
+        Args:
+            *values: A value for every label name, in order.
+
+        Returns:
+            Metric: The child.
+
+        Raises:
+            ValueError: If the number of values does not match the label names.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames)}.")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._child()
+        return child
+
+    async def _own_samples(self) -> list[tuple[str, dict, object]]:
+        """
+        Returns the samples of an unlabelled metric, as (name suffix, labels, value) tuples.
+        """
+        return []
+
+    async def samples(self) -> list[tuple[str, dict, object]]:
+        """
+        Returns every sample of the metric, as (name suffix, labels, value) tuples.
+
+        Returns:
+            list[tuple[str, dict, object]]: The samples.
+        """
+        if not self.labelnames:
+            return await self._own_samples()
+        samples = []
+        for values, child in self._children.items():
+            labels = dict(zip(self.labelnames, values))
+            for suffix, extra, value in await child._own_samples():
+                samples.append((suffix, {**labels, **extra}, value))
+        return samples
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, either counted with `inc` or read from a function.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), function=None):
+        """
+        Initializes the counter.
+
+        Args:
+            name (str): The metric name, ending in `_total`.
+            documentation (str): The help text.
+            labelnames (tuple): The names of the labels.
+            function: Returns the value when the counter is collected, for values counted elsewhere.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        """
+        Increases the counter.
+
+        Args:
+            amount (float): The amount to add.
+        """
+        self.value += amount
+
+    async def _own_samples(self):
+        value = self.value if self.function is None else self.function()
+        return [("", {}, value)]
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, read from a function when collected.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function=None):
+        """
+        Initializes the gauge.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            function: Returns the value, may be a coroutine function.
+        """
+        super().__init__(name, documentation)
+        self.function = function
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        """
+        Sets the value of a gauge without a function.
+
+        Args:
+            value (float): The value.
+        """
+        self.value = value
+
+    async def _own_samples(self):
+        if self.function is None:
+            return [("", {}, self.value)]
+        value = self.function()
+        if inspect.isawaitable(value):
+            value = await value
+        return [("", {}, value)]
+
+
+class Histogram(Metric):
+    """
+    Counts observations in buckets by their upper bound, with their sum and count.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, ascending. An infinite bucket is implied.
+        counts (list): The observations per bucket - not cumulative, the last is the infinite bucket.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        """
+        Initializes the histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple): The names of the labels.
+            buckets (tuple): The upper bounds of the buckets.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        """
+        Records an observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        """
+        Observes how many seconds the block took, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    async def _own_samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            samples.append(("_bucket", {"le": _format_value(float(bound))}, cumulative))
+        samples.append(("_sum", {}, self.sum))
+        samples.append(("_count", {}, self.count))
+        return samples
+
+
+class Registry:
+    """
+    A set of metrics rendered together.
+
+    Registering a metric under a name already in use replaces the previous one.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric to the registry.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The same metric.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = (), function=None) -> Counter:
+        """
+        Registers a new counter, see `Counter`.
+        """
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, function=None) -> Gauge:
+        """
+        Registers a new gauge, see `Gauge`.
+        """
+        return self.register(Gauge(name, documentation, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        """
+        Registers a new histogram, see `Histogram`.
+        """
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    async def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition, to be served with `CONTENT_TYPE`.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in await metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,87 @@
+"""
+This module provides the table of routes each staff level may access.
+"""
+import time
+from sanic.log import logger
+# pylint: disable=import-error
+from database import db
+from database.dals.staff_permission_dal import StaffPermissionsDAL
+
+
+class StaffPermissions:
+    """
+    The staff route permissions, compiled from the database into a lookup table.
+
+    Every route is registered with its (version, route) key in its route context, see
+    `main.py`, so authorizing a staff request is one dictionary lookup of that key and a
+    set membership test of the user's staff level - no path parsing on the request path.
+
+    The table is rebuilt whole and swapped in on `load`, which runs at startup, on an
+    interval so edits made through other workers are picked up, and right after an edit.
+
+    Attributes:
+        routes (frozenset): The (version, route) keys of every registered route.
+        table (dict): The staff levels allowed on each (version, route) key.
+    """
+
+    def __init__(self, routes: frozenset = frozenset()):
+        """
+        Initializes an empty table, which denies every staff request until it is loaded.
+
+        Args:
+            routes (frozenset): The (version, route) keys of every registered route.
+        """
+        self.routes = routes
+        self.table = {}
+
+    @staticmethod
+    def compile(permissions) -> dict:
+        """
+        Builds the lookup table from permission rows.
+
+        Args:
+            permissions: The rows, each with a `staff_level`, `version` and `route`.
+
+        Returns:
+            dict: The frozen set of staff levels allowed on each (version, route) key.
+        """
+        table = {}
+        for permission in permissions:
+            table.setdefault((permission.version, permission.route), set()).add(permission.staff_level)
+        return {key: frozenset(levels) for key, levels in table.items()}
+
+    async def load(self) -> int:
+        """
+        Reads the permissions from the database and replaces the table.
+
+        If they cannot be read the previous table is kept.
+
+        Returns:
+            int: The number of permissions loaded.
+        """
+        started = time.perf_counter()
+        try:
+            async with db.async_session() as session:
+                permissions = await StaffPermissionsDAL(session).get_permissions()
+        except Exception: # pylint: disable=broad-except
+            logger.exception("Failed to load the staff permissions.")
+            return 0
+        self.table = self.compile(permissions)
+        logger.debug(
+            f"Loaded {len(permissions)} staff permissions in {(time.perf_counter() - started) * 1000:.1f}ms."
+        )
+        return len(permissions)
+
+    def allows(self, staff_level: int, route: tuple) -> bool:
+        """
+        Checks whether a staff level may access a route.
+
+        Args:
+            staff_level (int): The staff level of the user.
+            route (tuple): The (version, route) key of the route.
+
+        Returns:
+            bool: True if the staff level was granted the route.
+        """
+        levels = self.table.get(route)
+        return levels is not None and staff_level in levels
@@ -0,0 +1,234 @@
+"""
+This module provides the rate limiter guarding the authentication endpoints.
+"""
+import math
+import time
+from typing import NamedTuple
+from sanic import Request
+from sanic.exceptions import SanicException
+from sanic.log import logger
+# pylint: disable=import-error
+from core.authentication import resolve_session
+from core.metrics import Registry
+from core.storage.base import RateLimitBackend
+
+
+class RateLimit(NamedTuple):
+    """
+    The requests allowed on an endpoint per window, 0 for no limit.
+    """
+    window: float
+    per_ip: int
+    per_account: int
+
+
+class RateLimiter:
+    """
+    Limits requests per IP and per account with a sliding window.
+
+    Requests are counted in fixed windows in the backend, shared by every worker when the
+    backend is. The count over the sliding window ending now is estimated from the current
+    window's count and the part of the previous window's count still inside it, which
+    smooths out the bursts fixed windows allow at their edges.
+
+    Rejected requests are counted too, so a client has to back off to get through again.
+    If the backend cannot be reached requests are let through rather than locking everyone out.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limits: dict[str, RateLimit], enabled: bool = True, metrics: Registry|None = None):
+        """
+        Initializes the rate limiter.
+
+        Args:
+            backend (RateLimitBackend): The storage the counters are kept in.
+            limits (dict[str, RateLimit]): The limits by endpoint name.
+            enabled (bool): Whether requests are limited at all.
+            metrics (Registry|None): The registry to record metrics in - a private one if None.
+        """
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+        self.metrics = metrics if metrics is not None else Registry()
+        self._rejected = self.metrics.counter(
+            "rate_limit_rejections_total", "Requests rejected for exceeding a rate limit, by endpoint.", ("limit",)
+        )
+
+    async def async__init__(self):
+        """
+        Opens the backend.
+
+        Returns:
+            None
+        """
+        await self.backend.open()
+
+    async def close(self) -> None:
+        """
+        Closes the backend.
+
+        Returns:
+            None
+        """
+        await self.backend.close()
+
+    async def clear(self) -> None:
+        """
+        Drops every counter, lifting every limit.
+
+        Returns:
+            None
+        """
+        await self.backend.clear()
+
+    async def cleanup(self) -> int:
+        """
+        Drops the counters of windows that can no longer be read.
+
+        Returns:
+            int: The number of counters dropped.
+        """
+        return await self.backend.cleanup(time.time())
+
+    @staticmethod
+    def _retry_after(limit: int, previous: int, current: int, elapsed: float) -> float:
+        """
+        Returns the fraction of a window until the next request would be within a limit.
+
+        Args:
+            limit (int): The requests allowed per window.
+            previous (int): The count of the previous window.
+            current (int): The count of the current window.
+            elapsed (float): The fraction of the current window that has passed.
+
+        Returns:
+            float: The fraction of a window to wait.
+        """
+        if current < limit and previous:
+            # The previous window's share drops enough to leave room for one more in this one.
+            return max(0.0, 1 - (limit - current - 1) / previous - elapsed)
+        # This window's requests become the previous window's, and their share has to drop too.
+        return 1 - elapsed + max(0.0, 1 - (limit - 1) / current)
+
+    async def hit(self, name: str, ip: str, account: str|None = None) -> float:
+        """
+        Counts a request to an endpoint and checks it against the endpoint's limits.
+
+        Args:
+            name (str): The name of the endpoint's limits.
+            ip (str): The IP address of the client.
+            account (str|None): The account the request is for, if known.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds until the client may retry.
+        """
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None:
+            return 0
+
+        keys = []
+        maxima = []
+        if limit.per_ip:
+            keys.append(f"{name}:ip:{ip}")
+            maxima.append(limit.per_ip)
+        if limit.per_account and account:
+            keys.append(f"{name}:account:{account}")
+            maxima.append(limit.per_account)
+        if not keys:
+            return 0
+
+        now = time.time()
+        window = int(now // limit.window)
+        elapsed = now / limit.window - window
+        try:
+            counts = await self.backend.hit(keys, window, (window + 2) * limit.window)
+        except Exception: # pylint: disable=broad-except
+            logger.exception(f"Failed to check the {name} rate limit, letting the request through.")
+            return 0
+
+        retry_after = 0
+        for maximum, (previous, current) in zip(maxima, counts):
+            if previous * (1 - elapsed) + current > maximum:
+                retry_after = max(retry_after, self._retry_after(maximum, previous, current, elapsed) * limit.window)
+        return retry_after
+
+    async def check(self, name: str, ip: str, account: str|None = None) -> None:
+        """
+        Counts a request to an endpoint and rejects it if it is over the endpoint's limits.
+
+        Args:
+            name (str): The name of the endpoint's limits.
+            ip (str): The IP address of the client.
+            account (str|None): The account the request is for, if known.
+
+        Raises:
+            SanicException: With status 429 and a Retry-After header, if the request is over a limit.
+        """
+        retry_after = await self.hit(name, ip, account)
+        if retry_after:
+            self._rejected.labels(name).inc()
+            raise SanicException(
+                "Too many requests, please try again later.",
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+
+def body_field(field: str):
+    """
+    Returns an account getter reading the account from a field of the JSON body, case-insensitively.
+
+    Args:
+        field (str): The name of the field, e.g. "email".
+
+    Returns:
+        The account getter.
+    """
+    async def account(request: Request) -> str|None:
+        try:
+            value = (request.json or {}).get(field)
+        except Exception: # pylint: disable=broad-except
+            return None
+        return value.strip().lower() if isinstance(value, str) else None
+    return account
+
+
+async def session_user(request: Request) -> str|None:
+    """
+    An account getter returning the hex UUID of the user the request's session belongs to.
+
+    Args:
+        request (Request): The request object.
+
+    Returns:
+        str|None: The hex UUID, or None without a valid session.
+    """
+    record = await resolve_session(request)
+    return None if record is None else record.uuid.hex
+
+
+def rate_limited(name: str, account=None):
+    """
+    Decorator function to reject requests over the configured limits of an endpoint, before any work is done.
+
+    Works on static and bound view methods alike.
+
+    Args:
+        name (str): The name of the endpoint's limits under `rate_limit.limits` in config.yml.
+        account: Returns the account a request is for, see `body_field` and `session_user`.
+
+    Returns:
+        The decorator.
+
+    Raises:
+        SanicException: With status 429, if the request is over a limit.
+    """
+    def decorator(myfunc):
+        async def wrapper_func(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            await request.app.ctx.rate_limiter.check(
+                name, request.ip, None if account is None else await account(request)
+            )
+            response = await myfunc(*args, **kwargs)
+            return response
+        return wrapper_func
+    return decorator
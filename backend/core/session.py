@@ -1,44 +1,378 @@
 """
 This module provides functionality for managing sessions.
 """
-import pickle
+import asyncio
 import uuid
 import time
-import aiosqlite
+from sanic.log import logger
+# pylint: disable=import-error
+from core.expiry import ExpiryScheduler
+from core.lru import TTLCache
+from core.metrics import Registry
+from core.storage.base import SessionBackend, SessionRecord
 
 class SessionManager:
     """
     Manages sessions for the application.
+
+    Sessions are stored by a `SessionBackend` (see `core.storage`). Resolved sessions are
+    kept in an in-process LRU for up to `record_ttl` seconds, never past their own expiry,
+    so a warm request is validated without touching the backend. Every mutation made
+    through this manager invalidates the affected entry, and the sessions other workers
+    deleted or changed the two-factor state of are pulled from the backend by
+    `sync_changes` and dropped.
+
+    With a write delay set, mutations are written behind: they are queued for up to
+    `write_delay` seconds and applied by the backend in one transaction (group commit).
+    Until then they are kept in a pending overlay, so reads through this manager always
+    see their own writes. Other workers see them once the batch is committed.
+
+    Expired sessions are removed by an `ExpiryScheduler` close to their actual expiry,
+    which also drops them from the in-process LRU.
+
+    When and from where each session was last seen is recorded in memory by
+    `record_activity` and written by `flush_activity` in one batch per interval, so a
+    session is written at most once per interval however many requests it makes. With
+    sliding expiry, every flush also pushes the expiry of active sessions forward.
+
+    In stateless mode the session cookie carries the session record itself, and deleted
+    sessions are also recorded as revocations. Every worker keeps the revocations in
+    memory, synced from the backend by `sync_revocations`, so a cookie can be checked
+    without any storage round trip.
+
+    Hits, misses, latencies and write batches are recorded in a metrics `Registry`.
     """
-    def __init__(self, db_path: str):
+    # Revocations and changes are fetched with this much overlap, in seconds, so clock skew
+    # between workers cannot make one miss a revocation or change made by another.
+    SYNC_OVERLAP = 5
+    # Upper bounds of the commit batch size histogram buckets.
+    WRITE_BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    def __init__(
+        self,
+        backend: SessionBackend,
+        record_cache_size: int = 10000,
+        stateless: bool = False,
+        write_delay: float = 0,
+        write_batch_size: int = 500,
+        expiry_horizon: float = 3600,
+        expiry_resolution: float = 1.0,
+        sliding_expiry: float = 0,
+        record_ttl: float = 30,
+        metrics: Registry|None = None
+    ):
         """
         Initializes the session manager.
 
         Args:
-            db_path (str): The path to the database file.
+            backend (SessionBackend): The storage the sessions are kept in.
+            record_cache_size (int): The number of resolved sessions kept in memory.
+            stateless (bool): Record revocations so stateless session cookies can be refused.
+            write_delay (float): Seconds to gather mutations for before committing them - 0 writes through.
+            write_batch_size (int): The maximum number of mutations committed per transaction.
+            expiry_horizon (float): Seconds ahead upcoming expiries are loaded for.
+            expiry_resolution (float): Sessions expiring within this many seconds of each other are removed together.
+            sliding_expiry (float): Extend active sessions to this many seconds after they were last seen - 0 disables.
+            record_ttl (float): Seconds a resolved session is kept in memory for at most.
+            metrics (Registry|None): The registry to record metrics in - a private one if None.
+        """
+        self.backend = backend
+        self.records = TTLCache(record_cache_size)
+        self.record_ttl = record_ttl
+        self.changes_synced_at = 0.0
+        self.stateless = stateless
+        self.revoked = {}
+        self.revocations_synced_at = 0.0
+
+        self.write_delay = write_delay
+        self.write_batch_size = max(1, write_batch_size)
+        self.pending = {}
+        self._queue = []
+        self._sequence = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_timer = None
+        self._flush_tasks = set()
+
+        self.expiry = ExpiryScheduler(backend, expiry_horizon, expiry_resolution)
+        self.expiry.add_listener(self._evict_expired)
+
+        self.sliding_expiry = sliding_expiry
+        self.activity = {}
+
+        self.metrics = metrics if metrics is not None else Registry()
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        """
+        Registers the session metrics, keeping the children used on hot paths.
         """
-        self.db_path = db_path
+        metrics = self.metrics
+        lookups = metrics.counter(
+            "session_lookups_total", "Session lookups by where the session was found.", ("source",)
+        )
+        self._lookups_pending = lookups.labels("pending")
+        self._lookups_memory = lookups.labels("memory")
+        self._lookups_backend = lookups.labels("backend")
+        self._lookups_missing = lookups.labels("missing")
+        self._lookup_seconds = metrics.histogram("session_lookup_seconds", "Time taken to look up a session.")
+        self._write_seconds = metrics.histogram(
+            "session_write_seconds", "Time taken to commit session writes to the backend, per transaction."
+        )
+        batches = metrics.counter(
+            "session_write_batches_total", "Write-behind batches by whether they were committed.", ("result",)
+        )
+        self._batches_committed = batches.labels("committed")
+        self._batches_failed = batches.labels("failed")
+        self._mutations_committed = metrics.counter(
+            "session_mutations_committed_total", "Session mutations committed by the write-behind queue."
+        )
+        self._batch_sizes = metrics.histogram(
+            "session_write_batch_size", "Mutations per write-behind batch.", buckets=self.WRITE_BATCH_BUCKETS
+        )
+        metrics.counter(
+            "session_record_evictions_total", "Sessions dropped from memory as least recently used or expired.",
+            function=lambda: self.records.evictions
+        )
+        self._expired = metrics.counter("session_expired_total", "Sessions removed by the expiry scheduler.")
+        metrics.gauge("session_records_cached", "Sessions kept in memory.", lambda: len(self.records))
+        metrics.gauge("session_write_queue_depth", "Mutations waiting to be committed.", lambda: len(self._queue))
+        metrics.gauge("session_pending_writes", "Sessions with mutations waiting to be committed.", lambda: len(self.pending))
+        metrics.gauge("session_activity_pending", "Sessions with activity waiting to be written.", lambda: len(self.activity))
+        metrics.gauge("session_expiry_scheduled", "Sessions scheduled to expire within the loaded window.", lambda: len(self.expiry))
+        metrics.gauge("session_revocations", "Revoked stateless sessions kept in memory.", lambda: len(self.revoked))
 
     async def async__init__(self):
         """
         Asynchronously initializes the session manager.
 
-        This method creates the 'Sessions' table in the database if it doesn't exist,
-        and performs session cleanup to remove expired sessions.
-        """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS Sessions (
-                    session_token TEXT PRIMARY KEY,
-                    uuid TEXT,
-                    creation_ip TEXT,                
-                    expiry INTEGER,
-                    authenticating_currently_using_two_factor_authentication BOOLEAN DEFAULT FALSE,
-                    created_at INTEGER DEFAULT (strftime('%s', 'now'))
-                )
-            ''')
-            await db.commit()
-            await self.session_cleanup()
+        This method opens the backend and performs session cleanup to remove expired sessions.
+        """
+        await self.backend.open()
+        self.changes_synced_at = time.time()
+        await self.session_cleanup()
+        if self.stateless:
+            await self.sync_revocations()
+
+    async def close(self) -> None:
+        """
+        Stops the expiry scheduler, commits any pending mutations and activity and closes the backend.
+
+        Returns:
+            None
+        """
+        await self.expiry.stop()
+        await self.flush_activity()
+        await self.backend.close()
+
+    def write_queue_stats(self) -> dict:
+        """
+        Returns the state of the write-behind queue.
+
+        Returns:
+            dict: The queue depth, pending sessions, committed and failed batch counts,
+                committed mutations and the commit batch size histogram.
+        """
+        return {
+            "queue_depth": len(self._queue),
+            "pending_sessions": len(self.pending),
+            "batches_committed": self._batches_committed.value,
+            "batches_failed": self._batches_failed.value,
+            "mutations_committed": self._mutations_committed.value,
+            "batch_sizes": dict(zip((*self.WRITE_BATCH_BUCKETS, float("inf")), self._batch_sizes.counts)),
+        }
+
+    async def _write(self, session_token: str, record: SessionRecord|None, *mutations: tuple) -> None:
+        """
+        Applies mutations of a session, or queues them when writes are delayed.
+
+        Args:
+            session_token (str): The session token.
+            record (SessionRecord|None): The session record after the mutations, None if deleted.
+            *mutations (tuple): The mutations, see `SessionBackend.apply`.
+        """
+        if not self.write_delay:
+            with self._write_seconds.time():
+                await self.backend.apply(list(mutations))
+        else:
+            self._sequence += 1
+            self.pending[session_token] = (self._sequence, record)
+            self._queue.extend((self._sequence, mutation) for mutation in mutations)
+            if len(self._queue) >= self.write_batch_size:
+                self._schedule_flush(0)
+            elif self._flush_timer is None:
+                self._schedule_flush(self.write_delay)
+
+        if record is None:
+            self.records.pop(session_token)
+        else:
+            self._cache(session_token, record)
+
+    def _cache(self, session_token: str, record: SessionRecord) -> None:
+        """
+        Keeps a resolved session in memory for `record_ttl` seconds, or until it expires if sooner.
+
+        Args:
+            session_token (str): The session token.
+            record (SessionRecord): The session record.
+        """
+        self.records.set(session_token, record, min(record.expiry, time.time() + self.record_ttl))
+
+    def _schedule_flush(self, delay: float) -> None:
+        """
+        Schedules the pending mutations to be committed after a delay.
+
+        Args:
+            delay (float): Seconds to wait before committing.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        """
+        Starts committing the pending mutations in the background.
+        """
+        self._flush_timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self) -> int:
+        """
+        Commits every queued mutation, in batches of at most `write_batch_size`.
+
+        A batch that fails is put back at the front of the queue and retried after the
+        write delay, so no mutation is lost while the backend is unavailable.
+
+        Returns:
+            int: The number of mutations committed.
+        """
+        committed = 0
+        async with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            while self._queue:
+                batch = self._queue[:self.write_batch_size]
+                del self._queue[:self.write_batch_size]
+                try:
+                    with self._write_seconds.time():
+                        await self.backend.apply([mutation for _, mutation in batch])
+                except Exception: # pylint: disable=broad-except
+                    self._queue[:0] = batch
+                    self._batches_failed.inc()
+                    logger.exception("Failed to commit %d session mutations, retrying.", len(batch))
+                    self._schedule_flush(self.write_delay or 1)
+                    break
+
+                sequence = batch[-1][0]
+                for session_token in [token for token, (queued, _) in self.pending.items() if queued <= sequence]:
+                    del self.pending[session_token]
+                committed += len(batch)
+                self._batches_committed.inc()
+                self._mutations_committed.inc(len(batch))
+                self._batch_sizes.observe(len(batch))
+        return committed
+
+    def record_activity(self, session_token: str, ip: str) -> None:
+        """
+        Records that a session was just used. Nothing is written until `flush_activity`.
+
+        Args:
+            session_token (str): The session token.
+            ip (str): The IP address the session was used from.
+        """
+        self.activity[session_token] = (time.time(), ip)
+
+    async def flush_activity(self) -> int:
+        """
+        Writes the activity recorded since the last flush in one batch.
+
+        Pending mutations are committed first, so activity is never written ahead of the
+        session it belongs to. With sliding expiry, each session's expiry is extended to
+        `sliding_expiry` seconds after it was last seen.
+
+        Returns:
+            int: The number of sessions written.
+        """
+        await self.flush()
+        if not self.activity:
+            return 0
+        activity, self.activity = self.activity, {}
+
+        batch = []
+        for session_token, (last_seen_at, ip) in activity.items():
+            expiry = None
+            if self.sliding_expiry:
+                expiry = last_seen_at + self.sliding_expiry
+                record = self.records.get(session_token)
+                if record is not None and expiry > record.expiry:
+                    self._cache(session_token, record._replace(expiry=expiry))
+                    self.expiry.track(session_token, record.uuid.hex, expiry)
+            batch.append((session_token, last_seen_at, ip, expiry))
+        await self.backend.touch(batch)
+        return len(batch)
+
+    async def _evict_expired(self, expired: list[tuple[str, str]]) -> None:
+        """
+        Drops sessions removed by the expiry scheduler from the in-process LRU.
+
+        Args:
+            expired (list[tuple[str, str]]): Tuples of session token and hex user UUID.
+        """
+        self._expired.inc(len(expired))
+        for session_token, _ in expired:
+            self.records.pop(session_token)
+
+    async def _lookup(self, session_token: str) -> SessionRecord|None:
+        """
+        Returns the current record of a session, expired or not.
+
+        Pending mutations are checked first, then the in-process LRU, then the backend.
+
+        Args:
+            session_token (str): The session token.
+
+        Returns:
+            SessionRecord|None: The session record, or None if the session does not exist.
+        """
+        started = time.perf_counter()
+        if session_token in self.pending:
+            self._lookups_pending.inc()
+            record = self.pending[session_token][1]
+        else:
+            record = self.records.get(session_token)
+            if record is not None:
+                self._lookups_memory.inc()
+            else:
+                record = await self.backend.fetch(session_token)
+                if record is not None:
+                    self._lookups_backend.inc()
+                    self._cache(session_token, record)
+                else:
+                    self._lookups_missing.inc()
+        self._lookup_seconds.observe(time.perf_counter() - started)
+        return record
+
+    async def resolve(self, session_token: str) -> SessionRecord|None:
+        """
+        Returns the user, expiry and two-factor state of a session in a single lookup.
+
+        Expired sessions are deleted and reported as missing.
+
+        Args:
+            session_token (str): The session token.
+
+        Returns:
+            SessionRecord|None: The session record if the session is valid and not expired, None otherwise.
+        """
+        record = await self._lookup(session_token)
+        if record is None:
+            return None
+        if record.expiry <= time.time():
+            await self.delete(session_token)
+            return None
+        return record
 
     async def change_twofactor_auth_state(self, session_token: str, state: bool) -> None:
         """
@@ -48,13 +382,15 @@ class SessionManager:
             session_token (str): The session token.
             state (bool): The new two-factor authentication state.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'UPDATE Sessions SET authenticating_currently_using_two_factor_authentication = ? WHERE session_token = ?',
-                (state, session_token)
-            )
-            await db.commit()
-    
+        record = await self.resolve(session_token)
+        if record is None:
+            return
+        await self._write(
+            session_token,
+            record._replace(two_factor_pending=state),
+            ('set_twofactor_state', session_token, state)
+        )
+
     async def get_twofactor_auth_state(self, session_token: str) -> bool:
         """
         Returns the two-factor authentication state of a session.
@@ -65,15 +401,10 @@ class SessionManager:
         Returns:
             bool: True if the session is currently authenticating using two-factor authentication, False otherwise.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('SELECT authenticating_currently_using_two_factor_authentication FROM Sessions WHERE session_token = ?', (session_token,)) as cursor:
-                row = await cursor.fetchone()
-                print(row)
-                if row is not None:
-                    if row[0] == 1:
-                        return True
-                    return False
-                return False
+        record = await self.resolve(session_token)
+        if record is not None:
+            return record.two_factor_pending
+        return False
 
     async def get_all_users(self) -> list[str]:
         """
@@ -82,19 +413,20 @@ class SessionManager:
         Returns:
             list[str]: A list of user UUIDs.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('SELECT uuid FROM Sessions') as cursor:
-                return list(set([row for row in await cursor.fetchall()]))
+        await self.flush()
+        return [(user_uuid,) for user_uuid in await self.backend.all_users()]
 
-    async def session_cleanup(self) -> None:
+    async def session_cleanup(self) -> int:
         """
         Removes all expired sessions from the database.
 
         This method is responsible for deleting sessions that have expired.
+
+        Returns:
+            int: The number of sessions removed.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM Sessions WHERE expiry <= ?', (time.time(),))
-            await db.commit()
+        await self.flush()
+        return await self.backend.cleanup(time.time())
 
     async def add(self, session_token: str, user_uuid: str, creation_ip: str, expiry: int) -> None:
         """
@@ -111,13 +443,66 @@ class SessionManager:
         """
         if expiry <= time.time():
             raise ValueError("Expiry must be a future Unix timestamp.")
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'INSERT OR REPLACE INTO Sessions (session_token, uuid, creation_ip, expiry) '
-                'VALUES (?, ?, ?, ?)',
-                (session_token, user_uuid.hex, creation_ip, expiry)
+        await self._write(
+            session_token,
+            SessionRecord(user_uuid, expiry, False),
+            ('add', session_token, user_uuid.hex, creation_ip, expiry)
+        )
+        self.expiry.track(session_token, user_uuid.hex, expiry)
+
+    async def add_limited(
+        self, session_token: str, user_uuid: uuid.UUID, creation_ip: str, expiry: int, max_sessions: int,
+        two_factor_pending: bool = False
+    ) -> int|None:
+        """
+        Adds a session unless the user already has `max_sessions` sessions.
+
+        The limit is checked and the session stored atomically by the backend, so
+        concurrent logins cannot race past it. The write is never delayed, and the
+        two-factor state is stored with the session - set afterwards, it could sit in the
+        write-behind queue while another worker reads the session without it. Queued
+        mutations are committed first, so a logout just before is counted.
+
+        Args:
+            session_token (str): The session token.
+            user_uuid (uuid.UUID): The UUID of the user.
+            creation_ip (str): The IP address where the session was created.
+            expiry (int): The Unix timestamp indicating the session expiry.
+            max_sessions (int): The maximum number of sessions the user may have.
+            two_factor_pending (bool): Whether the session has to confirm two-factor authentication before it is usable.
+
+        Returns:
+            int|None: The number of sessions of the user including the new one, or None if the limit was reached.
+
+        Raises:
+            ValueError: If the expiry is not a future Unix timestamp.
+        """
+        if expiry <= time.time():
+            raise ValueError("Expiry must be a future Unix timestamp.")
+        await self.flush()
+        with self._write_seconds.time():
+            count = await self.backend.add_limited(
+                session_token, user_uuid.hex, creation_ip, expiry, max_sessions, two_factor_pending
             )
-            await db.commit()
+        if count is not None:
+            self._cache(session_token, SessionRecord(user_uuid, expiry, two_factor_pending))
+            self.expiry.track(session_token, user_uuid.hex, expiry)
+        return count
+
+    async def session_count(self, user_uuid) -> int:
+        """
+        Returns the number of sessions of a user, without fetching them.
+
+        Args:
+            user_uuid: The UUID of the user.
+
+        Returns:
+            int: The number of sessions.
+        """
+        if isinstance(user_uuid, uuid.UUID):
+            user_uuid = user_uuid.hex
+        await self.flush()
+        return await self.backend.count(user_uuid)
 
     async def check_session_token(self, session_token: str) -> bool:
         """
@@ -129,21 +514,7 @@ class SessionManager:
         Returns:
             bool: True if the session token is valid, False otherwise.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            query = '''
-                SELECT expiry
-                FROM Sessions
-                WHERE session_token = ?
-                ORDER BY created_at ASC
-            '''
-            async with db.execute(query, (session_token,)) as cursor:
-                row = await cursor.fetchone()
-                if row is not None:
-                    expiry = row[0]
-                    if expiry > time.time():
-                        return True
-                await self.delete(session_token)
-                return False
+        return await self.resolve(session_token) is not None
 
     async def get(self, session_token: str) -> str|None:
         """
@@ -155,20 +526,10 @@ class SessionManager:
         Returns:
             str|None: The UUID of the user if the session is valid and not expired, None otherwise.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            query = '''
-                SELECT uuid, expiry
-                FROM Sessions
-                WHERE session_token = ?
-            '''
-            async with db.execute(query, (session_token,)) as cursor:
-                row = await cursor.fetchone()
-                if row is not None:
-                    user_uuid, expiry = row
-                    if expiry > time.time():
-                        return uuid.UUID(user_uuid)
-                await self.delete(session_token)
-                return None
+        record = await self.resolve(session_token)
+        if record is not None:
+            return record.uuid
+        return None
 
     async def cocurrent_sessions(self, user_uuid) -> list[tuple[str, str]]:
         """
@@ -182,25 +543,81 @@ class SessionManager:
         """
         if isinstance(user_uuid, uuid.UUID):
             user_uuid = user_uuid.hex
-        async with aiosqlite.connect(self.db_path) as db:
-            query = '''
-                SELECT session_token, creation_ip, expiry, created_at
-                FROM Sessions
-                WHERE uuid = ?
-            '''
-            async with db.execute(query, (user_uuid,)) as cursor:
-                return await cursor.fetchall() ## hexed uuids
+        await self.flush()
+        sessions = await self.backend.user_sessions(user_uuid) ## hexed uuids
+        # Overlay the activity recorded since the last flush.
+        return [
+            (*session[:4], *self.activity[session[0]]) if session[0] in self.activity else session
+            for session in sessions
+        ]
 
     async def delete(self, session_token: str) -> None:
         """
-        Deletes a session.
+        Deletes a session, revoking it first in stateless mode.
+
+        Args:
+            session_token (str): The session token.
+        """
+        mutations = [('delete', session_token)]
+        if self.stateless:
+            record = await self._lookup(session_token)
+            if record is not None and record.expiry > time.time():
+                mutations.append(('revoke', session_token, record.expiry))
+                self.revoked[session_token] = record.expiry
+        await self._write(session_token, None, *mutations)
+        self.expiry.untrack(session_token)
+        self.activity.pop(session_token, None)
+
+    def is_revoked(self, session_token: str) -> bool:
+        """
+        Returns whether a session has been revoked, as of the last revocation sync.
 
         Args:
             session_token (str): The session token.
+
+        Returns:
+            bool: True if the session has been revoked, False otherwise.
+        """
+        return session_token in self.revoked
+
+    async def sync_revocations(self) -> int:
+        """
+        Pulls the revocations made since the last sync, and forgets the ones that expired.
+
+        Returns:
+            int: The number of revocations fetched.
+        """
+        now = time.time()
+        since = self.revocations_synced_at - self.SYNC_OVERLAP
+        revocations = await self.backend.revocations_since(max(0.0, since))
+        for session_token, expiry in revocations:
+            self.revoked[session_token] = expiry
+        for session_token in [token for token, expiry in self.revoked.items() if expiry <= now]:
+            del self.revoked[session_token]
+        self.revocations_synced_at = now
+        return len(revocations)
+
+    async def sync_changes(self) -> int:
+        """
+        Drops the sessions deleted, or whose two-factor state changed, since the last sync from memory.
+
+        If the last sync is older than the backend keeps changes for, every session is
+        dropped instead, as the changes in between can no longer be listed.
+
+        Returns:
+            int: The number of changes fetched.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM Sessions WHERE session_token = ?', (session_token,))
-            await db.commit()
+        now = time.time()
+        if now - self.changes_synced_at > self.backend.CHANGE_RETENTION:
+            self.records.clear()
+            changes = []
+        else:
+            since = self.changes_synced_at - self.SYNC_OVERLAP
+            changes = await self.backend.changes_since(max(0.0, since))
+            for session_token in changes:
+                self.records.pop(session_token)
+        self.changes_synced_at = now
+        return len(changes)
 
     async def clear(self) -> None:
         """
@@ -209,6 +626,10 @@ class SessionManager:
         Returns:
             None
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM Sessions')
-            await db.commit()
+        async with self._flush_lock:
+            self._queue.clear()
+            self.pending.clear()
+            await self.backend.clear()
+        self.records.clear()
+        self.revoked.clear()
+        self.activity.clear()
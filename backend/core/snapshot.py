@@ -0,0 +1,194 @@
+"""
+This module provides the immutable user snapshot kept in the user cache, and its binary format.
+"""
+import datetime
+import struct
+import uuid
+from typing import NamedTuple
+
+FORMAT_VERSION = 2
+
+_NO_DATETIME, _NAIVE_DATETIME, _AWARE_DATETIME = range(3)
+
+# version, boolean flags, uuid, identifier, max_sessions, staff_level,
+# last_login and created_at as (kind, year, month, day, hour, minute, second, microsecond, UTC offset in minutes),
+# which of the eight strings are present as bit flags, and their lengths
+_HEADER = struct.Struct("<BB16sqiiBHBBBBBIhBHBBBBBIhB8I")
+
+_TIMEZONES = {0: datetime.timezone.utc}
+
+
+def _pack_datetime(value: datetime.datetime|None) -> tuple:
+    """
+    Splits a datetime into the fields stored in the header.
+
+    Args:
+        value (datetime.datetime|None): The datetime, naive or timezone-aware.
+
+    Returns:
+        tuple: The kind of datetime, its components and its UTC offset in minutes.
+    """
+    if value is None:
+        return _NO_DATETIME, 1970, 1, 1, 0, 0, 0, 0, 0
+    offset = value.utcoffset()
+    return (
+        _NAIVE_DATETIME if offset is None else _AWARE_DATETIME,
+        value.year, value.month, value.day,
+        value.hour, value.minute, value.second, value.microsecond,
+        0 if offset is None else offset // datetime.timedelta(minutes=1)
+    )
+
+
+def _unpack_datetime(kind, year, month, day, hour, minute, second, microsecond, offset) -> datetime.datetime|None:
+    """
+    Reassembles a datetime from the fields stored in the header.
+
+    Returns:
+        datetime.datetime|None: The datetime.
+    """
+    if kind == _NO_DATETIME:
+        return None
+    if kind == _NAIVE_DATETIME:
+        return datetime.datetime(year, month, day, hour, minute, second, microsecond)
+    tzinfo = _TIMEZONES.get(offset)
+    if tzinfo is None:
+        tzinfo = _TIMEZONES[offset] = datetime.timezone(datetime.timedelta(minutes=offset))
+    return datetime.datetime(year, month, day, hour, minute, second, microsecond, tzinfo)
+
+
+class CachedUser(NamedTuple):
+    """
+    An immutable snapshot of the user fields the views read.
+
+    Unlike the `User` model it leaves out the password hash, the two-factor authentication
+    secret and the one-time codes, and it carries no ORM state, so it is cheap to serialize.
+    """
+    identifier: int
+    uuid: uuid.UUID
+    username: str
+    email: str
+    email_verified: bool
+    avatar: str|None
+    last_login: datetime.datetime|None
+    latest_ip: str
+    signup_ip: str
+    max_sessions: int
+    created_at: datetime.datetime
+    google_account_identifier: str|None
+    discord_account_identifier: str|None
+    github_account_identifier: str|None
+    two_factor_authentication_enabled: bool
+    setting_up_two_factor_authentication: bool
+    is_root_admin: bool
+    staff_level: int
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        """
+        Takes a snapshot of a user.
+
+        Args:
+            user (User): The user model, or another snapshot.
+
+        Returns:
+            CachedUser: The snapshot.
+        """
+        return cls._make(getattr(user, name) for name in cls._fields)
+
+    def to_dict(self) -> dict:
+        """
+        Converts the snapshot to a dictionary.
+
+        Returns:
+            dict: The fields of the snapshot.
+        """
+        return self._asdict()
+
+    def dumps(self) -> bytes:
+        """
+        Serializes the snapshot.
+
+        The format is a fixed-size header - a version byte, the booleans as bit flags, the UUID,
+        the integers, the datetimes by component, which strings are present as bit flags and the
+        lengths of the strings - followed by the UTF-8 encoded strings.
+
+        Returns:
+            bytes: The serialized snapshot.
+        """
+        strings = [
+            None if value is None else value.encode()
+            for value in (
+                self.username, self.email, self.avatar, self.latest_ip, self.signup_ip,
+                self.google_account_identifier, self.discord_account_identifier, self.github_account_identifier
+            )
+        ]
+        flags = (
+            bool(self.email_verified)
+            | bool(self.two_factor_authentication_enabled) << 1
+            | bool(self.setting_up_two_factor_authentication) << 2
+            | bool(self.is_root_admin) << 3
+        )
+        header = _HEADER.pack(
+            FORMAT_VERSION,
+            flags,
+            self.uuid.bytes,
+            self.identifier,
+            self.max_sessions,
+            self.staff_level,
+            *_pack_datetime(self.last_login),
+            *_pack_datetime(self.created_at),
+            sum(1 << index for index, value in enumerate(strings) if value is not None),
+            *(0 if value is None else len(value) for value in strings)
+        )
+        return header + b"".join(value for value in strings if value is not None)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedUser":
+        """
+        Deserializes a snapshot.
+
+        Args:
+            data (bytes): The snapshot serialized by `dumps`.
+
+        Returns:
+            CachedUser: The snapshot.
+
+        Raises:
+            ValueError: If the data was written in an unknown format version.
+        """
+        if data[0] != FORMAT_VERSION:
+            raise ValueError(f"Unknown user snapshot format version {data[0]}.")
+        header = _HEADER.unpack_from(data)
+        flags = header[1]
+
+        strings = []
+        position = _HEADER.size
+        present = header[24]
+        for index, length in enumerate(header[25:]):
+            if not present & 1 << index:
+                strings.append(None)
+            else:
+                strings.append(data[position:position + length].decode())
+                position += length
+        username, email, avatar, latest_ip, signup_ip, google, discord, github = strings
+
+        return tuple.__new__(cls, (
+            header[3],
+            uuid.UUID(bytes=header[2]),
+            username,
+            email,
+            bool(flags & 1),
+            avatar,
+            _unpack_datetime(*header[6:15]),
+            latest_ip,
+            signup_ip,
+            header[4],
+            _unpack_datetime(*header[15:24]),
+            google,
+            discord,
+            github,
+            bool(flags & 2),
+            bool(flags & 4),
+            bool(flags & 8),
+            header[5],
+        ))
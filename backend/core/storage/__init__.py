@@ -0,0 +1,123 @@
+"""
+This package provides the storage backends behind the session manager, the user cache and the rate limiter.
+
+The backend is picked with `storage.backend` in config.yml:
+    memory - per-process dictionaries, nothing persisted or shared
+    sqlite - SQLite files in the working directory (the default)
+    redis  - a Redis-protocol server, shared by every worker and host
+"""
+# pylint: disable=import-error
+from core.storage.base import CacheBackend, RateLimitBackend, SessionBackend, SessionRecord
+
+
+def _redis_client(config: dict):
+    """
+    Creates a RESP client from the `storage.redis` config section.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        RespClient: The unconnected client.
+    """
+    from core.storage.resp import RespClient
+    redis_config = config["storage"]["redis"]
+    return RespClient(
+        host=redis_config["host"],
+        port=redis_config["port"],
+        db=redis_config["db"],
+        password=redis_config["password"] or None,
+        pool_size=redis_config["pool_size"]
+    )
+
+
+def create_session_backend(config: dict) -> SessionBackend:
+    """
+    Creates the session backend selected in the config.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        SessionBackend: The unopened backend.
+
+    Raises:
+        ValueError: If the configured backend is unknown.
+    """
+    backend = config["storage"]["backend"]
+    if backend == "memory":
+        from core.storage.memory import MemorySessionBackend
+        return MemorySessionBackend()
+    if backend == "sqlite":
+        from core.storage.sqlite import SQLiteSessionBackend
+        return SQLiteSessionBackend(
+            config["storage"]["sqlite"]["session_path"],
+            config["storage"]["sqlite"]["reader_connections"],
+            config["session"]["session_cleanup_batch_size"]
+        )
+    if backend == "redis":
+        from core.storage.redis import RedisSessionBackend
+        return RedisSessionBackend(
+            _redis_client(config),
+            config["storage"]["redis"]["key_prefix"],
+            config["session"]["session_cleanup_batch_size"]
+        )
+    raise ValueError(f"Unknown storage backend '{backend}'.")
+
+
+def create_cache_backend(config: dict) -> CacheBackend:
+    """
+    Creates the user cache backend selected in the config.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        CacheBackend: The unopened backend.
+
+    Raises:
+        ValueError: If the configured backend is unknown.
+    """
+    backend = config["storage"]["backend"]
+    if backend == "memory":
+        from core.storage.memory import MemoryCacheBackend
+        return MemoryCacheBackend()
+    if backend == "sqlite":
+        from core.storage.sqlite import SQLiteCacheBackend
+        return SQLiteCacheBackend(
+            config["storage"]["sqlite"]["cache_path"],
+            config["storage"]["sqlite"]["reader_connections"]
+        )
+    if backend == "redis":
+        from core.storage.redis import RedisCacheBackend
+        return RedisCacheBackend(_redis_client(config), config["storage"]["redis"]["key_prefix"])
+    raise ValueError(f"Unknown storage backend '{backend}'.")
+
+
+def create_rate_limit_backend(config: dict) -> RateLimitBackend:
+    """
+    Creates the rate limit backend selected in the config.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        RateLimitBackend: The unopened backend.
+
+    Raises:
+        ValueError: If the configured backend is unknown.
+    """
+    backend = config["storage"]["backend"]
+    if backend == "memory":
+        from core.storage.memory import MemoryRateLimitBackend
+        return MemoryRateLimitBackend()
+    if backend == "sqlite":
+        from core.storage.sqlite import SQLiteRateLimitBackend
+        return SQLiteRateLimitBackend(
+            config["storage"]["sqlite"]["rate_limit_path"],
+            config["storage"]["sqlite"]["reader_connections"]
+        )
+    if backend == "redis":
+        from core.storage.redis import RedisRateLimitBackend
+        return RedisRateLimitBackend(_redis_client(config), config["storage"]["redis"]["key_prefix"])
+    raise ValueError(f"Unknown storage backend '{backend}'.")
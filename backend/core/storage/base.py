@@ -0,0 +1,495 @@
+"""
+This module defines the interfaces every session and cache storage backend implements.
+"""
+import abc
+import uuid
+from typing import NamedTuple
+
+
+class SessionRecord(NamedTuple):
+    """
+    The fields of a session needed to authorize a request.
+    """
+    uuid: uuid.UUID
+    expiry: float
+    two_factor_pending: bool
+
+
+class SessionBackend(abc.ABC):
+    """
+    Stores sessions for the `SessionManager`.
+
+    Backends only store and fetch - expiry checks and in-memory caching are done by the manager.
+    User UUIDs are always passed to and returned from backends as hex strings.
+
+    Deleting a session or changing its two-factor state also records the session as
+    changed, with the time of the change, so workers keeping their own copies of sessions
+    can drop the ones another worker changed. Changes are listed for at least
+    `CHANGE_RETENTION` seconds.
+    """
+
+    CHANGE_RETENTION = 3600
+
+    async def open(self) -> None:
+        """
+        Opens connections and prepares the storage for use.
+
+        Returns:
+            None
+        """
+
+    async def close(self) -> None:
+        """
+        Releases every connection held by the backend.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def add(self, session_token: str, user_uuid: str, creation_ip: str, expiry: float) -> None:
+        """
+        Stores a new session, replacing any session with the same token.
+
+        Args:
+            session_token (str): The session token.
+            user_uuid (str): The hex UUID of the user.
+            creation_ip (str): The IP address where the session was created.
+            expiry (float): The Unix timestamp indicating the session expiry.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def add_limited(
+        self, session_token: str, user_uuid: str, creation_ip: str, expiry: float, limit: int, two_factor_pending: bool = False
+    ) -> int|None:
+        """
+        Stores a new session, atomically, only if the user has fewer than `limit` sessions.
+
+        Concurrent calls can never take a user past the limit. The two-factor state is
+        stored with the session, so no worker can ever read it without it.
+
+        Args:
+            session_token (str): The session token.
+            user_uuid (str): The hex UUID of the user.
+            creation_ip (str): The IP address where the session was created.
+            expiry (float): The Unix timestamp indicating the session expiry.
+            limit (int): The maximum number of sessions the user may have.
+            two_factor_pending (bool): Whether the session has to confirm two-factor authentication.
+
+        Returns:
+            int|None: The number of sessions of the user including the new one, or None if the limit was reached.
+        """
+
+    @abc.abstractmethod
+    async def count(self, user_uuid: str) -> int:
+        """
+        Returns the number of stored sessions of a user, kept as a counter by the store.
+
+        Args:
+            user_uuid (str): The hex UUID of the user.
+
+        Returns:
+            int: The number of sessions.
+        """
+
+    @abc.abstractmethod
+    async def fetch(self, session_token: str) -> SessionRecord|None:
+        """
+        Returns the stored record of a session, expired or not.
+
+        Args:
+            session_token (str): The session token.
+
+        Returns:
+            SessionRecord|None: The session record, or None if the session does not exist.
+        """
+
+    @abc.abstractmethod
+    async def set_twofactor_state(self, session_token: str, state: bool) -> None:
+        """
+        Changes the two-factor authentication state of a session.
+
+        Args:
+            session_token (str): The session token.
+            state (bool): The new two-factor authentication state.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def delete(self, session_token: str) -> None:
+        """
+        Deletes a session.
+
+        Args:
+            session_token (str): The session token.
+
+        Returns:
+            None
+        """
+
+    async def apply(self, mutations: list[tuple]) -> None:
+        """
+        Applies several mutations, in order.
+
+        Each mutation is a tuple of a mutation method name - 'add', 'set_twofactor_state',
+        'delete' or 'revoke' - followed by that method's arguments. Backends override this
+        to apply the whole batch in a single transaction or round trip.
+
+        Args:
+            mutations (list[tuple]): The mutations to apply.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a mutation is unknown.
+        """
+        for method, *args in mutations:
+            if method not in ('add', 'set_twofactor_state', 'delete', 'revoke'):
+                raise ValueError(f"Unknown session mutation '{method}'.")
+            await getattr(self, method)(*args)
+
+    @abc.abstractmethod
+    async def touch(self, activity: list[tuple[str, float, str, float|None]]) -> None:
+        """
+        Records when and from where sessions were last seen, in one batch.
+
+        Sessions that no longer exist are skipped.
+
+        Args:
+            activity (list[tuple]): Tuples of session token, last seen time, last IP and the
+                new expiry - None keeps the expiry, a later expiry than the stored one extends it.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def user_sessions(self, user_uuid: str) -> list[tuple]:
+        """
+        Returns every stored session of a user.
+
+        Args:
+            user_uuid (str): The hex UUID of the user.
+
+        Returns:
+            list[tuple]: Tuples of session token, creation IP, expiry, creation time, last seen
+                time and last IP - the last two are None until activity was recorded.
+        """
+
+    @abc.abstractmethod
+    async def all_users(self) -> list[str]:
+        """
+        Returns every user with at least one stored session.
+
+        Returns:
+            list[str]: The hex UUIDs of the users.
+        """
+
+    @abc.abstractmethod
+    async def expiring_before(self, timestamp: float) -> list[tuple[str, str, float]]:
+        """
+        Returns every session that expires at or before the given time.
+
+        Args:
+            timestamp (float): The Unix timestamp to compare expiries against.
+
+        Returns:
+            list[tuple[str, str, float]]: Tuples of session token, hex user UUID and expiry.
+        """
+
+    @abc.abstractmethod
+    async def revoke(self, session_token: str, expiry: float) -> None:
+        """
+        Records that a session was revoked, so stateless cookies for it are refused.
+
+        Args:
+            session_token (str): The session token.
+            expiry (float): The Unix timestamp the session would have expired at.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def revocations_since(self, since: float) -> list[tuple[str, float]]:
+        """
+        Returns the sessions revoked after the given time.
+
+        Args:
+            since (float): The Unix timestamp to return revocations after.
+
+        Returns:
+            list[tuple[str, float]]: Tuples of session token and the session's expiry.
+        """
+
+    @abc.abstractmethod
+    async def changes_since(self, since: float) -> list[str]:
+        """
+        Returns the sessions deleted, or whose two-factor state changed, after the given time.
+
+        Args:
+            since (float): The Unix timestamp to return changes after.
+
+        Returns:
+            list[str]: The session tokens.
+        """
+
+    @abc.abstractmethod
+    async def cleanup(self, now: float) -> int:
+        """
+        Removes every session, and every revocation, that expired at or before the given time,
+        and every change older than `CHANGE_RETENTION` seconds.
+
+        Args:
+            now (float): The Unix timestamp to compare expiries against.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+
+    @abc.abstractmethod
+    async def clear(self) -> None:
+        """
+        Removes every session.
+
+        Returns:
+            None
+        """
+
+
+class CacheBackend(abc.ABC):
+    """
+    Stores serialized users for the `Cache`, keyed by their hex UUID.
+
+    Every `set`, `delete` and `clear` is also recorded in a change log, so workers keeping
+    their own copies of cached users can find out which ones another worker replaced.
+    Positions in the log are opaque versions, only ever passed back to `changes_since`.
+
+    Every entry also records when it was stored, when it was last read and its size, so
+    `prune` can bound the cache by age, entry count and bytes.
+    """
+
+    # Returned by `changes_since` in place of the changed users when every copy must be dropped.
+    EVERYTHING = '*'
+
+    async def open(self) -> None:
+        """
+        Opens connections and prepares the storage for use.
+
+        Returns:
+            None
+        """
+
+    async def close(self) -> None:
+        """
+        Releases every connection held by the backend.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def get(self, user_identifier: str) -> bytes|None:
+        """
+        Returns the data stored for a user.
+
+        Args:
+            user_identifier (str): The hex UUID of the user.
+
+        Returns:
+            bytes|None: The stored data, or None if the user is not cached.
+        """
+
+    @abc.abstractmethod
+    async def set(self, user_identifier: str, data: bytes) -> None:
+        """
+        Stores the data of a user, replacing any previous data.
+
+        Args:
+            user_identifier (str): The hex UUID of the user.
+            data (bytes): The data to store.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def add(self, user_identifier: str, data: bytes) -> bool:
+        """
+        Stores the data of a user unless data is already stored for them.
+
+        Used to fill the cache from the database, so a fill can never overwrite data a
+        concurrent update stored in the meantime. Not recorded in the change log, as no
+        worker can hold a copy of a user that was not cached.
+
+        Args:
+            user_identifier (str): The hex UUID of the user.
+            data (bytes): The data to store.
+
+        Returns:
+            bool: Whether the data was stored.
+        """
+
+    @abc.abstractmethod
+    async def add_many(self, users: list[tuple[str, bytes]]) -> int:
+        """
+        Stores the data of several users at once, skipping users already stored, like `add`.
+
+        Args:
+            users (list[tuple[str, bytes]]): The hex UUID and data of every user.
+
+        Returns:
+            int: The number of users stored.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, user_identifier: str) -> None:
+        """
+        Removes the data of a user.
+
+        Args:
+            user_identifier (str): The hex UUID of the user.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def clear(self) -> None:
+        """
+        Removes every cached user.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def version(self):
+        """
+        Returns the current position in the change log.
+
+        Returns:
+            The version to pass to `changes_since`.
+        """
+
+    @abc.abstractmethod
+    async def changes_since(self, version, limit: int = 1000) -> tuple[object, list[str]]:
+        """
+        Returns the users changed after a position in the change log.
+
+        Args:
+            version: A version returned by `version` or by an earlier call.
+            limit (int): The most users to return - past it, `EVERYTHING` is returned instead.
+
+        Returns:
+            tuple[object, list[str]]: The new version and the hex UUIDs of the changed users,
+                or `[EVERYTHING]` if the cache was cleared or the changes can no longer be listed.
+        """
+
+    @abc.abstractmethod
+    async def touch(self, user_identifiers: list[str], now: float) -> None:
+        """
+        Records that users were read, for least-recently-used eviction.
+
+        Args:
+            user_identifiers (list[str]): The hex UUIDs of the users read.
+            now (float): The Unix timestamp they were read at.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def prune(self, stored_before: float|None, max_entries: int|None, max_bytes: int|None) -> int:
+        """
+        Removes users stored too long ago, then the least recently read users until the
+        cache is within its limits.
+
+        Evictions are not recorded in the change log - they do not change any user.
+
+        Args:
+            stored_before (float|None): Remove users stored at or before this Unix timestamp, if set.
+            max_entries (int|None): The most users to keep, if set.
+            max_bytes (int|None): The most bytes of data to keep, if set.
+
+        Returns:
+            int: The number of users removed.
+        """
+
+    @abc.abstractmethod
+    async def stats(self) -> tuple[int, int]:
+        """
+        Returns the size of the cache.
+
+        Returns:
+            tuple[int, int]: The number of cached users and the bytes of data stored for them.
+        """
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Counts requests per key in fixed windows for the `RateLimiter`.
+
+    A window is identified by its index - the Unix timestamp it starts at divided by its
+    length - so the keys of limits with different window lengths must not overlap. Each
+    counter carries the time it can be dropped at, once its window can no longer be read
+    as the previous one.
+    """
+
+    async def open(self) -> None:
+        """
+        Opens connections and prepares the storage for use.
+
+        Returns:
+            None
+        """
+
+    async def close(self) -> None:
+        """
+        Releases every connection held by the backend.
+
+        Returns:
+            None
+        """
+
+    @abc.abstractmethod
+    async def hit(self, keys: list[str], window: int, expires_at: float) -> list[tuple[int, int]]:
+        """
+        Counts a request against every key in the given window, atomically per key.
+
+        Args:
+            keys (list[str]): The keys to count the request against.
+            window (int): The index of the current window.
+            expires_at (float): The Unix timestamp the counters of the current window can be dropped at.
+
+        Returns:
+            list[tuple[int, int]]: For every key, the count of the previous window and the
+            count of the current window including this request.
+        """
+
+    @abc.abstractmethod
+    async def cleanup(self, now: float) -> int:
+        """
+        Drops every counter that expired at or before the given time.
+
+        Args:
+            now (float): The Unix timestamp to compare expiries against.
+
+        Returns:
+            int: The number of counters dropped.
+        """
+
+    @abc.abstractmethod
+    async def clear(self) -> None:
+        """
+        Drops every counter.
+
+        Returns:
+            None
+        """
@@ -0,0 +1,231 @@
+"""
+This module provides in-memory storage backends.
+
+Nothing is persisted and nothing is shared between processes - these backends suit a
+single worker, development and tests.
+"""
+import time
+import uuid
+# pylint: disable=import-error
+from core.storage.base import CacheBackend, RateLimitBackend, SessionBackend, SessionRecord
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Stores sessions in a dictionary, with a per-user index of session tokens.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._users = {}
+        self._revocations = {}
+        self._changes = {}
+
+    async def add(self, session_token: str, user_uuid: str, creation_ip: str, expiry: float) -> None:
+        await self.delete(session_token)
+        self._sessions[session_token] = [user_uuid, creation_ip, expiry, False, int(time.time()), None, None]
+        self._users.setdefault(user_uuid, set()).add(session_token)
+
+    async def add_limited(
+        self, session_token: str, user_uuid: str, creation_ip: str, expiry: float, limit: int, two_factor_pending: bool = False
+    ) -> int|None:
+        if len(self._users.get(user_uuid, ())) >= limit:
+            return None
+        await self.add(session_token, user_uuid, creation_ip, expiry)
+        self._sessions[session_token][3] = two_factor_pending
+        return len(self._users[user_uuid])
+
+    async def count(self, user_uuid: str) -> int:
+        return len(self._users.get(user_uuid, ()))
+
+    async def fetch(self, session_token: str) -> SessionRecord|None:
+        session = self._sessions.get(session_token)
+        if session is None:
+            return None
+        return SessionRecord(uuid.UUID(session[0]), session[2], session[3])
+
+    async def set_twofactor_state(self, session_token: str, state: bool) -> None:
+        session = self._sessions.get(session_token)
+        if session is not None:
+            session[3] = state
+            self._changes[session_token] = time.time()
+
+    async def delete(self, session_token: str) -> None:
+        session = self._sessions.pop(session_token, None)
+        if session is None:
+            return
+        self._changes[session_token] = time.time()
+        tokens = self._users.get(session[0])
+        tokens.discard(session_token)
+        if not tokens:
+            del self._users[session[0]]
+
+    async def touch(self, activity: list[tuple[str, float, str, float|None]]) -> None:
+        for session_token, last_seen_at, last_ip, expiry in activity:
+            session = self._sessions.get(session_token)
+            if session is None:
+                continue
+            session[5], session[6] = last_seen_at, last_ip
+            if expiry is not None and expiry > session[2]:
+                session[2] = expiry
+
+    async def user_sessions(self, user_uuid: str) -> list[tuple]:
+        return [
+            (token, *(self._sessions[token][index] for index in (1, 2, 4, 5, 6)))
+            for token in self._users.get(user_uuid, ())
+        ]
+
+    async def all_users(self) -> list[str]:
+        return list(self._users)
+
+    async def expiring_before(self, timestamp: float) -> list[tuple[str, str, float]]:
+        return [
+            (token, session[0], session[2]) for token, session in self._sessions.items()
+            if session[2] <= timestamp
+        ]
+
+    async def revoke(self, session_token: str, expiry: float) -> None:
+        self._revocations[session_token] = (expiry, time.time())
+
+    async def revocations_since(self, since: float) -> list[tuple[str, float]]:
+        return [
+            (token, expiry) for token, (expiry, revoked_at) in self._revocations.items()
+            if revoked_at > since
+        ]
+
+    async def changes_since(self, since: float) -> list[str]:
+        return [token for token, changed_at in self._changes.items() if changed_at > since]
+
+    async def cleanup(self, now: float) -> int:
+        expired = [token for token, session in self._sessions.items() if session[2] <= now]
+        for token in expired:
+            await self.delete(token)
+        for token in [token for token, (expiry, _) in self._revocations.items() if expiry <= now]:
+            del self._revocations[token]
+        for token in [token for token, changed_at in self._changes.items() if changed_at <= now - self.CHANGE_RETENTION]:
+            del self._changes[token]
+        return len(expired)
+
+    async def clear(self) -> None:
+        self._sessions.clear()
+        self._users.clear()
+        self._revocations.clear()
+        self._changes.clear()
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Stores cached users in a dictionary of [data, stored at, last read at], with the version
+    each user was last changed at.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._bytes = 0
+        self._versions = {}
+        self._version = 0
+
+    def _changed(self, user_identifier: str) -> None:
+        self._version += 1
+        self._versions[user_identifier] = self._version
+
+    def _store(self, user_identifier: str, data: bytes) -> None:
+        self._discard(user_identifier)
+        now = time.time()
+        self._users[user_identifier] = [data, now, now]
+        self._bytes += len(data)
+
+    def _discard(self, user_identifier: str) -> None:
+        entry = self._users.pop(user_identifier, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    async def get(self, user_identifier: str) -> bytes|None:
+        entry = self._users.get(user_identifier)
+        return None if entry is None else entry[0]
+
+    async def set(self, user_identifier: str, data: bytes) -> None:
+        self._store(user_identifier, data)
+        self._changed(user_identifier)
+
+    async def add(self, user_identifier: str, data: bytes) -> bool:
+        if user_identifier in self._users:
+            return False
+        self._store(user_identifier, data)
+        return True
+
+    async def add_many(self, users: list[tuple[str, bytes]]) -> int:
+        return sum([await self.add(user_identifier, data) for user_identifier, data in users])
+
+    async def delete(self, user_identifier: str) -> None:
+        self._discard(user_identifier)
+        self._changed(user_identifier)
+
+    async def clear(self) -> None:
+        self._users.clear()
+        self._bytes = 0
+        self._versions.clear()
+        self._changed(self.EVERYTHING)
+
+    async def version(self) -> int:
+        return self._version
+
+    async def changes_since(self, version: int, limit: int = 1000) -> tuple[int, list[str]]:
+        if version == self._version:
+            return version, []
+        changed = [user for user, changed_at in self._versions.items() if changed_at > version]
+        if self.EVERYTHING in changed or len(changed) > limit:
+            return self._version, [self.EVERYTHING]
+        return self._version, changed
+
+    async def touch(self, user_identifiers: list[str], now: float) -> None:
+        for user_identifier in user_identifiers:
+            entry = self._users.get(user_identifier)
+            if entry is not None:
+                entry[2] = now
+
+    async def prune(self, stored_before: float|None, max_entries: int|None, max_bytes: int|None) -> int:
+        removed = 0
+        if stored_before is not None:
+            for user_identifier in [user for user, entry in self._users.items() if entry[1] <= stored_before]:
+                self._discard(user_identifier)
+                removed += 1
+        if (max_entries is not None and len(self._users) > max_entries) or (max_bytes is not None and self._bytes > max_bytes):
+            for user_identifier in sorted(self._users, key=lambda user: self._users[user][2]):
+                if (max_entries is None or len(self._users) <= max_entries) and (max_bytes is None or self._bytes <= max_bytes):
+                    break
+                self._discard(user_identifier)
+                removed += 1
+        return removed
+
+    async def stats(self) -> tuple[int, int]:
+        return len(self._users), self._bytes
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Counts requests in a dictionary of (key, window) to [count, expires at].
+    """
+
+    def __init__(self):
+        self._counters = {}
+
+    async def hit(self, keys: list[str], window: int, expires_at: float) -> list[tuple[int, int]]:
+        counts = []
+        for key in keys:
+            counter = self._counters.get((key, window))
+            if counter is None:
+                counter = self._counters[(key, window)] = [0, expires_at]
+            counter[0] += 1
+            previous = self._counters.get((key, window - 1))
+            counts.append((0 if previous is None else previous[0], counter[0]))
+        return counts
+
+    async def cleanup(self, now: float) -> int:
+        expired = [counter for counter, (_, expires_at) in self._counters.items() if expires_at <= now]
+        for counter in expired:
+            del self._counters[counter]
+        return len(expired)
+
+    async def clear(self) -> None:
+        self._counters.clear()
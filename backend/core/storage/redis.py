@@ -0,0 +1,557 @@
+"""
+This module provides storage backends for Redis, or any server speaking the Redis protocol.
+
+Sessions are shared by every worker and host pointed at the same server. Session keys
+carry a native TTL, so the server drops them at their expiry even if no cleanup runs.
+"""
+import time
+import uuid
+# pylint: disable=import-error
+from core.storage.base import CacheBackend, RateLimitBackend, SessionBackend, SessionRecord
+from core.storage.resp import RespClient
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Stores sessions on a Redis-protocol server.
+
+    Layout, below the configured key prefix:
+        sessions:token:<token> - hash of uuid, creation_ip, expiry, two_factor, created_at,
+                                 last_seen_at and last_ip (expires natively)
+        sessions:user:<uuid>   - set of the user's session tokens, its cardinality is the session count
+        sessions:expiry        - sorted set of "<uuid>:<token>" scored by expiry, used for cleanup
+        sessions:revoked       - sorted set of "<expiry>:<token>" scored by revocation time
+        sessions:revoked:expiry - the same members scored by expiry, used for cleanup
+        sessions:changes       - sorted set of the tokens of changed sessions scored by the time of the change
+    """
+
+    def __init__(self, client: RespClient, key_prefix: str = '', cleanup_batch_size: int = 1000):
+        """
+        Initializes the backend.
+
+        Args:
+            client (RespClient): The client used to reach the server.
+            key_prefix (str): Prefix added to every key, to share a server between deployments.
+            cleanup_batch_size (int): The maximum number of expired sessions removed per round trip.
+        """
+        self.client = client
+        self.prefix = f'{key_prefix}sessions:'
+        self.cleanup_batch_size = max(1, cleanup_batch_size)
+
+    def _token_key(self, session_token: str) -> str:
+        return f'{self.prefix}token:{session_token}'
+
+    def _user_key(self, user_uuid: str) -> str:
+        return f'{self.prefix}user:{user_uuid}'
+
+    async def open(self) -> None:
+        await self.client.connect()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    def _add_commands(self, session_token: str, user_uuid: str, creation_ip: str, expiry: float, two_factor_pending: bool = False) -> list[tuple]:
+        token_key = self._token_key(session_token)
+        return [
+            ('HSET', token_key,
+                'uuid', user_uuid, 'creation_ip', creation_ip, 'expiry', expiry,
+                'two_factor', int(two_factor_pending), 'created_at', int(time.time())),
+            ('EXPIREAT', token_key, int(expiry) + 1),
+            ('SADD', self._user_key(user_uuid), session_token),
+            ('ZADD', f'{self.prefix}expiry', expiry, f'{user_uuid}:{session_token}'),
+        ]
+
+    def _delete_commands(self, session_token: str, user_uuid: str) -> list[tuple]:
+        return [
+            ('DEL', self._token_key(session_token)),
+            ('SREM', self._user_key(user_uuid), session_token),
+            ('ZREM', f'{self.prefix}expiry', f'{user_uuid}:{session_token}'),
+            self._change_command(session_token),
+        ]
+
+    def _twofactor_commands(self, session_token: str, state: bool) -> list[tuple]:
+        return [
+            ('HSET', self._token_key(session_token), 'two_factor', int(state)),
+            self._change_command(session_token),
+        ]
+
+    def _change_command(self, session_token: str) -> tuple:
+        return ('ZADD', f'{self.prefix}changes', time.time(), session_token)
+
+    def _revoke_commands(self, session_token: str, expiry: float) -> list[tuple]:
+        member = f'{expiry}:{session_token}'
+        return [
+            ('ZADD', f'{self.prefix}revoked', time.time(), member),
+            ('ZADD', f'{self.prefix}revoked:expiry', expiry, member),
+        ]
+
+    async def add(self, session_token: str, user_uuid: str, creation_ip: str, expiry: float) -> None:
+        await self.client.transaction(self._add_commands(session_token, user_uuid, creation_ip, expiry))
+
+    async def add_limited(
+        self, session_token: str, user_uuid: str, creation_ip: str, expiry: float, limit: int, two_factor_pending: bool = False
+    ) -> int|None:
+        """
+        Stores a new session only if the user has fewer than `limit` sessions.
+
+        The token is first reserved in the user's set, atomically with reading the set's
+        size. A reservation that takes the user over the limit is rolled back, so
+        concurrent logins can never get past it - at worst two racing logins both back off.
+
+        Args:
+            session_token (str): The session token.
+            user_uuid (str): The hex UUID of the user.
+            creation_ip (str): The IP address where the session was created.
+            expiry (float): The Unix timestamp indicating the session expiry.
+            limit (int): The maximum number of sessions the user may have.
+            two_factor_pending (bool): Whether the session has to confirm two-factor authentication.
+
+        Returns:
+            int|None: The number of sessions of the user including the new one, or None if the limit was reached.
+        """
+        user_key = self._user_key(user_uuid)
+        _, count = await self.client.transaction([
+            ('SADD', user_key, session_token),
+            ('SCARD', user_key),
+        ])
+        if count > limit:
+            await self.client.execute('SREM', user_key, session_token)
+            return None
+        try:
+            await self.client.transaction(
+                self._add_commands(session_token, user_uuid, creation_ip, expiry, two_factor_pending)
+            )
+        except BaseException:
+            await self.client.execute('SREM', user_key, session_token)
+            raise
+        return count
+
+    async def count(self, user_uuid: str) -> int:
+        return await self.client.execute('SCARD', self._user_key(user_uuid))
+
+    async def fetch(self, session_token: str) -> SessionRecord|None:
+        user_uuid, expiry, two_factor = await self.client.execute(
+            'HMGET', self._token_key(session_token), 'uuid', 'expiry', 'two_factor'
+        )
+        if user_uuid is None:
+            return None
+        return SessionRecord(uuid.UUID(user_uuid.decode()), float(expiry), two_factor == b'1')
+
+    async def set_twofactor_state(self, session_token: str, state: bool) -> None:
+        token_key = self._token_key(session_token)
+        # HSET on a missing key would recreate it without a TTL, so only touch live sessions.
+        if await self.client.execute('EXISTS', token_key):
+            await self.client.transaction(self._twofactor_commands(session_token, state))
+
+    async def delete(self, session_token: str) -> None:
+        token_key = self._token_key(session_token)
+        user_uuid = await self.client.execute('HGET', token_key, 'uuid')
+        if user_uuid is None:
+            return
+        await self.client.transaction(self._delete_commands(session_token, user_uuid.decode()))
+
+    async def apply(self, mutations: list[tuple]) -> None:
+        """
+        Applies several mutations, in order, in a single MULTI/EXEC.
+
+        The owners of deleted sessions and the liveness of sessions whose two-factor state
+        changes are looked up first, in one pipelined round trip, unless the session was
+        added earlier in the same batch.
+
+        Args:
+            mutations (list[tuple]): The mutations to apply, see `SessionBackend.apply`.
+
+        Returns:
+            None
+        """
+        added = {args[0] for method, *args in mutations if method == 'add'}
+        lookups = list({
+            args[0] for method, *args in mutations
+            if method in ('delete', 'set_twofactor_state') and args[0] not in added
+        })
+        replies = await self.client.pipeline([('HGET', self._token_key(token), 'uuid') for token in lookups])
+        owners = {token: owner.decode() for token, owner in zip(lookups, replies) if owner is not None}
+
+        commands = []
+        for method, *args in mutations:
+            if method == 'add':
+                owners[args[0]] = args[1]
+                commands.extend(self._add_commands(*args))
+            elif method == 'set_twofactor_state':
+                # HSET on a missing key would recreate it without a TTL, so only touch live sessions.
+                if args[0] in owners:
+                    commands.extend(self._twofactor_commands(*args))
+            elif method == 'delete':
+                owner = owners.pop(args[0], None)
+                if owner is not None:
+                    commands.extend(self._delete_commands(args[0], owner))
+            elif method == 'revoke':
+                commands.extend(self._revoke_commands(*args))
+            else:
+                raise ValueError(f"Unknown session mutation '{method}'.")
+        if commands:
+            await self.client.transaction(commands)
+
+    async def touch(self, activity: list[tuple[str, float, str, float|None]]) -> None:
+        """
+        Records when and from where sessions were last seen, in two round trips.
+
+        The owner and expiry of every session are read in one pipeline, then every live
+        session is updated in one MULTI/EXEC. An extended expiry also moves the session's
+        native TTL and its entry in the expiry index.
+
+        Args:
+            activity (list[tuple]): Tuples of session token, last seen time, last IP and new expiry.
+
+        Returns:
+            None
+        """
+        replies = await self.client.pipeline([
+            ('HMGET', self._token_key(session_token), 'uuid', 'expiry') for session_token, *_ in activity
+        ])
+        commands = []
+        for (session_token, last_seen_at, last_ip, expiry), (user_uuid, stored_expiry) in zip(activity, replies):
+            if user_uuid is None:
+                continue
+            token_key = self._token_key(session_token)
+            commands.append(('HSET', token_key, 'last_seen_at', last_seen_at, 'last_ip', last_ip))
+            if expiry is not None and expiry > float(stored_expiry):
+                commands.extend([
+                    ('HSET', token_key, 'expiry', expiry),
+                    ('EXPIREAT', token_key, int(expiry) + 1),
+                    ('ZADD', f'{self.prefix}expiry', expiry, f'{user_uuid.decode()}:{session_token}'),
+                ])
+        if commands:
+            await self.client.transaction(commands)
+
+    async def user_sessions(self, user_uuid: str) -> list[tuple]:
+        tokens = [token.decode() for token in await self.client.execute('SMEMBERS', self._user_key(user_uuid))]
+        replies = await self.client.pipeline([
+            ('HMGET', self._token_key(token), 'creation_ip', 'expiry', 'created_at', 'last_seen_at', 'last_ip')
+            for token in tokens
+        ])
+        return [
+            (
+                token, creation_ip.decode(), float(expiry), int(created_at),
+                float(last_seen_at) if last_seen_at is not None else None,
+                last_ip.decode() if last_ip is not None else None
+            )
+            for token, (creation_ip, expiry, created_at, last_seen_at, last_ip) in zip(tokens, replies)
+            if expiry is not None
+        ]
+
+    async def all_users(self) -> list[str]:
+        start = len(self._user_key(''))
+        return [key.decode()[start:] for key in await self.client.scan(self._user_key('*'))]
+
+    async def expiring_before(self, timestamp: float) -> list[tuple[str, str, float]]:
+        reply = await self.client.execute('ZRANGEBYSCORE', f'{self.prefix}expiry', '-inf', timestamp, 'WITHSCORES')
+        sessions = []
+        for member, expiry in zip(reply[::2], reply[1::2]):
+            user_uuid, session_token = member.decode().split(':', 1)
+            sessions.append((session_token, user_uuid, float(expiry)))
+        return sessions
+
+    async def revoke(self, session_token: str, expiry: float) -> None:
+        await self.client.transaction(self._revoke_commands(session_token, expiry))
+
+    async def revocations_since(self, since: float) -> list[tuple[str, float]]:
+        members = await self.client.execute('ZRANGEBYSCORE', f'{self.prefix}revoked', f'({since}', '+inf')
+        revocations = []
+        for member in members:
+            expiry, session_token = member.decode().split(':', 1)
+            revocations.append((session_token, float(expiry)))
+        return revocations
+
+    async def changes_since(self, since: float) -> list[str]:
+        members = await self.client.execute('ZRANGEBYSCORE', f'{self.prefix}changes', f'({since}', '+inf')
+        return [member.decode() for member in members]
+
+    async def cleanup(self, now: float) -> int:
+        """
+        Removes every session, and every revocation, that expired at or before the given time,
+        and every change older than `CHANGE_RETENTION` seconds.
+
+        The session hashes are already gone through their native TTL - this removes what
+        is left of them in the per-user sets and the expiry index, one batch per round trip.
+
+        Args:
+            now (float): The Unix timestamp to compare expiries against.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        await self.client.execute('ZREMRANGEBYSCORE', f'{self.prefix}changes', '-inf', now - self.CHANGE_RETENTION)
+        revoked = await self.client.execute('ZRANGEBYSCORE', f'{self.prefix}revoked:expiry', '-inf', now)
+        if revoked:
+            await self.client.transaction([
+                ('ZREM', f'{self.prefix}revoked', *revoked),
+                ('ZREM', f'{self.prefix}revoked:expiry', *revoked),
+            ])
+        removed = 0
+        while True:
+            members = await self.client.execute(
+                'ZRANGEBYSCORE', f'{self.prefix}expiry', '-inf', now, 'LIMIT', 0, self.cleanup_batch_size
+            )
+            if not members:
+                return removed
+            commands = []
+            for member in members:
+                user_uuid, session_token = member.decode().split(':', 1)
+                commands.append(('DEL', self._token_key(session_token)))
+                commands.append(('SREM', self._user_key(user_uuid), session_token))
+            commands.append(('ZREM', f'{self.prefix}expiry', *members))
+            await self.client.pipeline(commands)
+            removed += len(members)
+            if len(members) < self.cleanup_batch_size:
+                return removed
+
+    async def clear(self) -> None:
+        keys = await self.client.scan(f'{self.prefix}*')
+        for index in range(0, len(keys), 1000):
+            await self.client.execute('DEL', *keys[index:index + 1000])
+
+
+def _stream_id(entry_id) -> tuple[int, int]:
+    """
+    Splits a stream entry ID into its millisecond time and sequence number, for comparing.
+
+    Args:
+        entry_id (bytes|str): The entry ID, e.g. b'1700000000000-0'.
+
+    Returns:
+        tuple[int, int]: The time and sequence number.
+    """
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    milliseconds, _, sequence = entry_id.partition('-')
+    return int(milliseconds), int(sequence or 0)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Stores cached users on a Redis-protocol server, one string key per user.
+
+    The change log is a stream: every change appends the user in the same MULTI as the
+    change itself, so the server orders the entries, and the stream is trimmed to about
+    `change_log_length` entries. Versions are stream entry IDs.
+
+    When each user was stored and last read is indexed in two sorted sets, and the size of
+    their data in a hash, for `prune`.
+    """
+
+    # Users removed per MULTI by `prune`.
+    prune_batch_size = 1000
+
+    def __init__(self, client: RespClient, key_prefix: str = '', change_log_length: int = 100000):
+        """
+        Initializes the backend.
+
+        Args:
+            client (RespClient): The client used to reach the server.
+            key_prefix (str): Prefix added to every key, to share a server between deployments.
+            change_log_length (int): The number of changes kept in the change log.
+        """
+        self.client = client
+        self.prefix = f'{key_prefix}cache:'
+        # Outside the `cache:` prefix, so `clear` leaves the change log in place.
+        self.changes_key = f'{key_prefix}cache-changes'
+        self.stored_key = f'{key_prefix}cache-stored'
+        self.accessed_key = f'{key_prefix}cache-accessed'
+        self.sizes_key = f'{key_prefix}cache-sizes'
+        self.change_log_length = change_log_length
+
+    def _change_command(self, user_identifier: str) -> tuple:
+        return ('XADD', self.changes_key, 'MAXLEN', '~', self.change_log_length, '*', 'user', user_identifier)
+
+    def _index_commands(self, users: list[tuple[str, bytes]]) -> list[tuple]:
+        now = time.time()
+        scores = [part for user_identifier, _ in users for part in (now, user_identifier)]
+        return [
+            ('ZADD', self.stored_key, *scores),
+            ('ZADD', self.accessed_key, *scores),
+            ('HSET', self.sizes_key, *(part for user_identifier, data in users for part in (user_identifier, len(data)))),
+        ]
+
+    def _remove_commands(self, user_identifiers: list[str]) -> list[tuple]:
+        return [
+            ('DEL', *(f'{self.prefix}{user_identifier}' for user_identifier in user_identifiers)),
+            ('ZREM', self.stored_key, *user_identifiers),
+            ('ZREM', self.accessed_key, *user_identifiers),
+            ('HDEL', self.sizes_key, *user_identifiers),
+        ]
+
+    async def open(self) -> None:
+        await self.client.connect()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def get(self, user_identifier: str) -> bytes|None:
+        return await self.client.execute('GET', f'{self.prefix}{user_identifier}')
+
+    async def set(self, user_identifier: str, data: bytes) -> None:
+        await self.client.transaction([
+            ('SET', f'{self.prefix}{user_identifier}', data),
+            *self._index_commands([(user_identifier, data)]),
+            self._change_command(user_identifier),
+        ])
+
+    async def add(self, user_identifier: str, data: bytes) -> bool:
+        return await self.add_many([(user_identifier, data)]) == 1
+
+    async def add_many(self, users: list[tuple[str, bytes]]) -> int:
+        replies = await self.client.pipeline([
+            ('SET', f'{self.prefix}{user_identifier}', data, 'NX') for user_identifier, data in users
+        ])
+        added = [user for user, reply in zip(users, replies) if reply is not None]
+        if added:
+            await self.client.pipeline(self._index_commands(added))
+        return len(added)
+
+    async def delete(self, user_identifier: str) -> None:
+        await self.client.transaction([
+            *self._remove_commands([user_identifier]),
+            self._change_command(user_identifier),
+        ])
+
+    async def clear(self) -> None:
+        keys = await self.client.scan(f'{self.prefix}*')
+        for index in range(0, len(keys), 1000):
+            await self.client.execute('DEL', *keys[index:index + 1000])
+        await self.client.pipeline([
+            ('DEL', self.stored_key, self.accessed_key, self.sizes_key),
+            self._change_command(self.EVERYTHING),
+        ])
+
+    async def version(self) -> str:
+        entries = await self.client.execute('XREVRANGE', self.changes_key, '+', '-', 'COUNT', 1)
+        return entries[0][0].decode() if entries else '0-0'
+
+    async def changes_since(self, version: str, limit: int = 1000) -> tuple[str, list[str]]:
+        oldest, read = await self.client.pipeline([
+            ('XRANGE', self.changes_key, '-', '+', 'COUNT', 1),
+            ('XREAD', 'COUNT', limit + 1, 'STREAMS', self.changes_key, version),
+        ])
+        if not read:
+            return version, []
+        entries = read[0][1]
+        latest = entries[-1][0].decode()
+        # The entry at `version` has been trimmed, so changes after it may have been too.
+        if version != '0-0' and _stream_id(oldest[0][0]) > _stream_id(version):
+            return latest, [self.EVERYTHING]
+        changed = [fields[1].decode() for _, fields in entries]
+        if self.EVERYTHING in changed or len(entries) > limit:
+            return await self.version(), [self.EVERYTHING]
+        return latest, changed
+
+    async def touch(self, user_identifiers: list[str], now: float) -> None:
+        if user_identifiers:
+            await self.client.execute(
+                'ZADD', self.accessed_key, 'XX',
+                *(part for user_identifier in user_identifiers for part in (now, user_identifier))
+            )
+
+    async def prune(self, stored_before: float|None, max_entries: int|None, max_bytes: int|None) -> int:
+        """
+        Removes users stored too long ago, then the least recently read users until the
+        cache is within its limits.
+
+        Users are removed in batches of `prune_batch_size`, one MULTI per batch. Checking
+        `max_bytes` reads every size - O(n) in the number of cached users.
+
+        Args:
+            stored_before (float|None): Remove users stored at or before this Unix timestamp, if set.
+            max_entries (int|None): The most users to keep, if set.
+            max_bytes (int|None): The most bytes of data to keep, if set.
+
+        Returns:
+            int: The number of users removed.
+        """
+        removed = 0
+        while stored_before is not None:
+            stale = await self.client.execute(
+                'ZRANGEBYSCORE', self.stored_key, '-inf', stored_before, 'LIMIT', 0, self.prune_batch_size
+            )
+            if not stale:
+                break
+            await self.client.transaction(self._remove_commands([member.decode() for member in stale]))
+            removed += len(stale)
+
+        while True:
+            if max_bytes is None:
+                entries, size = await self.client.execute('ZCARD', self.accessed_key), 0
+            else:
+                entries, size = await self.stats()
+            excess = 0
+            if max_entries is not None:
+                excess = entries - max_entries
+            if max_bytes is not None and size > max_bytes:
+                # Enough of the average entry to cover the excess bytes, checked again after.
+                excess = max(excess, -(-(size - max_bytes) * entries // size))
+            if excess <= 0:
+                return removed
+            least_recent = await self.client.execute(
+                'ZRANGE', self.accessed_key, 0, min(excess, self.prune_batch_size) - 1
+            )
+            if not least_recent:
+                return removed
+            await self.client.transaction(self._remove_commands([member.decode() for member in least_recent]))
+            removed += len(least_recent)
+
+    async def stats(self) -> tuple[int, int]:
+        entries, sizes = await self.client.pipeline([
+            ('ZCARD', self.accessed_key),
+            ('HVALS', self.sizes_key),
+        ])
+        return entries, sum(int(size) for size in sizes)
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Counts requests on a Redis-protocol server.
+
+    Layout, below the configured key prefix:
+        ratelimit:<window>:<key> - the count of requests in the window (expires natively)
+
+    Every hit is one MULTI/EXEC round trip, however many keys it counts against.
+    """
+
+    def __init__(self, client: RespClient, key_prefix: str = ''):
+        """
+        Initializes the backend.
+
+        Args:
+            client (RespClient): The client used to reach the server.
+            key_prefix (str): Prefix added to every key, to share a server between deployments.
+        """
+        self.client = client
+        self.prefix = f'{key_prefix}ratelimit:'
+
+    async def open(self) -> None:
+        await self.client.connect()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def hit(self, keys: list[str], window: int, expires_at: float) -> list[tuple[int, int]]:
+        commands = []
+        for key in keys:
+            counter_key = f'{self.prefix}{window}:{key}'
+            commands.append(('INCR', counter_key))
+            commands.append(('PEXPIREAT', counter_key, int(expires_at * 1000)))
+            commands.append(('GET', f'{self.prefix}{window - 1}:{key}'))
+        replies = await self.client.transaction(commands)
+        return [
+            (int(replies[index + 2] or 0), replies[index])
+            for index in range(0, len(replies), 3)
+        ]
+
+    async def cleanup(self, now: float) -> int:
+        # Counters expire natively.
+        return 0
+
+    async def clear(self) -> None:
+        keys = await self.client.scan(f'{self.prefix}*')
+        for index in range(0, len(keys), 1000):
+            await self.client.execute('DEL', *keys[index:index + 1000])
@@ -0,0 +1,252 @@
+"""
+This module provides a minimal asyncio client for the Redis serialization protocol (RESP).
+
+Only what the storage backends need is implemented: pooled connections, pipelined
+commands and MULTI/EXEC transactions. It works with Redis, Valkey, KeyDB and any
+other server speaking RESP2.
+"""
+import asyncio
+import contextlib
+
+
+class RespError(Exception):
+    """
+    An error reply sent by the server.
+    """
+
+
+def encode_command(args) -> bytes:
+    """
+    Encodes a command as a RESP array of bulk strings.
+
+    Args:
+        args: The command name followed by its arguments.
+
+    Returns:
+        bytes: The encoded command.
+    """
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode('utf-8')
+        else:
+            data = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """
+    Reads a single reply from the server.
+
+    Error replies are returned, not raised, so one failing command does not hide the
+    replies to the rest of a pipeline. Simple and bulk strings are both returned as
+    bytes, so callers never have to care which one a server chose to send.
+
+    Args:
+        reader (asyncio.StreamReader): The connection to read from.
+
+    Returns:
+        The decoded reply.
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the server.")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload
+    if kind == b'-':
+        return RespError(payload.decode('utf-8'))
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length == -1:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b'*':
+        length = int(payload)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply type {kind!r} from the server.")
+
+
+class RespClient:
+    """
+    A pooled RESP client.
+
+    Attributes:
+        host (str): The server host.
+        port (int): The server port.
+        db (int): The database number selected on every connection.
+        password (str|None): The password sent with AUTH, if any.
+        pool_size (int): The number of connections kept open.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, password: str = None, pool_size: int = 4):
+        """
+        Initializes the client. No connection is made until `connect` is awaited.
+
+        Args:
+            host (str): The server host.
+            port (int): The server port.
+            db (int): The database number to select.
+            password (str, optional): The password sent with AUTH. Defaults to None.
+            pool_size (int): The number of connections kept open.
+        """
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.pool_size = max(1, pool_size)
+        self._pool = None
+
+    async def connect(self) -> None:
+        """
+        Opens every pooled connection.
+
+        Returns:
+            None
+        """
+        self._pool = asyncio.Queue()
+        for _ in range(self.pool_size):
+            self._pool.put_nowait(await self._open_connection())
+
+    async def close(self) -> None:
+        """
+        Closes every pooled connection.
+
+        Returns:
+            None
+        """
+        if self._pool is None:
+            return
+        while not self._pool.empty():
+            connection = self._pool.get_nowait()
+            if connection is not None:
+                connection[1].close()
+                with contextlib.suppress(Exception):
+                    await connection[1].wait_closed()
+        self._pool = None
+
+    async def _open_connection(self):
+        """
+        Opens, authenticates and selects the database on a new connection.
+
+        Returns:
+            tuple: The stream reader and writer of the connection.
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            writer.write(b''.join(encode_command(command) for command in setup))
+            await writer.drain()
+            for _ in setup:
+                reply = await read_reply(reader)
+                if isinstance(reply, RespError):
+                    writer.close()
+                    raise reply
+        return reader, writer
+
+    @contextlib.asynccontextmanager
+    async def _connection(self):
+        """
+        Borrows a connection from the pool, reopening it if it was dropped.
+
+        A connection that fails mid-command is discarded, since its replies can no
+        longer be matched up with the commands sent on it.
+        """
+        connection = await self._pool.get()
+        try:
+            if connection is None:
+                connection = await self._open_connection()
+            yield connection
+        except BaseException:
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            raise
+        finally:
+            self._pool.put_nowait(connection)
+
+    async def pipeline(self, commands: list, raise_on_error: bool = True) -> list:
+        """
+        Sends several commands in one write and reads all of their replies.
+
+        Args:
+            commands (list): The commands to send, each a sequence of the command name and its arguments.
+            raise_on_error (bool): Raise the first error reply instead of returning it.
+
+        Returns:
+            list: The reply to each command, in order.
+
+        Raises:
+            RespError: If a command failed and `raise_on_error` is set.
+        """
+        if not commands:
+            return []
+        async with self._connection() as (reader, writer):
+            writer.write(b''.join(encode_command(command) for command in commands))
+            await writer.drain()
+            replies = [await read_reply(reader) for _ in commands]
+        if raise_on_error:
+            for reply in replies:
+                if isinstance(reply, RespError):
+                    raise reply
+        return replies
+
+    async def transaction(self, commands: list) -> list:
+        """
+        Runs several commands atomically inside MULTI/EXEC, sent as a single pipeline.
+
+        Args:
+            commands (list): The commands to run.
+
+        Returns:
+            list: The reply to each command, in order.
+
+        Raises:
+            RespError: If a command failed - the others were still applied, as MULTI/EXEC does not roll back.
+        """
+        replies = await self.pipeline([('MULTI',), *commands, ('EXEC',)])
+        for reply in replies[-1]:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies[-1]
+
+    async def execute(self, *args):
+        """
+        Sends a single command.
+
+        Args:
+            *args: The command name followed by its arguments.
+
+        Returns:
+            The reply to the command.
+        """
+        return (await self.pipeline([args]))[0]
+
+    async def scan(self, pattern: str) -> list[bytes]:
+        """
+        Returns every key matching a pattern, walking the keyspace with SCAN.
+
+        Args:
+            pattern (str): The glob-style pattern to match.
+
+        Returns:
+            list[bytes]: The matching keys.
+        """
+        cursor = b'0'
+        keys = []
+        while True:
+            cursor, batch = await self.execute('SCAN', cursor, 'MATCH', pattern, 'COUNT', 1000)
+            keys.extend(batch)
+            if cursor == b'0':
+                return keys
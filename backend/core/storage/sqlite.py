@@ -0,0 +1,652 @@
+"""
+This module provides the SQLite storage backends, built on long-lived aiosqlite connections.
+"""
+import asyncio
+import contextlib
+import time
+import uuid
+import aiosqlite
+# pylint: disable=import-error
+from core.storage.base import CacheBackend, RateLimitBackend, SessionBackend, SessionRecord
+
+# Statements are kept as module constants so every call hands sqlite the exact same
+# string, letting each long-lived connection reuse its cached prepared statement.
+CREATE_SESSIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS Sessions (
+        session_token TEXT PRIMARY KEY,
+        uuid TEXT,
+        creation_ip TEXT,
+        expiry INTEGER,
+        authenticating_currently_using_two_factor_authentication BOOLEAN DEFAULT FALSE,
+        created_at INTEGER DEFAULT (strftime('%s', 'now'))
+    )
+'''
+# Schema migrations, applied in order. `PRAGMA user_version` records how many have run,
+# so a migration is only ever applied once per database file - append, never edit.
+SESSION_MIGRATIONS = [
+    [CREATE_SESSIONS_TABLE],
+    [
+        'CREATE INDEX IF NOT EXISTS Sessions_uuid ON Sessions (uuid)',
+        'CREATE INDEX IF NOT EXISTS Sessions_expiry ON Sessions (expiry)',
+    ],
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS Revocations (
+                session_token TEXT PRIMARY KEY,
+                expiry INTEGER,
+                revoked_at REAL
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS Revocations_revoked_at ON Revocations (revoked_at)',
+        'CREATE INDEX IF NOT EXISTS Revocations_expiry ON Revocations (expiry)',
+    ],
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS SessionCounts (
+                uuid TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            )
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Sessions_count_insert AFTER INSERT ON Sessions BEGIN
+                INSERT INTO SessionCounts (uuid, count) VALUES (NEW.uuid, 1)
+                    ON CONFLICT (uuid) DO UPDATE SET count = count + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Sessions_count_delete AFTER DELETE ON Sessions BEGIN
+                UPDATE SessionCounts SET count = count - 1 WHERE uuid = OLD.uuid;
+                DELETE FROM SessionCounts WHERE uuid = OLD.uuid AND count <= 0;
+            END
+        ''',
+        'DELETE FROM SessionCounts',
+        'INSERT INTO SessionCounts (uuid, count) SELECT uuid, COUNT(*) FROM Sessions GROUP BY uuid',
+    ],
+    [
+        'ALTER TABLE Sessions ADD COLUMN last_seen_at REAL',
+        'ALTER TABLE Sessions ADD COLUMN last_ip TEXT',
+    ],
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS SessionChanges (
+                session_token TEXT PRIMARY KEY,
+                changed_at REAL
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS SessionChanges_changed_at ON SessionChanges (changed_at)',
+    ],
+]
+UPDATE_TWOFACTOR_STATE = 'UPDATE Sessions SET authenticating_currently_using_two_factor_authentication = ? WHERE session_token = ?'
+SELECT_ALL_USERS = 'SELECT uuid FROM SessionCounts'
+SELECT_COUNT = 'SELECT count FROM SessionCounts WHERE uuid = ?'
+DELETE_EXPIRED_BATCH = (
+    'DELETE FROM Sessions WHERE rowid IN '
+    '(SELECT rowid FROM Sessions WHERE expiry <= ? LIMIT ?)'
+)
+INSERT_SESSION = (
+    'INSERT OR REPLACE INTO Sessions (session_token, uuid, creation_ip, expiry) '
+    'VALUES (?, ?, ?, ?)'
+)
+INSERT_SESSION_LIMITED = (
+    'INSERT INTO Sessions (session_token, uuid, creation_ip, expiry, authenticating_currently_using_two_factor_authentication) '
+    'SELECT ?, ?, ?, ?, ? WHERE COALESCE((SELECT count FROM SessionCounts WHERE uuid = ?), 0) < ?'
+)
+SELECT_RECORD = (
+    'SELECT uuid, expiry, authenticating_currently_using_two_factor_authentication '
+    'FROM Sessions WHERE session_token = ?'
+)
+SELECT_EXPIRING = 'SELECT session_token, uuid, expiry FROM Sessions WHERE expiry <= ?'
+SELECT_USER_SESSIONS = (
+    'SELECT session_token, creation_ip, expiry, created_at, last_seen_at, last_ip '
+    'FROM Sessions WHERE uuid = ?'
+)
+UPDATE_ACTIVITY = (
+    'UPDATE Sessions SET last_seen_at = ?, last_ip = ?, expiry = MAX(expiry, COALESCE(?, expiry)) '
+    'WHERE session_token = ?'
+)
+DELETE_SESSION = 'DELETE FROM Sessions WHERE session_token = ?'
+DELETE_ALL_SESSIONS = 'DELETE FROM Sessions'
+INSERT_REVOCATION = 'INSERT OR REPLACE INTO Revocations (session_token, expiry, revoked_at) VALUES (?, ?, ?)'
+SELECT_REVOCATIONS_SINCE = 'SELECT session_token, expiry FROM Revocations WHERE revoked_at > ?'
+DELETE_EXPIRED_REVOCATIONS = 'DELETE FROM Revocations WHERE expiry <= ?'
+DELETE_ALL_REVOCATIONS = 'DELETE FROM Revocations'
+INSERT_SESSION_CHANGE = 'INSERT OR REPLACE INTO SessionChanges (session_token, changed_at) VALUES (?, ?)'
+SELECT_SESSION_CHANGES_SINCE = 'SELECT session_token FROM SessionChanges WHERE changed_at > ?'
+DELETE_OLD_SESSION_CHANGES = 'DELETE FROM SessionChanges WHERE changed_at <= ?'
+DELETE_ALL_SESSION_CHANGES = 'DELETE FROM SessionChanges'
+
+CACHE_MIGRATIONS = [
+    ['''
+        CREATE TABLE IF NOT EXISTS Sessions (
+            user_identifier TEXT PRIMARY KEY,
+            data BLOB,
+            cached_at INTEGER DEFAULT (strftime('%s', 'now'))
+        )
+    '''],
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS CacheVersions (
+                user_identifier TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS CacheVersions_version ON CacheVersions (version)',
+    ],
+    [
+        'ALTER TABLE Sessions ADD COLUMN accessed_at REAL',
+        'ALTER TABLE Sessions ADD COLUMN size INTEGER NOT NULL DEFAULT 0',
+        'UPDATE Sessions SET accessed_at = cached_at, size = length(data)',
+        'CREATE INDEX IF NOT EXISTS Sessions_cached_at ON Sessions (cached_at)',
+        'CREATE INDEX IF NOT EXISTS Sessions_accessed_at ON Sessions (accessed_at)',
+        '''
+            CREATE TABLE IF NOT EXISTS CacheTotals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            )
+        ''',
+        'INSERT OR REPLACE INTO CacheTotals (id, entries, bytes) SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM Sessions',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Sessions_totals_insert AFTER INSERT ON Sessions BEGIN
+                UPDATE CacheTotals SET entries = entries + 1, bytes = bytes + NEW.size;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Sessions_totals_delete AFTER DELETE ON Sessions BEGIN
+                UPDATE CacheTotals SET entries = entries - 1, bytes = bytes - OLD.size;
+            END
+        ''',
+    ],
+]
+SELECT_CACHED = 'SELECT data FROM Sessions WHERE user_identifier = ?'
+INSERT_CACHED = 'INSERT OR REPLACE INTO Sessions (user_identifier, data, size, accessed_at) VALUES (?, ?, ?, ?)'
+INSERT_CACHED_IF_ABSENT = 'INSERT OR IGNORE INTO Sessions (user_identifier, data, size, accessed_at) VALUES (?, ?, ?, ?)'
+TOUCH_CACHED = 'UPDATE Sessions SET accessed_at = ? WHERE user_identifier = ?'
+SELECT_CACHE_TOTALS = 'SELECT entries, bytes FROM CacheTotals'
+DELETE_STALE_CACHED_BATCH = (
+    'DELETE FROM Sessions WHERE rowid IN '
+    '(SELECT rowid FROM Sessions WHERE cached_at <= ? LIMIT ?)'
+)
+DELETE_LEAST_RECENTLY_USED = (
+    'DELETE FROM Sessions WHERE rowid IN '
+    '(SELECT rowid FROM Sessions ORDER BY accessed_at LIMIT ?)'
+)
+DELETE_CACHED = 'DELETE FROM Sessions WHERE user_identifier = ?'
+DELETE_ALL_CACHED = 'DELETE FROM Sessions'
+# Every change takes the next version, read and written inside the write transaction, so
+# versions are unique and increasing across every process sharing the file.
+INSERT_CACHE_VERSION = (
+    'INSERT OR REPLACE INTO CacheVersions (user_identifier, version) '
+    'SELECT ?, COALESCE(MAX(version), 0) + 1 FROM CacheVersions'
+)
+SELECT_CACHE_VERSION = 'SELECT COALESCE(MAX(version), 0) FROM CacheVersions'
+SELECT_CACHE_CHANGES = (
+    'SELECT user_identifier, version FROM CacheVersions WHERE version > ? ORDER BY version LIMIT ?'
+)
+DELETE_OTHER_CACHE_VERSIONS = 'DELETE FROM CacheVersions WHERE user_identifier != ?'
+
+RATE_LIMIT_MIGRATIONS = [
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS RateLimits (
+                key TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (key, window)
+            ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS RateLimits_expires_at ON RateLimits (expires_at)',
+    ],
+]
+INCREMENT_RATE_LIMIT = (
+    'INSERT INTO RateLimits (key, window, count, expires_at) VALUES (?, ?, 1, ?) '
+    'ON CONFLICT (key, window) DO UPDATE SET count = count + 1 RETURNING count'
+)
+SELECT_RATE_LIMIT = 'SELECT count FROM RateLimits WHERE key = ? AND window = ?'
+DELETE_EXPIRED_RATE_LIMITS = 'DELETE FROM RateLimits WHERE expires_at <= ?'
+DELETE_ALL_RATE_LIMITS = 'DELETE FROM RateLimits'
+
+
+class SQLiteStore:
+    """
+    A SQLite database file shared through one writer connection and a pool of readers.
+
+    Every connection is opened once in `open` and kept until `close`. The database runs
+    in WAL mode so readers never block behind the writer.
+    """
+
+    migrations = []
+
+    def __init__(self, db_path: str, reader_connections: int = 4):
+        """
+        Initializes the store.
+
+        Args:
+            db_path (str): The path to the database file.
+            reader_connections (int): The number of pooled read-only connections.
+        """
+        self.db_path = db_path
+        self.reader_connections = max(1, reader_connections)
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = None
+
+    async def open(self) -> None:
+        """
+        Opens the pooled connections and brings the schema up to date.
+
+        Returns:
+            None
+        """
+        self._writer = await self._connect()
+        await self._migrate()
+
+        self._readers = asyncio.Queue()
+        for _ in range(self.reader_connections):
+            self._readers.put_nowait(await self._connect())
+
+    async def close(self) -> None:
+        """
+        Closes the writer and every pooled reader connection.
+
+        Returns:
+            None
+        """
+        if self._readers is not None:
+            while not self._readers.empty():
+                await self._readers.get_nowait().close()
+            self._readers = None
+        if self._writer is not None:
+            async with self._write_lock:
+                await self._writer.close()
+            self._writer = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """
+        Opens a long-lived connection to the database.
+
+        Returns:
+            aiosqlite.Connection: The configured connection.
+        """
+        db = await aiosqlite.connect(self.db_path)
+        await db.execute('PRAGMA journal_mode=WAL')
+        await db.execute('PRAGMA synchronous=NORMAL')
+        await db.execute('PRAGMA busy_timeout=5000')
+        # Lets rows removed by INSERT OR REPLACE fire delete triggers, keeping SessionCounts exact.
+        await db.execute('PRAGMA recursive_triggers=ON')
+        return db
+
+    async def _migrate(self) -> None:
+        """
+        Applies every schema migration the database has not seen yet.
+
+        The version is read inside a `BEGIN IMMEDIATE` transaction, which holds the write lock
+        until the migrations are committed, so workers opening the file at the same time
+        apply each migration exactly once.
+
+        Returns:
+            None
+        """
+        async with self._transaction() as db:
+            await db.execute('BEGIN IMMEDIATE')
+            async with db.execute('PRAGMA user_version') as cursor:
+                version = (await cursor.fetchone())[0]
+            for number, statements in enumerate(self.migrations[version:], start=version + 1):
+                for statement in statements:
+                    await db.execute(statement)
+                await db.execute(f'PRAGMA user_version = {number}')
+
+    @contextlib.asynccontextmanager
+    async def _reader(self):
+        """
+        Borrows a connection from the reader pool for the duration of the block.
+        """
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @contextlib.asynccontextmanager
+    async def _transaction(self):
+        """
+        Runs the block on the writer connection and commits it, rolling back on error.
+        """
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+
+class SQLiteSessionBackend(SQLiteStore, SessionBackend):
+    """
+    Stores sessions in the 'Sessions' table of a SQLite database file.
+
+    The changes listed by `changes_since` are the 'SessionChanges' table, holding the time
+    each session was last changed at - one row per session.
+    """
+
+    migrations = SESSION_MIGRATIONS
+
+    def __init__(self, db_path: str, reader_connections: int = 4, cleanup_batch_size: int = 1000):
+        """
+        Initializes the backend.
+
+        Args:
+            db_path (str): The path to the database file.
+            reader_connections (int): The number of pooled read-only connections.
+            cleanup_batch_size (int): The maximum number of expired sessions deleted per transaction.
+        """
+        super().__init__(db_path, reader_connections)
+        self.cleanup_batch_size = max(1, cleanup_batch_size)
+
+    async def add(self, session_token: str, user_uuid: str, creation_ip: str, expiry: float) -> None:
+        async with self._transaction() as db:
+            await db.execute(INSERT_SESSION, (session_token, user_uuid, creation_ip, expiry))
+
+    async def add_limited(
+        self, session_token: str, user_uuid: str, creation_ip: str, expiry: float, limit: int, two_factor_pending: bool = False
+    ) -> int|None:
+        """
+        Stores a new session only if the user has fewer than `limit` sessions.
+
+        The check and the insert are a single statement on the writer connection, against
+        the trigger-maintained SessionCounts table, so it is atomic across every process.
+
+        Args:
+            session_token (str): The session token.
+            user_uuid (str): The hex UUID of the user.
+            creation_ip (str): The IP address where the session was created.
+            expiry (float): The Unix timestamp indicating the session expiry.
+            limit (int): The maximum number of sessions the user may have.
+            two_factor_pending (bool): Whether the session has to confirm two-factor authentication.
+
+        Returns:
+            int|None: The number of sessions of the user including the new one, or None if the limit was reached.
+        """
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                INSERT_SESSION_LIMITED, (session_token, user_uuid, creation_ip, expiry, two_factor_pending, user_uuid, limit)
+            )
+            if cursor.rowcount == 0:
+                return None
+            async with db.execute(SELECT_COUNT, (user_uuid,)) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def count(self, user_uuid: str) -> int:
+        async with self._reader() as db:
+            async with db.execute(SELECT_COUNT, (user_uuid,)) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row is not None else 0
+
+    async def fetch(self, session_token: str) -> SessionRecord|None:
+        async with self._reader() as db:
+            async with db.execute(SELECT_RECORD, (session_token,)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return SessionRecord(uuid.UUID(row[0]), row[1], row[2] == 1)
+
+    async def set_twofactor_state(self, session_token: str, state: bool) -> None:
+        async with self._transaction() as db:
+            cursor = await db.execute(UPDATE_TWOFACTOR_STATE, (state, session_token))
+            if cursor.rowcount:
+                await db.execute(INSERT_SESSION_CHANGE, (session_token, time.time()))
+
+    async def delete(self, session_token: str) -> None:
+        async with self._transaction() as db:
+            cursor = await db.execute(DELETE_SESSION, (session_token,))
+            if cursor.rowcount:
+                await db.execute(INSERT_SESSION_CHANGE, (session_token, time.time()))
+
+    async def apply(self, mutations: list[tuple]) -> None:
+        """
+        Applies several mutations, in order, in a single transaction.
+
+        Args:
+            mutations (list[tuple]): The mutations to apply, see `SessionBackend.apply`.
+
+        Returns:
+            None
+        """
+        changed_at = time.time()
+        async with self._transaction() as db:
+            for method, *args in mutations:
+                if method == 'add':
+                    await db.execute(INSERT_SESSION, args)
+                elif method == 'set_twofactor_state':
+                    cursor = await db.execute(UPDATE_TWOFACTOR_STATE, (args[1], args[0]))
+                    if cursor.rowcount:
+                        await db.execute(INSERT_SESSION_CHANGE, (args[0], changed_at))
+                elif method == 'delete':
+                    cursor = await db.execute(DELETE_SESSION, args)
+                    if cursor.rowcount:
+                        await db.execute(INSERT_SESSION_CHANGE, (args[0], changed_at))
+                elif method == 'revoke':
+                    await db.execute(INSERT_REVOCATION, (*args, changed_at))
+                else:
+                    raise ValueError(f"Unknown session mutation '{method}'.")
+
+    async def touch(self, activity: list[tuple[str, float, str, float|None]]) -> None:
+        async with self._transaction() as db:
+            await db.executemany(UPDATE_ACTIVITY, [
+                (last_seen_at, last_ip, expiry, session_token)
+                for session_token, last_seen_at, last_ip, expiry in activity
+            ])
+
+    async def user_sessions(self, user_uuid: str) -> list[tuple]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_USER_SESSIONS, (user_uuid,)) as cursor:
+                return await cursor.fetchall()
+
+    async def all_users(self) -> list[str]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_ALL_USERS) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def expiring_before(self, timestamp: float) -> list[tuple[str, str, float]]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_EXPIRING, (timestamp,)) as cursor:
+                return await cursor.fetchall()
+
+    async def revoke(self, session_token: str, expiry: float) -> None:
+        async with self._transaction() as db:
+            await db.execute(INSERT_REVOCATION, (session_token, expiry, time.time()))
+
+    async def revocations_since(self, since: float) -> list[tuple[str, float]]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_REVOCATIONS_SINCE, (since,)) as cursor:
+                return await cursor.fetchall()
+
+    async def changes_since(self, since: float) -> list[str]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_SESSION_CHANGES_SINCE, (since,)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def cleanup(self, now: float) -> int:
+        """
+        Removes every session, and every revocation, that expired at or before the given time,
+        and every change older than `CHANGE_RETENTION` seconds.
+
+        Expired rows are deleted in batches of `cleanup_batch_size`, each in its own short
+        transaction, so logins waiting on the writer are let in between batches.
+
+        Args:
+            now (float): The Unix timestamp to compare expiries against.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        async with self._transaction() as db:
+            await db.execute(DELETE_EXPIRED_REVOCATIONS, (now,))
+            await db.execute(DELETE_OLD_SESSION_CHANGES, (now - self.CHANGE_RETENTION,))
+        removed = 0
+        while True:
+            async with self._transaction() as db:
+                cursor = await db.execute(DELETE_EXPIRED_BATCH, (now, self.cleanup_batch_size))
+                deleted = cursor.rowcount
+            removed += deleted
+            if deleted < self.cleanup_batch_size:
+                return removed
+            await asyncio.sleep(0)
+
+    async def clear(self) -> None:
+        async with self._transaction() as db:
+            await db.execute(DELETE_ALL_SESSIONS)
+            await db.execute(DELETE_ALL_REVOCATIONS)
+            await db.execute(DELETE_ALL_SESSION_CHANGES)
+
+
+class SQLiteCacheBackend(SQLiteStore, CacheBackend):
+    """
+    Stores cached users in the 'Sessions' table of a SQLite database file.
+
+    The change log is the 'CacheVersions' table, holding the version each user was last
+    changed at - one row per user, so it never needs trimming. The number of rows and
+    their total size are kept in 'CacheTotals' by triggers, so reading them is free.
+    """
+
+    migrations = CACHE_MIGRATIONS
+    # Rows deleted per transaction by `prune`.
+    prune_batch_size = 1000
+
+    async def get(self, user_identifier: str) -> bytes|None:
+        async with self._reader() as db:
+            async with db.execute(SELECT_CACHED, (user_identifier,)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    async def set(self, user_identifier: str, data: bytes) -> None:
+        async with self._transaction() as db:
+            await db.execute(INSERT_CACHED, (user_identifier, data, len(data), time.time()))
+            await db.execute(INSERT_CACHE_VERSION, (user_identifier,))
+
+    async def add(self, user_identifier: str, data: bytes) -> bool:
+        async with self._transaction() as db:
+            cursor = await db.execute(INSERT_CACHED_IF_ABSENT, (user_identifier, data, len(data), time.time()))
+            return cursor.rowcount > 0
+
+    async def add_many(self, users: list[tuple[str, bytes]]) -> int:
+        async with self._transaction() as db:
+            now = time.time()
+            cursor = await db.executemany(
+                INSERT_CACHED_IF_ABSENT,
+                [(user_identifier, data, len(data), now) for user_identifier, data in users]
+            )
+            return cursor.rowcount
+
+    async def delete(self, user_identifier: str) -> None:
+        async with self._transaction() as db:
+            await db.execute(DELETE_CACHED, (user_identifier,))
+            await db.execute(INSERT_CACHE_VERSION, (user_identifier,))
+
+    async def clear(self) -> None:
+        async with self._transaction() as db:
+            await db.execute(DELETE_ALL_CACHED)
+            await db.execute(INSERT_CACHE_VERSION, (self.EVERYTHING,))
+            await db.execute(DELETE_OTHER_CACHE_VERSIONS, (self.EVERYTHING,))
+
+    async def version(self) -> int:
+        async with self._reader() as db:
+            async with db.execute(SELECT_CACHE_VERSION) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def changes_since(self, version: int, limit: int = 1000) -> tuple[int, list[str]]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_CACHE_CHANGES, (version, limit + 1)) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            return version, []
+        changed = [user_identifier for user_identifier, _ in rows]
+        if self.EVERYTHING in changed or len(rows) > limit:
+            return await self.version(), [self.EVERYTHING]
+        return rows[-1][1], changed
+
+    async def touch(self, user_identifiers: list[str], now: float) -> None:
+        if not user_identifiers:
+            return
+        async with self._transaction() as db:
+            await db.executemany(TOUCH_CACHED, [(now, user_identifier) for user_identifier in user_identifiers])
+
+    async def prune(self, stored_before: float|None, max_entries: int|None, max_bytes: int|None) -> int:
+        """
+        Removes users stored too long ago, then the least recently read users until the
+        cache is within its limits.
+
+        Rows are deleted in batches of `prune_batch_size`, each in its own short transaction.
+
+        Args:
+            stored_before (float|None): Remove users stored at or before this Unix timestamp, if set.
+            max_entries (int|None): The most users to keep, if set.
+            max_bytes (int|None): The most bytes of data to keep, if set.
+
+        Returns:
+            int: The number of users removed.
+        """
+        removed = 0
+        while stored_before is not None:
+            async with self._transaction() as db:
+                cursor = await db.execute(DELETE_STALE_CACHED_BATCH, (stored_before, self.prune_batch_size))
+                deleted = cursor.rowcount
+            removed += deleted
+            if deleted < self.prune_batch_size:
+                break
+
+        while True:
+            entries, size = await self.stats()
+            excess = 0
+            if max_entries is not None:
+                excess = entries - max_entries
+            if max_bytes is not None and size > max_bytes:
+                # Enough of the average entry to cover the excess bytes, checked again after.
+                excess = max(excess, -(-(size - max_bytes) * entries // size))
+            if excess <= 0:
+                return removed
+            async with self._transaction() as db:
+                cursor = await db.execute(DELETE_LEAST_RECENTLY_USED, (min(excess, self.prune_batch_size),))
+                deleted = cursor.rowcount
+            removed += deleted
+            if not deleted:
+                return removed
+
+    async def stats(self) -> tuple[int, int]:
+        async with self._reader() as db:
+            async with db.execute(SELECT_CACHE_TOTALS) as cursor:
+                entries, size = await cursor.fetchone()
+        return entries, size
+
+
+class SQLiteRateLimitBackend(SQLiteStore, RateLimitBackend):
+    """
+    Counts requests in the 'RateLimits' table of a SQLite database file.
+
+    Every hit is one write transaction, so the counts are exact across every process sharing the file.
+    """
+
+    migrations = RATE_LIMIT_MIGRATIONS
+
+    async def hit(self, keys: list[str], window: int, expires_at: float) -> list[tuple[int, int]]:
+        counts = []
+        async with self._transaction() as db:
+            for key in keys:
+                async with db.execute(INCREMENT_RATE_LIMIT, (key, window, expires_at)) as cursor:
+                    current = (await cursor.fetchone())[0]
+                async with db.execute(SELECT_RATE_LIMIT, (key, window - 1)) as cursor:
+                    row = await cursor.fetchone()
+                counts.append((0 if row is None else row[0], current))
+        return counts
+
+    async def cleanup(self, now: float) -> int:
+        async with self._transaction() as db:
+            cursor = await db.execute(DELETE_EXPIRED_RATE_LIMITS, (now,))
+            return cursor.rowcount
+
+    async def clear(self) -> None:
+        async with self._transaction() as db:
+            await db.execute(DELETE_ALL_RATE_LIMITS)
@@ -9,27 +9,37 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import Session
 
 # pylint: disable=import-error
-from backend.database.models.banned_ips import BannedIPs
+from database.models.banned_ips import BannedIPs
 
 class BannedIpsDal():
     """
     This class represents the data access layer for managing banned IPs.
+
+    Given the in-memory `BanList` the request middleware checks, e.g. `request.app.ctx.ip_bans`,
+    bans and unbans are applied to it as well once they are flushed, so they take effect
+    without reloading it.
     """
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, ban_list=None):
         self.db_session = db_session
+        self.ban_list = ban_list
 
     async def ban_new_ip(self, ip: str, reason: str, ip_of_admin: str):
         """
         Bans a new IP.
 
         Args:
-            ip (str): The IP address to be banned.
+            ip (str): The IP address or CIDR range to be banned.
             reason (str): The reason for banning the IP.
             ip_of_admin (str): The IP address of the admin who banned the IP.
+
+        Raises:
+            ValueError: If the IP is not an IP address or CIDR range, when a ban list is given.
         """
         new_ban = BannedIPs(ip=ip, reason=reason, ip_of_admin=ip_of_admin)
         self.db_session.add(new_ban)
         await self.db_session.flush()
+        if self.ban_list is not None:
+            self.ban_list.add(ip)
 
     async def get_banned_ips(self) -> List[BannedIPs]:
         """
@@ -38,9 +48,10 @@ class BannedIpsDal():
         Returns:
             List[BannedIPs]: A list of all banned IPs.
         """
-        return await self.db_session.execute(
+        q = await self.db_session.execute(
             select(BannedIPs)
-        ).scalars().all()
+        )
+        return q.scalars().all()
 
     async def check_ip(self, ip: str) -> Optional[BannedIPs]:
         """
@@ -52,9 +63,10 @@ class BannedIpsDal():
         Returns:
             Optional[BannedIPs]: The banned IP object if found, otherwise None.
         """
-        return await self.db_session.execute(
+        q = await self.db_session.execute(
             select(BannedIPs).where(BannedIPs.ip == ip)
-        ).scalar_one_or_none()
+        )
+        return q.scalars().first()
 
     async def unban_ip(self, ip: str):
         """
@@ -70,3 +82,5 @@ class BannedIpsDal():
             delete(BannedIPs).where(BannedIPs.ip == ip)
         )
         await self.db_session.flush()
+        if self.ban_list is not None:
+            self.ban_list.remove(ip)
@@ -2,9 +2,10 @@
 This module contains the Mfa_backup_codes_DAL class for accessing server data.
 """
 
+import hmac
 from typing import List, Optional
 
-from sqlalchemy import delete, update
+from sqlalchemy import delete, func, insert, update
 from sqlalchemy.future import select
 from sqlalchemy.orm import Session
 
@@ -42,7 +43,64 @@ class Mfa_backup_codes_DAL():
             List[Mfa_backup_codes]: A list of backup codes for the specified user.
         """
         q = select(Mfa_backup_codes).where(Mfa_backup_codes.owner_uuid == owner_uuid)
-        return await self.db_session.execute(q)
+        result = await self.db_session.execute(q)
+        return result.scalars().all()
+
+    async def count_users_codes(self, owner_uuid) -> int:
+        """
+        Count the backup codes the specified user has left.
+
+        Args:
+            owner_uuid: The UUID of the user to count the backup codes of.
+
+        Returns:
+            int: The number of backup codes.
+        """
+        q = select(func.count()).select_from(Mfa_backup_codes).where(Mfa_backup_codes.owner_uuid == owner_uuid)
+        return (await self.db_session.execute(q)).scalar_one()
+
+    async def replace_users_codes(self, owner_uuid, digests: List[str]):
+        """
+        Replace all backup codes of the specified user, inserting the new set in one statement.
+
+        Args:
+            owner_uuid: The UUID of the user to replace the backup codes of.
+            digests (List[str]): The digests of the new backup codes, see `core.general.backup_code_digest`.
+        """
+        await self.db_session.execute(delete(Mfa_backup_codes).where(Mfa_backup_codes.owner_uuid == owner_uuid))
+        if digests:
+            await self.db_session.execute(
+                insert(Mfa_backup_codes),
+                [{"owner_uuid": owner_uuid, "code": digest} for digest in digests]
+            )
+        await self.db_session.flush()
+
+    async def use_code(self, owner_uuid, digest: str) -> bool:
+        """
+        Consume a backup code of the specified user.
+
+        The code is found through the unique index on its digest and compared in constant
+        time, then deleted - if another request consumed it in between, nothing is deleted
+        and the code is not accepted twice.
+
+        Args:
+            owner_uuid: The UUID of the user the backup code belongs to.
+            digest (str): The digest of the backup code, see `core.general.backup_code_digest`.
+
+        Returns:
+            bool: True if the code was valid and has been consumed.
+        """
+        q = select(Mfa_backup_codes.identifier, Mfa_backup_codes.code).where(
+            Mfa_backup_codes.owner_uuid == owner_uuid, Mfa_backup_codes.code == digest
+        )
+        row = (await self.db_session.execute(q)).first()
+        if row is None or not hmac.compare_digest(row.code, digest):
+            return False
+
+        result = await self.db_session.execute(
+            delete(Mfa_backup_codes).where(Mfa_backup_codes.identifier == row.identifier)
+        )
+        return result.rowcount == 1
 
     async def check_if_code_exists(self, owner_uuid: int, code: str) -> Optional[Mfa_backup_codes]:
         """
@@ -56,7 +114,7 @@ class Mfa_backup_codes_DAL():
             Optional[Mfa_backup_codes]: The backup code if it exists, otherwise None.
         """
         q = select(Mfa_backup_codes).where(Mfa_backup_codes.owner_uuid == owner_uuid, Mfa_backup_codes.code == code)
-        return await self.db_session.execute(q).scalar()
+        return (await self.db_session.execute(q)).scalar()
 
     async def delete_users_codes(self, owner_uuid: int):
         """
@@ -82,8 +140,8 @@ class Mfa_backup_codes_DAL():
             owner_uuid: The UUID of the user to delete the backup code for.
             code (str): The backup code to delete.
         """
-        q = select(Mfa_backup_codes).where(Mfa_backup_codes.owner_uuid == owner_uuid, Mfa_backup_codes.code == code)
-        await self.db_session.execute(q).delete()
+        q = delete(Mfa_backup_codes).where(Mfa_backup_codes.owner_uuid == owner_uuid, Mfa_backup_codes.code == code)
+        await self.db_session.execute(q)
         await self.db_session.flush()
         return True
     
\ No newline at end of file
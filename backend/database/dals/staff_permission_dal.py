@@ -0,0 +1,88 @@
+"""
+This module contains the StaffPermissionsDAL class for managing staff route permissions.
+"""
+
+from typing import List
+
+from sqlalchemy import delete
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+# pylint: disable=import-error
+from database.models.staff_permissions import StaffPermission
+
+class StaffPermissionsDAL():
+    """
+    This class represents the data access layer for managing staff route permissions.
+    """
+    def __init__(self, db_session: Session):
+        self.db_session = db_session
+
+    async def get_permissions(self) -> List[StaffPermission]:
+        """
+        Returns every staff permission.
+
+        Returns:
+            List[StaffPermission]: The permissions, ordered by staff level, version and route.
+        """
+        q = await self.db_session.execute(
+            select(StaffPermission).order_by(StaffPermission.staff_level, StaffPermission.version, StaffPermission.route)
+        )
+        return q.scalars().all()
+
+    async def get_permission(self, staff_level: int, version: int, route: str) -> StaffPermission|None:
+        """
+        Returns the permission of a staff level to access a route.
+
+        Args:
+            staff_level (int): The staff level.
+            version (int): The API version of the route.
+            route (str): The route, as written in `routes.py`.
+
+        Returns:
+            StaffPermission|None: The permission, or None if it was not granted.
+        """
+        q = await self.db_session.execute(
+            select(StaffPermission).where(
+                StaffPermission.staff_level == staff_level,
+                StaffPermission.version == version,
+                StaffPermission.route == route
+            )
+        )
+        return q.scalars().first()
+
+    async def grant(self, staff_level: int, version: int, route: str):
+        """
+        Allows a staff level to access a route.
+
+        Args:
+            staff_level (int): The staff level.
+            version (int): The API version of the route.
+            route (str): The route, as written in `routes.py`.
+
+        Returns:
+            None
+        """
+        self.db_session.add(StaffPermission(staff_level=staff_level, version=version, route=route))
+        await self.db_session.flush()
+
+    async def revoke(self, staff_level: int, version: int, route: str):
+        """
+        Stops a staff level from accessing a route.
+
+        Args:
+            staff_level (int): The staff level.
+            version (int): The API version of the route.
+            route (str): The route, as written in `routes.py`.
+
+        Returns:
+            None
+        """
+        await self.db_session.execute(
+            delete(StaffPermission).where(
+                StaffPermission.staff_level == staff_level,
+                StaffPermission.version == version,
+                StaffPermission.route == route
+            )
+        )
+        await self.db_session.flush()
@@ -2,13 +2,84 @@
 This module provides functionality for managing users in the database.
 """
 import datetime
+import uuid as uuid_module
 from typing import List, Optional
 
-from sqlalchemy import update, delete, Uuid
+from sqlalchemy import update, delete, or_, Uuid
 from sqlalchemy.future import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 # pylint: disable=import-error
-from database.models.user import User
+from database.models.user import User, blind_index
+
+# The searchable encrypted columns and the blind index columns they are looked up by.
+BLIND_INDEXES = (
+    (User.email, User.email_blind_index),
+    (User.login_email_code, User.login_email_code_blind_index),
+    (User.password_reset_code, User.password_reset_code_blind_index),
+    (User.google_account_identifier, User.google_account_identifier_blind_index),
+    (User.discord_account_identifier, User.discord_account_identifier_blind_index),
+    (User.github_account_identifier, User.github_account_identifier_blind_index),
+)
+
+# Named column groups for loading part of a user. Each encrypted column is decrypted on load,
+# so a projection only fetches and decrypts what its callers read - any other attribute
+# raises instead of being loaded. None loads every column.
+PROJECTIONS = {
+    # Checking a login: the password hash and account flags, with no encrypted column.
+    "auth": (
+        User.identifier, User.uuid, User.password, User.email_verified, User.max_sessions,
+        User.two_factor_authentication_enabled, User.setting_up_two_factor_authentication,
+        User.is_root_admin, User.staff_level,
+    ),
+    # The fields of a `core.snapshot.CachedUser`, which the views read.
+    "profile": (
+        User.identifier, User.uuid, User.username, User.email, User.email_verified, User.avatar,
+        User.last_login, User.latest_ip, User.signup_ip, User.max_sessions, User.created_at,
+        User.google_account_identifier, User.discord_account_identifier, User.github_account_identifier,
+        User.two_factor_authentication_enabled, User.setting_up_two_factor_authentication,
+        User.is_root_admin, User.staff_level,
+    ),
+    # Verifying codes: the one-time codes, their expirations and the two-factor authentication secret.
+    "security": (
+        User.identifier, User.uuid, User.email, User.email_verified, User.email_verification_code,
+        User.login_email_code, User.login_email_code_expiration,
+        User.password_reset_code, User.password_reset_code_expiration,
+        User.two_factor_authentication_enabled, User.two_factor_authentication_secret,
+        User.setting_up_two_factor_authentication,
+    ),
+}
+
+def select_users(projection: Optional[str] = None):
+    """
+    Returns a select of users, loading only the columns of a projection.
+
+    Args:
+        projection (str, optional): The name of the projection in `PROJECTIONS`, None for every column.
+
+    Returns:
+        Select: The select statement.
+
+    Raises:
+        KeyError: If the projection does not exist.
+    """
+    if projection is None:
+        return select(User)
+    return select(User).options(load_only(*PROJECTIONS[projection], raiseload=True))
+
+def code_blind_index(code) -> Optional[str]:
+    """
+    Computes the blind index of a UUID code, accepting any form `uuid.UUID` parses.
+
+    Args:
+        code: The code, as a UUID or a string.
+
+    Returns:
+        str: The blind index, or None if the code is not a UUID.
+    """
+    try:
+        return blind_index(uuid_module.UUID(str(code)))
+    except ValueError:
+        return None
 
 class UsersDAL():
     """Data Access Layer for managing users in the database."""
@@ -37,6 +108,7 @@ class UsersDAL():
         new_user = User(
             username=username,
             email=email,
+            email_blind_index=blind_index(email),
             password=password,
             latest_ip=latest_ip,
             signup_ip=signup_ip,
@@ -44,88 +116,130 @@ class UsersDAL():
         self.db_session.add(new_user)
         await self.db_session.flush()
 
-    async def get_user_by_uuid(self, uuid: int) -> User:
+    async def get_user_by_uuid(self, uuid: int, projection: Optional[str] = None) -> User:
         """
         Returns the user with the given uuid.
 
         Args:
             uuid (int): The UUID of the user.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
 
         Returns:
             User: The user object with the given UUID.
         """
 
-        q = await self.db_session.execute(select(User).where(User.uuid == uuid))
+        q = await self.db_session.execute(select_users(projection).where(User.uuid == uuid))
         return q.scalars().first()
 
-    async def get_user_by_email_login_identifier(self, email_login_identifier: str) -> User:
+    async def get_users_by_uuids(self, uuids: List[Uuid], projection: Optional[str] = None) -> List[User]:
+        """
+        Returns the users with the given uuids, in a single query.
+
+        Args:
+            uuids (List[Uuid]): The UUIDs of the users.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
+
+        Returns:
+            List[User]: The users found, in no particular order.
+        """
+
+        q = await self.db_session.execute(select_users(projection).where(User.uuid.in_(uuids)))
+        return q.scalars().all()
+
+    async def get_user_by_email_login_identifier(self, email_login_identifier: str, projection: Optional[str] = None) -> User:
         """
         Retrieve a user from the database based on their email login identifier.
 
         Args:
             email_login_identifier (str): The email login identifier of the user to retrieve.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
 
         Returns:
             User: The user object corresponding to the given email login identifier, or None if no user is found.
         """
 
-        q = await self.db_session.execute(select(User).where(User.login_email_code == email_login_identifier))
+        index = code_blind_index(email_login_identifier)
+        if index is None:
+            return None
+        q = await self.db_session.execute(select_users(projection).where(User.login_email_code_blind_index == index))
+        return q.scalars().first()
+
+    async def get_user_by_password_reset_code(self, password_reset_code: str, projection: Optional[str] = None) -> User:
+        """
+        Retrieve a user from the database based on their password reset code.
+
+        Args:
+            password_reset_code (str): The password reset code of the user to retrieve.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
+
+        Returns:
+            User: The user object corresponding to the given password reset code, or None if no user is found.
+        """
+
+        index = code_blind_index(password_reset_code)
+        if index is None:
+            return None
+        q = await self.db_session.execute(select_users(projection).where(User.password_reset_code_blind_index == index))
         return q.scalars().first()
 
-    async def get_user_by_discord_id(self, discord_id: str) -> User:
+    async def get_user_by_discord_id(self, discord_id: str, projection: Optional[str] = None) -> User:
         """
         Retrieve a user from the database based on their discord id.
 
         Args:
             id (str): The id of the user to retrieve.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
 
         Returns:
             User: The user object corresponding to the given email, or None if no user is found.
         """
 
-        q = await self.db_session.execute(select(User).where(User.discord_account_identifier == discord_id))
+        q = await self.db_session.execute(select_users(projection).where(User.discord_account_identifier_blind_index == blind_index(discord_id)))
         return q.scalars().first()
     
-    async def get_user_by_google_id(self, google_id: str) -> User:
+    async def get_user_by_google_id(self, google_id: str, projection: Optional[str] = None) -> User:
         """
         Retrieve a user from the database based on their google id.
 
         Args:
             id (str): The id of the user to retrieve.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
 
         Returns:
             User: The user object corresponding to the given email, or None if no user is found.
         """
 
-        q = await self.db_session.execute(select(User).where(User.google_account_identifier == google_id))
+        q = await self.db_session.execute(select_users(projection).where(User.google_account_identifier_blind_index == blind_index(google_id)))
         return q.scalars().first()
     
-    async def get_user_by_github_id(self, github_id: str) -> User:
+    async def get_user_by_github_id(self, github_id: str, projection: Optional[str] = None) -> User:
         """
         Retrieve a user from the database based on their github id.
 
         Args:
             id (str): The id of the user to retrieve.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
 
         Returns:
             User: The user object corresponding to the given email, or None if no user is found.
         """
 
-        q = await self.db_session.execute(select(User).where(User.github_account_identifier == github_id))
+        q = await self.db_session.execute(select_users(projection).where(User.github_account_identifier_blind_index == blind_index(github_id)))
         return q.scalars().first()
 
-    async def get_user_by_email(self, email: str) -> User:
+    async def get_user_by_email(self, email: str, projection: Optional[str] = None) -> User:
         """
         Retrieve a user from the database based on their email.
 
         Args:
             email (str): The email of the user to retrieve.
+            projection (str, optional): The columns to load, see `PROJECTIONS`. Defaults to every column.
 
         Returns:
             User: The user object corresponding to the given email, or None if no user is found.
         """
 
-        q = await self.db_session.execute(select(User).where(User.email == email))
+        q = await self.db_session.execute(select_users(projection).where(User.email_blind_index == blind_index(email)))
         return q.scalars().first()
 
     async def get_all_users(self) -> List[User]:
@@ -199,19 +313,19 @@ class UsersDAL():
         if username:
             q = q.values(username=username)
         if email:
-            q = q.values(email=email)
+            q = q.values(email=email, email_blind_index=blind_index(email))
         if email_verified:
             q = q.values(email_verified=email_verified)
         if email_verification_code:
             q = q.values(email_verification_code=email_verification_code)
         if login_email_code:
-            q = q.values(login_email_code=login_email_code)
+            q = q.values(login_email_code=login_email_code, login_email_code_blind_index=code_blind_index(login_email_code))
         if login_email_code_expiration:
             q = q.values(login_email_code_expiration=login_email_code_expiration)
         if password:
             q = q.values(password=password)
         if password_reset_code:
-            q = q.values(password_reset_code=password_reset_code)
+            q = q.values(password_reset_code=password_reset_code, password_reset_code_blind_index=code_blind_index(password_reset_code))
         if password_reset_code_expiration:
             q = q.values(password_reset_code_expiration=password_reset_code_expiration)
         if avatar:
@@ -225,9 +339,9 @@ class UsersDAL():
         if max_sessions:
             q = q.values(max_sessions=max_sessions)
         if google_account_identifier:
-            q = q.values(google_account_identifier=google_account_identifier)
+            q = q.values(google_account_identifier=google_account_identifier, google_account_identifier_blind_index=blind_index(google_account_identifier))
         if discord_account_identifier:
-            q = q.values(discord_account_identifier=discord_account_identifier)
+            q = q.values(discord_account_identifier=discord_account_identifier, discord_account_identifier_blind_index=blind_index(discord_account_identifier))
         if two_factor_authentication_enabled:
             q = q.values(two_factor_authentication_enabled=two_factor_authentication_enabled)
         if two_factor_authentication_secret:
@@ -237,6 +351,44 @@ class UsersDAL():
         q.execution_options(synchronize_session="fetch")
         await self.db_session.execute(q)
 
+    async def replace_password_hash(self, uuid, old_password_hash, new_password_hash) -> bool:
+        """
+        Replaces the password hash of the user with the given uuid, unless it has changed since it was read.
+
+        Args:
+            uuid (int): The unique identifier of the user.
+            old_password_hash: The password hash the user had when it was read.
+            new_password_hash: The new password hash.
+
+        Returns:
+            bool: True if the hash was replaced, False if the password was changed in between.
+        """
+        q = update(User).where(User.uuid == uuid, User.password == old_password_hash).values(password=new_password_hash)
+        result = await self.db_session.execute(q)
+        return result.rowcount == 1
+
+    async def backfill_blind_indexes(self, chunk_size: int = 500) -> int:
+        """
+        Fills in the blind indexes missing from users, e.g. after the columns were added to an existing table.
+
+        Args:
+            chunk_size (int): The number of users updated per statement.
+
+        Returns:
+            int: The number of users updated.
+        """
+        missing = [index.is_(None) & column.is_not(None) for column, index in BLIND_INDEXES]
+        q = await self.db_session.execute(
+            select(User.identifier, *(column for column, _ in BLIND_INDEXES)).where(or_(*missing))
+        )
+        rows = [
+            {"identifier": row[0], **{index.key: blind_index(value) for (_, index), value in zip(BLIND_INDEXES, row[1:])}}
+            for row in q.all()
+        ]
+        for start in range(0, len(rows), chunk_size):
+            await self.db_session.execute(update(User), rows[start:start + chunk_size])
+        return len(rows)
+
     async def check_if_user_exists(self, username: str, email: str) -> bool:
         """
         Checks if a user with the given username or email exists.
@@ -248,11 +400,11 @@ class UsersDAL():
         Returns:
             bool: True if a user with the given username or email exists, False otherwise.
         """
-        q = await self.db_session.execute(select(User).where(User.username == username))
-        if q.scalars().first():
+        q = await self.db_session.execute(select(User.identifier).where(User.username == username).limit(1))
+        if q.first():
             return True
-        q = await self.db_session.execute(select(User).where(User.email == email))
-        if q.scalars().first():
+        q = await self.db_session.execute(select(User.identifier).where(User.email_blind_index == blind_index(email)).limit(1))
+        if q.first():
             return True
         return False
 
@@ -266,8 +418,8 @@ class UsersDAL():
         Returns:
             bool: True if a user with the given email exists, False otherwise.
         """
-        q = await self.db_session.execute(select(User).where(User.email == email))
-        if q.scalars().first():
+        q = await self.db_session.execute(select(User.identifier).where(User.email_blind_index == blind_index(email)).limit(1))
+        if q.first():
             return True
         return False
 
@@ -281,8 +433,8 @@ class UsersDAL():
         Returns:
             bool: True if a user with the given username or email exists, False otherwise.
         """
-        q = await self.db_session.execute(select(User).where(User.username == username))
-        if q.scalars().first():
+        q = await self.db_session.execute(select(User.identifier).where(User.username == username).limit(1))
+        if q.first():
             return True
         return False
 
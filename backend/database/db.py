@@ -2,8 +2,10 @@
 This module contains the database configuration and initialization code.
 """
 
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.schema import CreateColumn
 from sanic.log import logger
 import yaml
 import os
@@ -44,3 +46,44 @@ async def init(dev=False):
             await conn.run_sync(Base.metadata.create_all)
             logger.info('Tables dropped and created')
         logger.info('Database initialized')
+
+async def add_missing_columns(table) -> list[str]:
+    """
+    Adds the columns of a model's table that the database does not have yet, with their indexes.
+
+    `create_all` only creates missing tables, so columns added to a model after its table
+    was created are added here with `ALTER TABLE ... ADD COLUMN`. Only nullable columns
+    can be added to a table that already holds rows.
+
+    Args:
+        table (Table): The table of the model, e.g. `User.__table__`.
+
+    Returns:
+        list[str]: The names of the columns added.
+
+    Raises:
+        RuntimeError: If a missing column is not nullable - it has to be added by hand.
+    """
+    def add(connection):
+        inspector = inspect(connection)
+        if not inspector.has_table(table.name):
+            return []
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        required = [column.name for column in missing if not column.nullable]
+        if required:
+            raise RuntimeError(
+                f"The {table.name} table is missing the columns {', '.join(required)}, which cannot be added automatically."
+            )
+
+        table_name = connection.dialect.identifier_preparer.format_table(table)
+        for column in missing:
+            connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=connection.dialect)}"))
+        added = {column.name for column in missing}
+        for index in table.indexes:
+            if any(column.name in added for column in index.columns):
+                index.create(connection, checkfirst=True)
+        return [column.name for column in missing]
+
+    async with engine.begin() as conn:
+        return await conn.run_sync(add)
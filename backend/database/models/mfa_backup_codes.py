@@ -22,5 +22,5 @@ class Mfa_backup_codes(Base):
 
     identifier = Column(Integer, nullable=False, autoincrement=True, primary_key=True, unique=True)
     owner_uuid = Column(Uuid, nullable=False)
-    code = Column(String, nullable=False, unique=True)
+    code = Column(String, nullable=False, unique=True) # HMAC-SHA256 digest of the code, see core.general.backup_code_digest
     
@@ -0,0 +1,24 @@
+"""
+This module contains the staff permissions model.
+"""
+import datetime
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+# pylint: disable=import-error
+from database.db import Base
+
+class StaffPermission(Base):
+    """
+    Represents a route a staff level may access in the StaffPermissions table.
+
+    Routes are stored as they are written in `routes.py`, e.g. `/account/verify/email/<identifier>`,
+    together with the API version they belong to.
+    """
+
+    __tablename__ = 'StaffPermissions'
+    __table_args__ = (UniqueConstraint('staff_level', 'version', 'route'),)
+
+    identifier = Column(Integer, nullable=False, autoincrement=True, unique=True, primary_key=True)
+    staff_level = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    route = Column(String(255), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
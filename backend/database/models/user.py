@@ -2,6 +2,8 @@
 This module contains the User model.
 """
 import datetime
+import hashlib
+import hmac
 import os
 import uuid
 import pyotp
@@ -62,6 +64,38 @@ def get_encryption_key():
         "utf-8"
     )
 
+def get_blind_index_key():
+    """
+    Retrieves the key used for the blind indexes of searchable encrypted columns.
+
+    Returns:
+        bytes: The blind index key as bytes.
+    """
+
+    return bytes(
+        config_data["core"]["blind_index_key"],
+        "utf-8"
+    )
+
+def blind_index(value):
+    """
+    Computes the blind index of a value stored in a searchable encrypted column.
+
+    Encrypted columns cannot be indexed or compared in SQL, so each searchable one has a
+    `<column>_blind_index` column next to it, holding a keyed HMAC-SHA256 of the plaintext.
+    It is deterministic, so equal values can be found with an indexed lookup, but it cannot
+    be reversed without the key.
+
+    Args:
+        value: The plaintext value, compared by its string form, e.g. a UUID by its hyphenated form.
+
+    Returns:
+        str: The hex digest, or None if the value is None.
+    """
+    if value is None:
+        return None
+    return hmac.new(get_blind_index_key(), str(value).encode(), hashlib.sha256).hexdigest()
+
 class User(Base):
     """
     Represents a user in the users table.
@@ -79,6 +113,7 @@ class User(Base):
             AesEngine
         ), nullable=False
     )
+    email_blind_index = Column(String(64), nullable=True, index=True)
     email_verified = Column(Boolean, nullable=False, default=False)
     email_verification_code = Column(
         StringEncryptedType(
@@ -94,6 +129,7 @@ class User(Base):
             AesEngine
         ), nullable=True, default=None
     )
+    login_email_code_blind_index = Column(String(64), nullable=True, index=True)
     login_email_code_expiration = Column(
         StringEncryptedType(
             DateTime(timezone=True),
@@ -109,6 +145,7 @@ class User(Base):
             AesEngine
         ), nullable=True, default=None
     )
+    password_reset_code_blind_index = Column(String(64), nullable=True, index=True)
     password_reset_code_expiration = Column(
         StringEncryptedType(
             DateTime(timezone=True),
@@ -154,6 +191,7 @@ class User(Base):
         ), nullable=True, default=None
     
     )
+    google_account_identifier_blind_index = Column(String(64), nullable=True, index=True)
     discord_account_identifier = Column(
         StringEncryptedType(
             String(18),
@@ -161,6 +199,7 @@ class User(Base):
             AesEngine
         ), nullable=True, default=None
     )
+    discord_account_identifier_blind_index = Column(String(64), nullable=True, index=True)
     github_account_identifier = Column(
         StringEncryptedType(
             String(255),
@@ -168,6 +207,7 @@ class User(Base):
             AesEngine
         ), nullable=True, default=None
     )
+    github_account_identifier_blind_index = Column(String(64), nullable=True, index=True)
     two_factor_authentication_enabled = Column(Boolean, nullable=False, default=False)
     two_factor_authentication_secret = Column(
         StringEncryptedType(
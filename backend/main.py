@@ -1,3 +1,4 @@
+import functools
 import os
 import uuid
 import sanic
@@ -10,13 +11,21 @@ from database.models.allocation import Allocation
 from database.models.server import Server
 from database.models.user import User
 from database.models.banned_ips import BannedIPs
+from database.models.staff_permissions import StaffPermission
 from database.dals.user_dal import UsersDAL
 from core import session
 from sanic_ext import Extend
 from core.session import SessionManager
+from core.storage import create_cache_backend, create_rate_limit_backend, create_session_backend
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from core.caching import Cache
-from core.general import populate_cache, load_config
+from core.metrics import Registry
+from core.permissions import StaffPermissions
+from core.ipban import BanList
+from core.ratelimit import RateLimit, RateLimiter
+from core.encoder import HashPolicy, PasswordHasher
+from core.general import evict_expired_users, populate_cache, load_config
+from core.cookies import CookieVerifier, renew_session_cookie
 from core.oauth import discord as discord_oauth_handler
 
 app = sanic.Sanic("backend", env_prefix='APPLICATION_CONFIG_')
@@ -49,6 +58,15 @@ async def set_cors(request, response):
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     response.headers["Access-Control-Allow-Credentials"] = "true"
 
+@app.middleware('request')
+async def refuse_banned_ips(request):
+    if request.app.ctx.ip_bans.is_banned(request.ip):
+        raise sanic.exceptions.Forbidden("Your IP address is banned.")
+
+@app.middleware('response')
+async def renew_session(request, response):
+    await renew_session_cookie(request, response)
+
 @app.before_server_start
 async def main_start(app, loop):
     """
@@ -67,23 +85,85 @@ async def main_start(app, loop):
 
     app.config.FALLBACK_ERROR_FORMAT = "json"
 
-    if app.ctx.config["database"]["create_tables"]:
-        if os.path.exists("cache.db"):
-            os.remove("cache.db")
-        if os.path.exists("sessions.db"):
-            os.remove("sessions.db")
-    
     await db.init(app.ctx.config["database"]["create_tables"]) 
     print("Database initialized.")
 
+    added = await db.add_missing_columns(User.__table__)
+    if added:
+        print(f"Added the columns {', '.join(added)} to the User table.")
+
+    async with db.async_session() as session:
+        async with session.begin():
+            backfilled = await UsersDAL(session).backfill_blind_indexes()
+    if backfilled:
+        print(f"Blind indexes filled in for {backfilled} users.")
+
     app.ctx.SESSION_EXPIRY_IN = app.ctx.config["session"]["session_max_age"]
 
-    app.ctx.cache = Cache("cache.db")
+    app.ctx.metrics = Registry()
+    app.ctx.cookie_verifier = CookieVerifier(
+        app.ctx.config["core"]["cookie_secret"],
+        app.ctx.config["core"]["cookie_algorithm"],
+        maxsize=app.ctx.config["session"]["verified_cookie_cache_size"],
+        max_age=app.ctx.config["session"]["session_max_age"]
+    )
+    app.ctx.cache = Cache(
+        create_cache_backend(app.ctx.config),
+        local_size=app.ctx.config["cache"]["local_size"],
+        sync_interval=app.ctx.config["cache"]["sync_interval"],
+        ttl=app.ctx.config["cache"]["ttl"],
+        max_entries=app.ctx.config["cache"]["max_entries"],
+        max_bytes=app.ctx.config["cache"]["max_bytes"],
+        metrics=app.ctx.metrics
+    )
     await app.ctx.cache.async__init__() 
-    app.ctx.session = SessionManager("sessions.db")
+    app.ctx.session = SessionManager(
+        create_session_backend(app.ctx.config),
+        record_cache_size=app.ctx.config["session"]["record_cache_size"],
+        stateless=app.ctx.config["session"]["stateless"],
+        write_delay=app.ctx.config["session"]["write_behind_delay"],
+        write_batch_size=app.ctx.config["session"]["write_behind_batch_size"],
+        expiry_horizon=app.ctx.config["session"]["session_cleanup_interval"],
+        expiry_resolution=app.ctx.config["session"]["session_expiry_resolution"],
+        sliding_expiry=app.ctx.config["session"]["session_max_age"] if app.ctx.config["session"]["sliding_expiry"] else 0,
+        record_ttl=app.ctx.config["session"]["record_cache_ttl"],
+        metrics=app.ctx.metrics
+    )
     await app.ctx.session.async__init__()
-    
-    await populate_cache(app)
+    app.ctx.session.expiry.add_listener(functools.partial(evict_expired_users, app))
+    app.ctx.rate_limiter = RateLimiter(
+        create_rate_limit_backend(app.ctx.config),
+        {name: RateLimit(**limit) for name, limit in app.ctx.config["rate_limit"]["limits"].items()},
+        enabled=app.ctx.config["rate_limit"]["enabled"],
+        metrics=app.ctx.metrics
+    )
+    await app.ctx.rate_limiter.async__init__()
+    print(f"Session, cache and rate limit storage opened using the {app.ctx.config['storage']['backend']} backend.")
+
+    if app.ctx.config["database"]["create_tables"]:
+        await app.ctx.cache.clear()
+        await app.ctx.session.clear()
+        await app.ctx.rate_limiter.clear()
+
+    app.ctx.password_hasher = PasswordHasher(
+        threads=app.ctx.config["core"]["password_hash_threads"] or max(1, (os.cpu_count() or 1) // max(1, app.state.workers)),
+        queue_size=app.ctx.config["core"]["password_hash_queue_size"],
+        policy=HashPolicy(
+            algorithm=app.ctx.config["core"]["password_hash_algorithm"],
+            rounds=app.ctx.config["core"]["password_hash_rounds"],
+            time_cost=app.ctx.config["core"]["password_hash_time_cost"],
+            memory_cost=app.ctx.config["core"]["password_hash_memory_cost"],
+            parallelism=app.ctx.config["core"]["password_hash_parallelism"]
+        ),
+        metrics=app.ctx.metrics
+    )
+    await app.ctx.password_hasher.start()
+    print(f"Password hashing started in {app.ctx.password_hasher.threads} threads.")
+
+    app.ctx.staff_permissions = StaffPermissions(frozenset(registered_routes))
+    await app.ctx.staff_permissions.load()
+    app.ctx.ip_bans = BanList()
+    await app.ctx.ip_bans.load()
 
     app.ctx.discord = discord_oauth_handler
 
@@ -92,7 +172,9 @@ async def main_start(app, loop):
 @app.after_server_start
 async def ticker(app, loop):
     """
-    Starts a scheduler to periodically clean up sessions.
+    Starts warming up the user cache, expiring sessions and a scheduler to periodically flush
+    session activity, sync session changes, prune the user cache, drop expired rate limit
+    counters, reload the staff permissions and banned IPs and, in stateless mode, sync revocations.
 
     Parameters:
     - app: The Sanic application object.
@@ -101,10 +183,38 @@ async def ticker(app, loop):
     Returns:
     None
     """
+    app.ctx.session.expiry.start()
+    app.add_task(populate_cache(app, app.ctx.config["cache"]["warm_up_chunk_size"]), name="populate_cache")
     app.ctx.scheduler = AsyncIOScheduler()
-    app.ctx.scheduler.add_job(app.ctx.session.session_cleanup, 'interval', seconds=app.ctx.config["session"]["session_cleanup_interval"])
+    app.ctx.scheduler.add_job(app.ctx.session.flush_activity, 'interval', seconds=app.ctx.config["session"]["activity_flush_interval"])
+    app.ctx.scheduler.add_job(app.ctx.session.sync_changes, 'interval', seconds=app.ctx.config["session"]["change_sync_interval"])
+    app.ctx.scheduler.add_job(app.ctx.cache.prune, 'interval', seconds=app.ctx.config["cache"]["prune_interval"])
+    app.ctx.scheduler.add_job(app.ctx.rate_limiter.cleanup, 'interval', seconds=app.ctx.config["rate_limit"]["cleanup_interval"])
+    app.ctx.scheduler.add_job(app.ctx.staff_permissions.load, 'interval', seconds=app.ctx.config["routing"]["staff_permissions_reload_interval"])
+    app.ctx.scheduler.add_job(app.ctx.ip_bans.load, 'interval', seconds=app.ctx.config["core"]["banned_ips_reload_interval"])
+    if app.ctx.session.stateless:
+        app.ctx.scheduler.add_job(app.ctx.session.sync_revocations, 'interval', seconds=app.ctx.config["session"]["revocation_sync_interval"])
     app.ctx.scheduler.start()
 
+@app.after_server_stop
+async def main_stop(app, loop):
+    """
+    Function to release resources after the server stops.
+
+    Args:
+        app: The sanic application object.
+        loop: The event loop.
+
+    Returns:
+        None
+    """
+    app.ctx.scheduler.shutdown(wait=False)
+    await app.ctx.session.close()
+    await app.ctx.cache.close()
+    await app.ctx.rate_limiter.close()
+    print("Session, cache and rate limit storage closed.")
+    await app.ctx.password_hasher.close()
+
 # Sanic exceptions - https://github.com/sanic-org/sanic/blob/main/sanic/exceptions.py
 
 # add wildcard route to handle all requests and to serve static/entry.html
@@ -113,6 +223,8 @@ async def index(request, route):
     print(route)
     return await sanic.response.file("static/entry.html")
 
+# every route carries its (version, route) key, which staff permissions are granted on
+registered_routes = set()
 for index_version, api_routes in enumerate(routes.routes):
     config = load_config("config.yml")
     if (index_version + 1) in config["routing"]["enabled_versions"]:
@@ -121,8 +233,10 @@ for index_version, api_routes in enumerate(routes.routes):
                 handler=route[1].as_view(),
                 uri=f"/{route[0]}",
                 version=index_version + 1, 
-                version_prefix=config["routing"]["context_path"] + "/v"
+                version_prefix=config["routing"]["context_path"] + "/v",
+                ctx_staff_route=(index_version + 1, route[0])
             )
+            registered_routes.add((index_version + 1, route[0]))
 
 # serve static files without overriding the predefined routes above
 app.static("/pages/", "./static/pages/")
@@ -21,6 +21,8 @@ from views.account.link.callback.discord import DiscordOauthLinkCallbackView
 from views.account.verify.email import VerifyEmailView
 from views.auth.reset.password import ResetPasswordView
 from views.auth.reset.callback.password import ResetPasswordCallbackView
+from views.admin.metrics import MetricsView
+from views.admin.staff.permissions import StaffPermissionsView
 
 routes = [
     [ # This is version 1
@@ -67,6 +69,10 @@ routes = [
         ["/auth/oauth/callback/email/<identifier>", EmailAuthenticationCallbackView],
         ["/auth/reset/callback/password", ResetPasswordCallbackView],
 
+        # --- Admin ---
+        ["/admin/metrics", MetricsView],
+        ["/admin/staff/permissions", StaffPermissionsView],
+
     ]
 ]
 
@@ -0,0 +1,29 @@
+"""
+Runs the tests from the backend folder, the way the server is started, so imports and config.yml resolve.
+"""
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BACKEND)
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture(scope="session")
+def redis_port():
+    """
+    Serves fakeredis, an in-process fake of a Redis server, on a free local port.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield port
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,67 @@
+"""
+Tests for the password hasher.
+"""
+import asyncio
+import multiprocessing
+
+import pytest
+from sanic.exceptions import ServiceUnavailable
+# pylint: disable=import-error
+from core import encoder
+from core.encoder import HashPolicy, PasswordHasher
+
+POLICY = HashPolicy(rounds=4)
+
+
+async def _hash_and_check() -> tuple[bool, bool]:
+    hasher = PasswordHasher(threads=2, policy=POLICY)
+    await hasher.start()
+    try:
+        hashed_password = await hasher.hash(b"password")
+        return await hasher.check(b"password", hashed_password), await hasher.check(b"wrong", hashed_password)
+    finally:
+        await hasher.close()
+
+
+def _run_in_worker(results) -> None:
+    try:
+        results.put(asyncio.run(_hash_and_check()))
+    except BaseException as error: # pylint: disable=broad-except
+        results.put(repr(error))
+
+
+def test_starts_in_daemon_process():
+    # Sanic runs every worker as a daemon process, which cannot start processes of its own.
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    worker = context.Process(target=_run_in_worker, args=(results,), daemon=True)
+    worker.start()
+    worker.join(60)
+    assert results.get(timeout=1) == (True, False)
+
+
+def test_sheds_load_past_queue_size():
+    async def run():
+        hasher = PasswordHasher(threads=1, queue_size=1, policy=HashPolicy(rounds=10))
+        await hasher.start()
+        try:
+            results = await asyncio.gather(*(hasher.hash(b"password") for _ in range(4)), return_exceptions=True)
+        finally:
+            await hasher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, bytes) for result in results) == 2
+    assert sum(isinstance(result, ServiceUnavailable) for result in results) == 2
+
+
+def test_rejects_unknown_algorithm():
+    with pytest.raises(ValueError):
+        PasswordHasher(policy=HashPolicy("md5"))
+
+
+def test_argon2_missing(monkeypatch):
+    monkeypatch.setattr(encoder, "argon2", None)
+    with pytest.raises(RuntimeError):
+        PasswordHasher(policy=HashPolicy("argon2id"))
+    assert encoder._check(b"password", b"$argon2id$v=19$m=65536,t=3,p=1$c2FsdHNhbHQ$aGFzaGhhc2g")[0] is False
@@ -0,0 +1,72 @@
+"""
+Tests for the RESP client, against fakeredis.
+"""
+import asyncio
+
+import pytest
+# pylint: disable=import-error
+from core.storage.resp import RespClient, RespError
+
+
+def run(redis_port, scenario):
+    async def main():
+        client = RespClient("127.0.0.1", redis_port, pool_size=2)
+        await client.connect()
+        try:
+            await client.execute("FLUSHALL")
+            await scenario(client)
+        finally:
+            await client.close()
+    asyncio.run(main())
+
+
+def test_replies(redis_port):
+    async def scenario(client):
+        assert await client.execute("SET", "text", "héllo") == b"OK"
+        assert await client.execute("GET", "text") == "héllo".encode()
+        assert await client.execute("SET", "binary", b"\r\n\x00\xff") == b"OK"
+        assert await client.execute("GET", "binary") == b"\r\n\x00\xff"
+        assert await client.execute("GET", "missing") is None
+        assert await client.execute("INCR", "counter") == 1
+        assert await client.execute("RPUSH", "list", 1, 2.5, "three") == 3
+        assert await client.execute("LRANGE", "list", 0, -1) == [b"1", b"2.5", b"three"]
+        assert await client.execute("SET", "empty", "") == b"OK"
+        assert await client.execute("GET", "empty") == b""
+    run(redis_port, scenario)
+
+
+def test_pipeline_and_transaction(redis_port):
+    async def scenario(client):
+        assert await client.pipeline([]) == []
+        assert await client.pipeline([("INCR", "a"), ("INCR", "a"), ("GET", "a")]) == [1, 2, b"2"]
+        assert await client.transaction([("INCR", "b"), ("INCRBY", "b", 5)]) == [1, 6]
+        assert sorted(await client.scan("*")) == [b"a", b"b"]
+    run(redis_port, scenario)
+
+
+# fakeredis drops a connection after an error reply, so each error is checked last.
+
+def test_error_raised(redis_port):
+    async def scenario(client):
+        await client.execute("SET", "text", "x")
+        with pytest.raises(RespError):
+            await client.execute("INCR", "text")
+    run(redis_port, scenario)
+
+
+def test_error_returned(redis_port):
+    async def scenario(client):
+        await client.execute("SET", "text", "x")
+        replies = await client.pipeline([("GET", "text"), ("INCR", "text")], raise_on_error=False)
+        assert replies[0] == b"x" and isinstance(replies[1], RespError)
+    run(redis_port, scenario)
+
+
+def test_error_in_transaction(redis_port):
+    async def scenario(client):
+        await client.execute("SET", "text", "x")
+        # An error inside MULTI/EXEC is part of the EXEC reply, and must not pass silently.
+        with pytest.raises(RespError):
+            await client.transaction([("SET", "other", "y"), ("INCR", "text")])
+        assert await client.execute("GET", "other") == b"y"
+    run(redis_port, scenario)
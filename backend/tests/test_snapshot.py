@@ -0,0 +1,23 @@
+"""
+Tests for the user snapshot format.
+"""
+import pytest
+# pylint: disable=import-error
+from benchmarks.user_snapshot import fake_user
+from core.snapshot import CachedUser
+
+
+def snapshot() -> CachedUser:
+    return CachedUser.from_user(fake_user(1))._replace(identifier=1)
+
+
+@pytest.mark.parametrize("avatar", [None, "", "avatar.png", "a" * 0xFFFF, "a" * 0x10000], ids=["none", "empty", "short", "u16-max", "past-u16"])
+def test_round_trip(avatar):
+    user = snapshot()._replace(avatar=avatar, github_account_identifier=None)
+    assert CachedUser.loads(user.dumps()) == user
+
+
+def test_rejects_unknown_version():
+    data = snapshot().dumps()
+    with pytest.raises(ValueError):
+        CachedUser.loads(bytes([0]) + data[1:])
@@ -0,0 +1,262 @@
+"""
+Contract tests for the storage backends, run against every backend.
+
+The redis backends are run against fakeredis, started by the `redis_port` fixture.
+"""
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+import uuid
+
+import pytest
+# pylint: disable=import-error
+from core.storage import create_cache_backend, create_rate_limit_backend, create_session_backend
+from core.storage.base import CacheBackend
+
+BACKENDS = ["memory", "sqlite", "redis"]
+
+
+@pytest.fixture(params=BACKENDS)
+def config(request, tmp_path):
+    redis_port = request.getfixturevalue("redis_port") if request.param == "redis" else 6379
+    return {
+        "storage": {
+            "backend": request.param,
+            "sqlite": {
+                "session_path": str(tmp_path / "sessions.db"),
+                "cache_path": str(tmp_path / "cache.db"),
+                "rate_limit_path": str(tmp_path / "ratelimits.db"),
+                "reader_connections": 2,
+            },
+            "redis": {
+                "host": "127.0.0.1",
+                "port": redis_port,
+                "db": 0,
+                "password": "",
+                "pool_size": 2,
+                # Keeps every test apart on the shared server.
+                "key_prefix": f"test-{uuid.uuid4().hex}:",
+            },
+        },
+        "session": {"session_cleanup_batch_size": 2},
+    }
+
+
+def run(create, config, scenario):
+    """
+    Opens a backend, runs a scenario against it and closes it.
+    """
+    async def main():
+        backend = create(config)
+        await backend.open()
+        try:
+            await scenario(backend)
+        finally:
+            await backend.close()
+    asyncio.run(main())
+
+
+def user() -> str:
+    return uuid.uuid4().hex
+
+
+def test_session_add_fetch_count(config):
+    async def scenario(backend):
+        owner, expiry = user(), time.time() + 100
+        await backend.add("a", owner, "1.1.1.1", expiry)
+        await backend.add("b", owner, "1.1.1.1", expiry)
+        record = await backend.fetch("a")
+        assert (record.uuid.hex, record.expiry, record.two_factor_pending) == (owner, expiry, False)
+        assert await backend.fetch("missing") is None
+        assert await backend.count(owner) == 2
+        assert await backend.all_users() == [owner]
+        assert sorted(session[0] for session in await backend.user_sessions(owner)) == ["a", "b"]
+        await backend.delete("a")
+        await backend.delete("a")
+        assert await backend.count(owner) == 1
+        await backend.clear()
+        assert await backend.count(owner) == 0 and await backend.all_users() == []
+    run(create_session_backend, config, scenario)
+
+
+def test_session_add_limited(config):
+    async def scenario(backend):
+        owner, expiry = user(), time.time() + 100
+        counts = await asyncio.gather(*(
+            backend.add_limited(f"t{index}", owner, "1.1.1.1", expiry, 3) for index in range(10)
+        ))
+        assert sorted(count for count in counts if count is not None) == [1, 2, 3]
+        assert await backend.count(owner) == 3
+        assert await backend.add_limited("pending", user(), "1.1.1.1", expiry, 1, True) == 1
+        assert (await backend.fetch("pending")).two_factor_pending is True
+    run(create_session_backend, config, scenario)
+
+
+def test_session_apply(config):
+    async def scenario(backend):
+        owner, expiry = user(), time.time() + 100
+        await backend.add("kept", owner, "1.1.1.1", expiry)
+        await backend.apply([
+            ("add", "a", owner, "1.1.1.1", expiry),
+            ("set_twofactor_state", "a", True),
+            ("set_twofactor_state", "kept", True),
+            ("delete", "kept"),
+            ("revoke", "kept", expiry),
+            ("set_twofactor_state", "missing", True),
+        ])
+        assert (await backend.fetch("a")).two_factor_pending is True
+        assert await backend.fetch("kept") is None
+        assert await backend.fetch("missing") is None
+        assert await backend.count(owner) == 1
+        assert await backend.revocations_since(0) == [("kept", expiry)]
+        assert sorted(await backend.changes_since(0)) == ["a", "kept"]
+        with pytest.raises(ValueError):
+            await backend.apply([("unknown", "a")])
+    run(create_session_backend, config, scenario)
+
+
+def test_session_touch(config):
+    async def scenario(backend):
+        owner, expiry = user(), time.time() + 100
+        await backend.add("a", owner, "1.1.1.1", expiry)
+        await backend.add("b", owner, "1.1.1.1", expiry)
+        await backend.touch([
+            ("a", 10.0, "2.2.2.2", None),
+            ("b", 20.0, "3.3.3.3", expiry + 50),
+            ("missing", 30.0, "4.4.4.4", expiry + 50),
+        ])
+        sessions = {session[0]: session for session in await backend.user_sessions(owner)}
+        assert sessions["a"][2] == expiry and sessions["a"][4:] == (10.0, "2.2.2.2")
+        assert sessions["b"][2] == expiry + 50 and sessions["b"][4:] == (20.0, "3.3.3.3")
+        await backend.touch([("b", 40.0, "3.3.3.3", expiry)])
+        assert (await backend.fetch("b")).expiry == expiry + 50
+        assert await backend.fetch("missing") is None
+    run(create_session_backend, config, scenario)
+
+
+def test_session_cleanup(config):
+    async def scenario(backend):
+        owner, now = user(), time.time()
+        for index in range(5):
+            await backend.add(f"soon{index}", owner, "1.1.1.1", now + 1)
+        await backend.add("later", owner, "1.1.1.1", now + 100)
+        await backend.revoke("soon0", now + 1)
+        await backend.revoke("later", now + 100)
+        assert sorted(token for token, *_ in await backend.expiring_before(now + 10)) == [f"soon{index}" for index in range(5)]
+        assert await backend.cleanup(now + 10) == 5
+        assert await backend.count(owner) == 1
+        assert await backend.expiring_before(now + 10) == []
+        assert await backend.revocations_since(0) == [("later", now + 100)]
+    run(create_session_backend, config, scenario)
+
+
+def test_session_changes(config):
+    async def scenario(backend):
+        owner, expiry = user(), time.time() + 100
+        await backend.add("a", owner, "1.1.1.1", expiry)
+        await backend.add("b", owner, "1.1.1.1", expiry)
+        before = time.time()
+        await backend.set_twofactor_state("a", True)
+        await backend.delete("b")
+        assert sorted(await backend.changes_since(before - 1)) == ["a", "b"]
+        assert await backend.changes_since(time.time() + 1) == []
+        await backend.cleanup(time.time() + backend.CHANGE_RETENTION + 1)
+        assert await backend.changes_since(0) == []
+    run(create_session_backend, config, scenario)
+
+
+def test_cache_get_set_add(config):
+    async def scenario(backend):
+        first, second = user(), user()
+        assert await backend.get(first) is None
+        await backend.set(first, b"one")
+        assert await backend.add(first, b"other") is False
+        assert await backend.get(first) == b"one"
+        assert await backend.add_many([(first, b"other"), (second, b"two")]) == 1
+        assert await backend.get(second) == b"two"
+        assert await backend.stats() == (2, 6)
+        await backend.delete(first)
+        assert await backend.get(first) is None
+        await backend.clear()
+        assert await backend.stats() == (0, 0)
+    run(create_cache_backend, config, scenario)
+
+
+def test_cache_versions(config):
+    async def scenario(backend):
+        first, second = user(), user()
+        version = await backend.version()
+        assert await backend.changes_since(version) == (version, [])
+        await backend.add(first, b"one")
+        assert (await backend.changes_since(version))[1] == []
+        await backend.set(first, b"two")
+        await backend.delete(second)
+        version, changed = await backend.changes_since(version)
+        assert sorted(changed) == sorted([first, second])
+        assert version == await backend.version()
+        await backend.set(first, b"three")
+        await backend.set(second, b"three")
+        assert (await backend.changes_since(version, limit=1))[1] == [CacheBackend.EVERYTHING]
+        version = await backend.version()
+        await backend.clear()
+        assert (await backend.changes_since(version))[1] == [CacheBackend.EVERYTHING]
+    run(create_cache_backend, config, scenario)
+
+
+def test_cache_prune(config):
+    async def scenario(backend):
+        users = [user() for _ in range(4)]
+        for user_identifier in users:
+            await backend.set(user_identifier, b"1234")
+        await backend.touch(users[:2], time.time() + 10)
+        assert await backend.prune(None, 3, None) == 1
+        assert await backend.prune(None, None, 8) == 1
+        assert sorted([user_identifier for user_identifier in users if await backend.get(user_identifier)]) == sorted(users[:2])
+        assert await backend.prune(time.time() + 1, None, None) == 2
+        assert await backend.stats() == (0, 0)
+    run(create_cache_backend, config, scenario)
+
+
+def test_rate_limit_hits(config):
+    async def scenario(backend):
+        expires_at = time.time() + 100
+        assert await backend.hit(["a", "b"], 10, expires_at) == [(0, 1), (0, 1)]
+        assert await backend.hit(["a"], 10, expires_at) == [(0, 2)]
+        assert await backend.hit(["a", "b"], 11, expires_at) == [(2, 1), (1, 1)]
+        await backend.clear()
+        assert await backend.hit(["a"], 11, expires_at) == [(0, 1)]
+    run(create_rate_limit_backend, config, scenario)
+
+
+def test_rate_limit_cleanup(config):
+    async def scenario(backend):
+        await backend.hit(["a"], 10, time.time() + 0.5)
+        await asyncio.sleep(0.6)
+        await backend.cleanup(time.time())
+        assert await backend.hit(["a"], 11, time.time() + 100) == [(0, 1)]
+    run(create_rate_limit_backend, config, scenario)
+
+
+def _open_sqlite_backends(path: str) -> None:
+    from core.storage.sqlite import SQLiteCacheBackend, SQLiteRateLimitBackend, SQLiteSessionBackend
+    async def main():
+        for backend in (SQLiteSessionBackend(path), SQLiteCacheBackend(path + "-cache"), SQLiteRateLimitBackend(path + "-limits")):
+            await backend.open()
+            await backend.close()
+    asyncio.run(main())
+
+
+def test_sqlite_migrations_concurrently(tmp_path):
+    # Every worker migrates the files as it starts - each migration must still run once.
+    from core.storage.sqlite import SESSION_MIGRATIONS
+    path = str(tmp_path / "sessions.db")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_open_sqlite_backends, args=(path,)) for _ in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0] * len(workers)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == len(SESSION_MIGRATIONS)
@@ -33,7 +33,7 @@ class DisableTwoFaView(HTTPMethodView):
 
                 await cache.update(
                     await users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
 
@@ -61,7 +61,7 @@ class UpdateAvatarView(HTTPMethodView):
 
                 await cache.update(
                     await users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
 
@@ -54,7 +54,7 @@ class UpdateEmailView(HTTPMethodView):
 
                 await cache.update(
                     await users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
 
@@ -33,7 +33,7 @@ class UpdateMaxSessions(HTTPMethodView):
         if params.max_sessions <= 0:
             raise BadRequest("The max session limit cannot be lower than 0.")
 
-        if params.max_sessions < len(await request.app.ctx.session.cocurrent_sessions(user.uuid)):
+        if params.max_sessions < await request.app.ctx.session.session_count(user.uuid):
             raise BadRequest("The max session limit cannot be lower than the current amount of active sessions.")
         
         if params.max_sessions == user.max_sessions:
@@ -47,7 +47,7 @@ class UpdateMaxSessions(HTTPMethodView):
 
                 await cache.update(
                     await users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
 
@@ -36,7 +36,7 @@ class UpdatePasswordView(HTTPMethodView):
             async with session.begin():
                 users_dal = UsersDAL(session)
                 
-                db_user = await users_dal.get_user_by_uuid(user.uuid)
+                db_user = await users_dal.get_user_by_uuid(user.uuid, projection="auth")
 
                 if not await check_password(params.current_password.encode('utf-8'), db_user.password):
                     raise BadRequest("Current password is incorrect.")
@@ -39,7 +39,7 @@ class UpdateUsernameView(HTTPMethodView):
 
                 await cache.update(
                     await users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
 
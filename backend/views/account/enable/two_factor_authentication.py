@@ -39,7 +39,7 @@ class TwoFaSetupView(HTTPMethodView):
         async with db.async_session() as session:
             async with session.begin():
                 users_dal = UsersDAL(session)
-                db_user = await users_dal.get_user_by_uuid(user.uuid)
+                db_user = await users_dal.get_user_by_uuid(user.uuid, projection="security")
                 setup_uri = db_user.get_two_factor_auth_setup_uri()
 
                 ## generate qr code
@@ -48,6 +48,6 @@ class TwoFaSetupView(HTTPMethodView):
                 data_to_return = {"qr_image": qr_image, "setup_uri": setup_uri, "secret_token": db_user.two_factor_authentication_secret}
 
                 await users_dal.update_user(user.uuid, setting_up_two_factor_authentication=True)
-                await request.app.ctx.cache.update(await users_dal.get_user_by_uuid(user.uuid))
+                await request.app.ctx.cache.update(await users_dal.get_user_by_uuid(user.uuid, projection="profile"))
 
                 return await data_response(request, data_to_return)
\ No newline at end of file
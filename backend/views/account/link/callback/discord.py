@@ -87,7 +87,7 @@ class DiscordOauthLinkCallbackView(HTTPMethodView):
 
                 await request.app.ctx.cache.update(
                     await users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
                 response = redirect(get_oauth_cookie(request, "discord_oauth")["rejoin_uri"])
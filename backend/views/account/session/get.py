@@ -25,7 +25,9 @@ class GetActiveSessionsView(HTTPMethodView):
                 "session_token": item[0],
                 "creation_ip": item[1],
                 "expiry": item[2],
-                "created_at": item[3]
+                "created_at": item[3],
+                "last_seen_at": item[4],
+                "last_ip": item[5]
             })
 
         return await data_response(request, result)
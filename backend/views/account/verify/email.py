@@ -14,24 +14,23 @@ class VerifyEmailView(HTTPMethodView):
     @inject_cached_user()
     async def get(request: Request, user, identifier: str):
         """The email verification route."""
-        cache = request.app.ctx.cache
-
-        user_info = user
-
-        if user_info.email_verified:
+        if user.email_verified:
             raise BadRequest("Email already verified.", status_code=400)
         
         if not identifier:
             raise BadRequest("No email verification code present in the request.", status_code=400)
         
-        if identifier != user_info.email_verification_code:
-            raise BadRequest("Invalid email verification code.", status_code=400)
-        
         async with db.async_session() as session:
             async with session.begin():
                 users_dal = UsersDAL(session)
-                await users_dal.update_user(uuid=user_info.uuid, email_verified=True)
-                user_info.email_verified = True
-                await cache.update(user_info)
+                ## the cached user is a read-only snapshot without the verification code, so it is read from the db
+                db_user = await users_dal.get_user_by_uuid(user.uuid, projection="security")
+                if db_user.email_verification_code is None or identifier != str(db_user.email_verification_code):
+                    raise BadRequest("Invalid email verification code.", status_code=400)
+
+                await users_dal.update_user(uuid=user.uuid, email_verified=True)
+                await request.app.ctx.cache.update(
+                    await users_dal.get_user_by_uuid(user.uuid, projection="profile")
+                )
 
-                return await success(request, "Email verified successfully.")
\ No newline at end of file
+        return await success(request, "Email verified successfully.")
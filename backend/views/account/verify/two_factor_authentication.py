@@ -10,8 +10,7 @@ from core.general import restricted_to_verified, inject_cached_user
 from database import db
 from sanic_dantic import parse_params
 from sanic_dantic import BaseModel
-from core.general import generate_backup_code
-from core import encoder
+from core.general import backup_code_digest, generate_backup_code
 
 class TwoFaSetupVerificationView(HTTPMethodView):
     """The 2fa otp verification for setup view."""
@@ -38,41 +37,39 @@ class TwoFaSetupVerificationView(HTTPMethodView):
         async with db.async_session() as user_session:
             async with user_session.begin():
                 users_dal = UsersDAL(user_session)
-                db_user = await users_dal.get_user_by_uuid(user.uuid)
+                db_user = await users_dal.get_user_by_uuid(user.uuid, projection="security")
 
                 if not db_user.verify_two_factor_auth(params.two_factor_authentication_otp_code):
                     raise BadRequest("Invalid OTP code.")
         
-        data_to_return = []
+        config = request.app.ctx.config["2fa"]
+        data_to_return = [generate_backup_code(config["backup_code_length"]) for _ in range(config["backup_codes"])]
 
         async with db.async_session() as backup_code_session:
             async with backup_code_session.begin():
                 mfa_backup_codes_dal = Mfa_backup_codes_DAL(backup_code_session)
-                await mfa_backup_codes_dal.delete_users_codes(user.uuid)
-
-                for _ in range(request.app.ctx.config["2fa"]["backup_codes"]):
-                    code = generate_backup_code(request.app.ctx.config["2fa"]["backup_code_length"])
-                    data_to_return.append(code)
-                    await mfa_backup_codes_dal.create_backup_code(user.uuid, code)
+                await mfa_backup_codes_dal.replace_users_codes(
+                    user.uuid, [backup_code_digest(code, config["backup_code_pepper"]) for code in data_to_return]
+                )
         
         async with db.async_session() as new_user_session:
             async with new_user_session.begin():
                 new_users_dal = UsersDAL(new_user_session)
                 
                 ## update the item in db manually
-                user.setting_up_two_factor_authentication = False
-                user.two_factor_authentication_enabled = True
-
-                ## push the new obj to the db
+                ## (the cached user is a read-only snapshot, so the changed columns are set directly)
 
                 q = update(User).where(User.uuid == user.uuid)
-                q = q.values(user.to_dict())
+                q = q.values(
+                    setting_up_two_factor_authentication=False,
+                    two_factor_authentication_enabled=True
+                )
                 await new_user_session.execute(q)
                 await new_user_session.flush()
                 
                 await request.app.ctx.cache.update(
                     await new_users_dal.get_user_by_uuid(
-                        user.uuid
+                        user.uuid, projection="profile"
                     )
                 )
         return await data_response(request, {"backup_codes": data_to_return})
\ No newline at end of file
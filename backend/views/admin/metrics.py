@@ -0,0 +1,14 @@
+from sanic import Request
+from sanic.response import text
+from sanic.views import HTTPMethodView
+from core.authentication import root_admin_only
+from core.metrics import CONTENT_TYPE
+
+class MetricsView(HTTPMethodView):
+    """The metrics view."""
+
+    @staticmethod
+    @root_admin_only
+    async def get(request: Request):
+        """ The metrics route, in the Prometheus text format. """
+        return text(await request.app.ctx.metrics.render(), content_type=CONTENT_TYPE)
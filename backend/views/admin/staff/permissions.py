@@ -0,0 +1,70 @@
+from sanic.views import HTTPMethodView
+from sanic import Request, BadRequest
+from sanic_dantic import parse_params, BaseModel
+from core.authentication import root_admin_only
+from core.responses import success, data_response
+from database.dals.staff_permission_dal import StaffPermissionsDAL
+from database import db
+
+class StaffPermissionsView(HTTPMethodView):
+    """The staff permissions view."""
+
+    class StaffPermissionRequest(BaseModel):
+        """The staff permission request model."""
+
+        staff_level: int
+        version: int
+        route: str
+
+    @staticmethod
+    @root_admin_only
+    async def get(request: Request):
+        """The list staff permissions route."""
+        async with db.async_session() as session:
+            permissions = await StaffPermissionsDAL(session).get_permissions()
+        return await data_response(request, [
+            {"staff_level": permission.staff_level, "version": permission.version, "route": permission.route}
+            for permission in permissions
+        ])
+
+    @staticmethod
+    @root_admin_only
+    @parse_params(body=StaffPermissionRequest)
+    async def post(request: Request, params: StaffPermissionRequest):
+        """The grant staff permission route."""
+        staff_permissions = request.app.ctx.staff_permissions
+
+        if params.staff_level <= 0:
+            raise BadRequest("The staff level must be higher than 0.")
+
+        if (params.version, params.route) not in staff_permissions.routes:
+            raise BadRequest("Unknown route.")
+
+        async with db.async_session() as session:
+            async with session.begin():
+                staff_permissions_dal = StaffPermissionsDAL(session)
+
+                if await staff_permissions_dal.get_permission(params.staff_level, params.version, params.route):
+                    raise BadRequest("The staff level can already access this route.")
+
+                await staff_permissions_dal.grant(params.staff_level, params.version, params.route)
+
+        await staff_permissions.load()
+        return await success(request, "Staff permission granted successfully.")
+
+    @staticmethod
+    @root_admin_only
+    @parse_params(body=StaffPermissionRequest)
+    async def delete(request: Request, params: StaffPermissionRequest):
+        """The revoke staff permission route."""
+        async with db.async_session() as session:
+            async with session.begin():
+                staff_permissions_dal = StaffPermissionsDAL(session)
+
+                if not await staff_permissions_dal.get_permission(params.staff_level, params.version, params.route):
+                    raise BadRequest("The staff level cannot access this route.")
+
+                await staff_permissions_dal.revoke(params.staff_level, params.version, params.route)
+
+        await request.app.ctx.staff_permissions.load()
+        return await success(request, "Staff permission revoked successfully.")
@@ -16,6 +16,7 @@ from core.responses import success
 from sanic import Request, BadRequest
 from sanic.views import HTTPMethodView
 from core.cookies import check_if_cookie_is_present, remove_cookie
+from core.ratelimit import rate_limited, body_field
 
 
 class CreateView(HTTPMethodView):
@@ -29,6 +30,7 @@ class CreateView(HTTPMethodView):
         password: str
         repeated_password: str
 
+    @rate_limited("create", account=body_field("email"))
     @parse_params(body=CreateUserRequest)
     async def post(self, request: Request, params: CreateUserRequest):
         """The create user route."""
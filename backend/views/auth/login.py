@@ -7,11 +7,12 @@ from database.dals.mfa_backup_codes_dal import Mfa_backup_codes_DAL
 from core.responses import success
 from sanic import Request, BadRequest
 from sanic.views import HTTPMethodView
-from core.cookies import check_if_cookie_is_present, send_cookie, get_session_id
+from core.cookies import check_if_cookie_is_present, send_cookie, session_cookie_data, get_session_id
 import secrets
 from database import db
 from database.dals.user_dal import UsersDAL
 from core.encoder import check_password
+from core.ratelimit import rate_limited, body_field
 
 
 def create_session_id():
@@ -31,6 +32,7 @@ class LoginView(HTTPMethodView):
         email: str
         password: str
 
+    @rate_limited("login", account=body_field("email"))
     @parse_params(body=LoginRequest)
     async def post(self, request: Request, params: LoginRequest):
         """ The login route. """
@@ -53,13 +55,12 @@ class LoginView(HTTPMethodView):
                 if not await users_dal.check_if_user_exists_email(params.email):
                     raise BadRequest("Account does not exist.")
 
-                user_info = await users_dal.get_user_by_email(params.email)
+                user_info = await users_dal.get_user_by_email(params.email, projection="auth")
                 if not await check_password(params.password.encode('utf-8'), user_info.password):
                     raise BadRequest("Password is incorrect.")
+                if app.ctx.password_hasher.needs_rehash(user_info.password):
+                    app.add_task(app.ctx.password_hasher.upgrade(user_info.uuid, params.password.encode('utf-8'), user_info.password))
 
-                if user_info.max_sessions <= len(await app.ctx.session.cocurrent_sessions(user_info.uuid)):
-                    raise BadRequest("You have too many concurrent sessions.")
-                
 
                 uuid = user_info.uuid
                 
@@ -67,13 +68,16 @@ class LoginView(HTTPMethodView):
 
                 user_ip = request.remote_addr or request.ip
 
-                await app.ctx.session.add(session_id, uuid, user_ip, time.time() + app.ctx.SESSION_EXPIRY_IN)
-                if not len(await app.ctx.session.cocurrent_sessions(user_info.uuid)) > 1:
-                    await app.ctx.cache.update(user_info)
+                two_factor_pending = bool(user_info.two_factor_authentication_enabled and request.app.ctx.config["2fa"]["enabled"])
+                session_count = await app.ctx.session.add_limited(session_id, uuid, user_ip, time.time() + app.ctx.SESSION_EXPIRY_IN, user_info.max_sessions, two_factor_pending)
+                if session_count is None:
+                    raise BadRequest("You have too many concurrent sessions.")
+                if session_count == 1:
+                    ## only the login fields were loaded - the first request reads the cached user through
+                    await app.ctx.cache.remove(uuid)
                 await users_dal.update_user(uuid=uuid, last_login=last_login, latest_ip=user_ip)
                 
-                if user_info.two_factor_authentication_enabled is True & request.app.ctx.config["2fa"]["enabled"] is True:
-                    await request.app.ctx.session.change_twofactor_auth_state(session_id, True)
-                    return send_cookie(request, "Logged in successfully. Your access is limited until you confirm your 2fa code.", {"session_id": session_id})
+                if two_factor_pending:
+                    return send_cookie(request, "Logged in successfully. Your access is limited until you confirm your 2fa code.", await session_cookie_data(request, session_id))
                 else:
-                    return send_cookie(request, "Logged in successfully.", {"session_id": session_id})
\ No newline at end of file
+                    return send_cookie(request, "Logged in successfully.", await session_cookie_data(request, session_id))
\ No newline at end of file
@@ -17,7 +17,7 @@ class LogoutView(HTTPMethodView):
 
         user = await cache.get(request)
 
-        if len(await session.cocurrent_sessions(user.uuid)) <= 1:
+        if await session.session_count(user.uuid) <= 1:
             # last session
             await cache.remove(user.uuid)
 
@@ -6,7 +6,7 @@ from sanic.views import HTTPMethodView
 from core.oauth.discord import DiscordOAuth
 from database.dals.user_dal import UsersDAL
 from database import db
-from core.cookies import check_if_cookie_is_present, check_oauth_cookie_present, del_oauth_cookie, get_oauth_cookie, send_cookie
+from core.cookies import check_if_cookie_is_present, check_oauth_cookie_present, del_oauth_cookie, get_oauth_cookie, send_cookie, session_cookie_data
 from core.authentication import protected
 
 def create_session_id():
@@ -85,30 +85,29 @@ class DiscordOauthCallbackView(HTTPMethodView):
                 if _id != user_info.discord_account_identifier:
                     raise BadRequest("Account does not exist.")
 
-                if user_info.max_sessions <= len(await request.app.ctx.session.cocurrent_sessions(user_info.uuid)):
-                    raise BadRequest("You have too many concurrent sessions.")
-
                 uuid = user_info.uuid
                 
                 session_id = create_session_id()
 
                 user_ip = request.remote_addr or request.ip
 
-                await request.app.ctx.session.add(session_id, uuid, user_ip, time.time() + request.app.ctx.SESSION_EXPIRY_IN)
-                if not len(await request.app.ctx.session.cocurrent_sessions(user_info.uuid)) > 1:
+                two_factor_pending = bool(user_info.two_factor_authentication_enabled and not mfa_enabled and request.app.ctx.config["2fa"]["enabled"])
+                session_count = await request.app.ctx.session.add_limited(session_id, uuid, user_ip, time.time() + request.app.ctx.SESSION_EXPIRY_IN, user_info.max_sessions, two_factor_pending)
+                if session_count is None:
+                    raise BadRequest("You have too many concurrent sessions.")
+                if session_count == 1:
                     await request.app.ctx.cache.update(user_info)
 
                 await users_dal.update_user(uuid=uuid, last_login=last_login, latest_ip=user_ip)
 
                 await request.app.ctx.cache.update(
-                    await users_dal.get_user_by_uuid(uuid)
+                    await users_dal.get_user_by_uuid(uuid, projection="profile")
                 )
 
-                if user_info.two_factor_authentication_enabled is True & mfa_enabled != True & request.app.ctx.config["2fa"]["enabled"] is True:
-                    await request.app.ctx.session.change_twofactor_auth_state(session_id, True)
-                    response = send_cookie(request, "Logged in successfully. Your access is limited until you confirm your 2fa code.", {"session_id": session_id})
+                if two_factor_pending:
+                    response = send_cookie(request, "Logged in successfully. Your access is limited until you confirm your 2fa code.", await session_cookie_data(request, session_id))
                 else:
-                    response = send_cookie(request, "Logged in successfully.", {"session_id": session_id})
+                    response = send_cookie(request, "Logged in successfully.", await session_cookie_data(request, session_id))
 
                 ## delete the cookie
                 response = del_oauth_cookie(response, "discord_oauth")
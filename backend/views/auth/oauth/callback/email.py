@@ -5,7 +5,7 @@ from sanic import Request, BadRequest, redirect
 from sanic.views import HTTPMethodView
 from database.dals.user_dal import UsersDAL
 from database import db
-from core.cookies import check_if_cookie_is_present, send_cookie
+from core.cookies import check_if_cookie_is_present, send_cookie, session_cookie_data
 from core.authentication import protected
 
 def create_session_id():
@@ -38,9 +38,6 @@ class EmailAuthenticationCallbackView(HTTPMethodView):
                 if not user_info:
                     raise BadRequest("Invalid email authentication code.")
 
-                if user_info.max_sessions <= len(await request.app.ctx.session.cocurrent_sessions(user_info.uuid)):
-                    raise BadRequest("You have too many concurrent sessions.")
-
                 if user_info.login_email_code_expiration < time.time():
                     raise BadRequest("Email authentication code has expired.")
 
@@ -50,17 +47,19 @@ class EmailAuthenticationCallbackView(HTTPMethodView):
 
                 user_ip = request.remote_addr or request.ip
 
-                await request.app.ctx.session.add(session_id, uuid, user_ip, time.time() + request.app.ctx.SESSION_EXPIRY_IN)
-                if not len(await request.app.ctx.session.cocurrent_sessions(user_info.uuid)) > 1:
+                two_factor_pending = bool(user_info.two_factor_authentication_enabled and request.app.ctx.config["2fa"]["enabled"])
+                session_count = await request.app.ctx.session.add_limited(session_id, uuid, user_ip, time.time() + request.app.ctx.SESSION_EXPIRY_IN, user_info.max_sessions, two_factor_pending)
+                if session_count is None:
+                    raise BadRequest("You have too many concurrent sessions.")
+                if session_count == 1:
                     await request.app.ctx.cache.update(user_info)
                 await users_dal.update_user(uuid=uuid, last_login=last_login, latest_ip=user_ip)
                 
                 request.app.ctx.cache.update(
-                    await users_dal.get_user_by_uuid(uuid)
+                    await users_dal.get_user_by_uuid(uuid, projection="profile")
                 )
                 
-                if user_info.two_factor_authentication_enabled is True & request.app.ctx.config["2fa"]["enabled"] is True:
-                    await request.app.ctx.session.change_twofactor_auth_state(session_id, True)
-                    return send_cookie(request, "Logged in successfully. Your access is limited until you confirm your 2fa code.", {"session_id": session_id})
+                if two_factor_pending:
+                    return send_cookie(request, "Logged in successfully. Your access is limited until you confirm your 2fa code.", await session_cookie_data(request, session_id))
                 else:
-                    return send_cookie(request, "Logged in successfully.", {"session_id": session_id})
\ No newline at end of file
+                    return send_cookie(request, "Logged in successfully.", await session_cookie_data(request, session_id))
\ No newline at end of file
@@ -8,6 +8,7 @@ from database.dals.user_dal import UsersDAL
 from core.cookies import check_if_cookie_is_present
 from sanic_dantic import parse_params, BaseModel
 from core.general import send_login_email
+from core.ratelimit import rate_limited, body_field
 
 EMAIL_REGEX = re.compile(r"^([a-zA-Z0-9_\-\.]+)@([a-zA-Z0-9_\-\.]+)\.([a-zA-Z]{2,5})$")
 
@@ -19,6 +20,7 @@ class EmailAuthenticationView(HTTPMethodView):
         email: str
 
     @staticmethod
+    @rate_limited("email_login", account=body_field("email"))
     @parse_params(body=EmailLoginRequest)
     async def post(request: Request, params: EmailLoginRequest):
         """ The email authentication route. """
@@ -57,9 +59,9 @@ class EmailAuthenticationView(HTTPMethodView):
                     login_email_code_expiration=datetime.now() + timedelta(seconds=request.app.ctx.config["oauth"]["email"]["expiry"])
                 )
 
-                cache = request.app.ctx.cache
-                await cache.update(await users_dal.get_user_by_email(params.email))
+                user = await users_dal.get_user_by_email(params.email)
+                await request.app.ctx.cache.update(user)
 
-                await send_login_email(request, cache.get(user.uuid))
+                await send_login_email(request, user)
 
                 return await success(request, "Login email successfully sent.")
\ No newline at end of file
@@ -37,7 +37,7 @@ class ResetPasswordCallbackView(HTTPMethodView):
         async with db.async_session() as session:
             async with session.begin():
                 users_dal = UsersDAL(session)
-                user = await users_dal.get_user_by_password_reset_code(identifier)
+                user = await users_dal.get_user_by_password_reset_code(identifier, projection="security")
                 if not user:
                     raise BadRequest("Invalid password reset code.", status_code=400)
                 
@@ -52,7 +52,7 @@ class ResetPasswordCallbackView(HTTPMethodView):
                 )
 
                 request.app.ctx.cache.update(
-                    await users_dal.get_user_by_uuid(user.uuid)
+                    await users_dal.get_user_by_uuid(user.uuid, projection="profile")
                 )
 
                 return await success(request, "Password reset code is valid, password updated successfully.")
@@ -9,6 +9,7 @@ from database.dals.user_dal import UsersDAL
 from database import db
 from sanic_dantic import parse_params, BaseModel
 from core.general import send_password_reset_email
+from core.ratelimit import rate_limited, body_field
 
 EMAIL_REGEX = re.compile(r"^([a-zA-Z0-9_\-\.]+)@([a-zA-Z0-9_\-\.]+)\.([a-zA-Z]{2,5})$")
 
@@ -20,6 +21,7 @@ class ResetPasswordView(HTTPMethodView):
         email: str
 
     @staticmethod
+    @rate_limited("reset_password", account=body_field("email"))
     @parse_params(body=ResetPasswordRequest)
     async def post(request: Request, params: ResetPasswordRequest):
         """The password reset route."""
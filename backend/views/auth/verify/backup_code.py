@@ -1,13 +1,12 @@
-from core.encoder import check_password
-from core import encoder
 from database.dals.mfa_backup_codes_dal import Mfa_backup_codes_DAL
 from database import db
-from core.general import generate_backup_code, inject_cached_user
+from core.general import backup_code_digest, generate_backup_code, inject_cached_user
 from core.responses import success
 from sanic import Request, Unauthorized, BadRequest
 from sanic.views import HTTPMethodView
-from core.cookies import remove_cookie, get_session_id
-from core.authentication import protected_skip_2fa
+from core.cookies import remove_cookie, get_session_id, refresh_session_cookie
+from core.authentication import protected_skip_2fa, resolve_session
+from core.ratelimit import rate_limited, session_user
 from sanic_dantic import parse_params, BaseModel
 
 
@@ -19,7 +18,9 @@ class BackupCodeVerificationView(HTTPMethodView):
 
         backup_code: str
 
+    @staticmethod
     @protected_skip_2fa
+    @rate_limited("verify_backup_code", account=session_user)
     @inject_cached_user()
     @parse_params(body=BackupCodeVerificationRequest)
     async def post(request: Request, user, params: BackupCodeVerificationRequest):
@@ -30,7 +31,7 @@ class BackupCodeVerificationView(HTTPMethodView):
         if not request.app.ctx.config["2fa"]["enabled"]:
             raise BadRequest("Two-factor authentication is not enabled on this server.")
 
-        if not session.get_twofactor_auth_state(get_session_id(request)):
+        if not (await resolve_session(request)).two_factor_pending:
             raise BadRequest("You are not required to verify two-factor authentication.")
 
         if not user.two_factor_authentication_enabled:
@@ -40,32 +41,26 @@ class BackupCodeVerificationView(HTTPMethodView):
             raise BadRequest("Invalid backup code.")
         
 
+        config = request.app.ctx.config["2fa"]
+
         ## open db
+        new_backup_codes = None
         async with db.async_session() as session:
             async with session.begin():
                 mfa_backup_codes_dal = Mfa_backup_codes_DAL(session)
-                if not len(await mfa_backup_codes_dal.get_users_codes(user.uuid)) > 0:
-                    raise BadRequest("No backup codes available.")
-                
-                # ----- Janky (will be fixed in the future) -----
-                found = False
-                for code in await mfa_backup_codes_dal.get_users_codes(user.uuid): ## Codes are hashed - can't be seen
-                    if check_password(params.two_factor_authentication_backup_code.encode('utf-8'), code.code):
-                        found = True
-                if not found:
+                if not await mfa_backup_codes_dal.use_code(user.uuid, backup_code_digest(params.backup_code, config["backup_code_pepper"])):
                     raise BadRequest("Invalid backup code.")
-                # ------------------------------------------------
-
-                await mfa_backup_codes_dal.delete_code(user.uuid, params.backup_code)
-                await session.change_twofactor_auth_state(get_session_id(request), False)
 
-                if len(await mfa_backup_codes_dal.get_users_codes(user.uuid)) == 0: ## if after the proccess the backup codes are now none
+                if await mfa_backup_codes_dal.count_users_codes(user.uuid) == 0: ## if after the proccess the backup codes are now none
                     ## get new backup codes
-                    data_to_return = []
-                    for _ in range(request.app.ctx.config["2fa"]["backup_codes"]):
-                        generated_code = generate_backup_code(request.app.ctx.config["2fa"]["backup_code_length"])
-                        data_to_return.append(generated_code)
-                        await mfa_backup_codes_dal.create_backup_code(user.uuid, await encoder.hash_password(generated_code.encode('utf-8')))
-                    return await success(request, "Two-factor authentication verified. Your backup codes have been reset.", {"backup_codes": data_to_return})
+                    new_backup_codes = [generate_backup_code(config["backup_code_length"]) for _ in range(config["backup_codes"])]
+                    await mfa_backup_codes_dal.replace_users_codes(
+                        user.uuid, [backup_code_digest(code, config["backup_code_pepper"]) for code in new_backup_codes]
+                    )
+
+        ## only once the used code is committed, so a failed commit cannot leave the session verified with the code still valid
+        await request.app.ctx.session.change_twofactor_auth_state(get_session_id(request), False)
 
-        return await success(request, "Two-factor authentication verified.")
\ No newline at end of file
+        if new_backup_codes is not None:
+            return await refresh_session_cookie(request, await success(request, "Two-factor authentication verified. Your backup codes have been reset.", {"backup_codes": new_backup_codes}))
+        return await refresh_session_cookie(request, await success(request, "Two-factor authentication verified."))
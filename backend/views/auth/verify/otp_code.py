@@ -4,8 +4,9 @@ from core.general import inject_cached_user
 from core.responses import success
 from sanic import Request, Unauthorized, BadRequest
 from sanic.views import HTTPMethodView
-from core.cookies import remove_cookie, get_session_id
-from core.authentication import protected_skip_2fa
+from core.cookies import remove_cookie, get_session_id, refresh_session_cookie
+from core.authentication import protected_skip_2fa, resolve_session
+from core.ratelimit import rate_limited, session_user
 from sanic_dantic import parse_params, BaseModel
 
 
@@ -19,6 +20,7 @@ class TwoFaVerifyLoginView(HTTPMethodView):
 
     @staticmethod
     @protected_skip_2fa
+    @rate_limited("verify_otp", account=session_user)
     @inject_cached_user()
     @parse_params(body=TwoFaVerifyLoginRequest)
     async def post(request: Request, user, params: TwoFaVerifyLoginRequest):
@@ -29,7 +31,7 @@ class TwoFaVerifyLoginView(HTTPMethodView):
         if not request.app.ctx.config["2fa"]["enabled"]:
             raise BadRequest("Two-factor authentication is not enabled on this server.")
 
-        if not internal_session.get_twofactor_auth_state(get_session_id(request)):
+        if not (await resolve_session(request)).two_factor_pending:
             raise BadRequest("You are not required to verify two-factor authentication.")
 
         if not user.two_factor_authentication_enabled:
@@ -43,7 +45,7 @@ class TwoFaVerifyLoginView(HTTPMethodView):
         async with db.async_session() as session:
             async with session.begin():
                 users_dal = UsersDAL(session)
-                user_info = await users_dal.get_user_by_uuid(user.uuid)
+                user_info = await users_dal.get_user_by_uuid(user.uuid, projection="security")
                 if not user_info.verify_two_factor_auth(params.otp_code):
                     raise BadRequest("Invalid OTP code.")
                 
@@ -51,4 +53,4 @@ class TwoFaVerifyLoginView(HTTPMethodView):
 
                 await internal_session.change_twofactor_auth_state(get_session_id(request), False)
 
-        return await success(request, "Two-factor authentication verified.")
\ No newline at end of file
+        return await refresh_session_cookie(request, await success(request, "Two-factor authentication verified."))
\ No newline at end of file